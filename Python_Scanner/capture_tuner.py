@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import logging
+import platform
+from queue import Empty
+from collections import deque
+
+# tunes how long getImages lets each drive settle before it starts watching the panel for changes
+# the scanner reports whether each drive was read cleanly back to the capture process while the scan runs
+# the wait is trimmed a little after every run of clean drives, and backed off quickly when failures cluster together
+# the learned wait is saved per machine so the next scan starts close to where this one ended up
+
+timing_profile_path = "scan_output/capture_timing.json"
+
+# results the feedback queue holds before the scanner starts dropping them, the tuner only looks at recent ones
+# and a bounded queue can never back up into the collector once getImages stops reading it
+feedback_queue_size = 64
+
+
+class CaptureTimingTuner:
+    min_settle_time = 0.0
+    max_settle_time = 1.0
+    clean_streak = 10  # clean drives in a row before trimming the wait
+    decrease_step = 0.01  # seconds trimmed after each clean streak
+    failure_window = 6  # recent drives to look at for a cluster of failures
+    failure_cluster = 2  # failures in the window that count as a cluster
+    increase_factor = 1.5
+    increase_step = 0.05  # smallest back off, so a zero wait can still grow
+
+    def __init__(self, settle_time=0.0, enabled=True):
+        self.settle_time = settle_time
+        self.enabled = enabled
+        self.recent_results = deque(maxlen=self.failure_window)
+        self.successes_in_a_row = 0
+
+    def report(self, success):
+        self.recent_results.append(success)
+        if not self.enabled:
+            return
+        if success:
+            self.successes_in_a_row += 1
+            if self.successes_in_a_row >= self.clean_streak:
+                self.successes_in_a_row = 0
+                self.set_settle_time(self.settle_time - self.decrease_step)
+            return
+        self.successes_in_a_row = 0
+        if self.recent_results.count(False) >= self.failure_cluster:
+            self.set_settle_time(
+                max(self.settle_time * self.increase_factor, self.settle_time + self.increase_step)
+            )
+            # start counting the next cluster from scratch
+            self.recent_results.clear()
+
+    def set_settle_time(self, settle_time):
+        settle_time = round(
+            min(self.max_settle_time, max(self.min_settle_time, settle_time)), 3
+        )
+        if settle_time != self.settle_time:
+            logging.info(f"Capture settle time {self.settle_time}s -> {settle_time}s")
+            self.settle_time = settle_time
+
+    # apply every result the scanner has sent back so far, without blocking
+    def drain(self, feedback_queue):
+        if feedback_queue is None:
+            return
+        while True:
+            try:
+                success = feedback_queue.get_nowait()
+            except Empty:
+                return
+            self.report(success)
+
+
+# timings are saved per machine and screen resolution
+def get_machine_key(screen_width, screen_height):
+    return f"{platform.node()}-{screen_width}x{screen_height}"
+
+
+def load_timing_profile(machine_key, profile_path=timing_profile_path):
+    if not os.path.exists(profile_path):
+        return None
+    try:
+        with open(profile_path, "r") as f:
+            return json.load(f).get(machine_key)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read capture timing profile: {e}")
+        return None
+
+
+def save_timing_profile(machine_key, tuner: CaptureTimingTuner, profile_path=timing_profile_path):
+    profiles = {}
+    if os.path.exists(profile_path):
+        try:
+            with open(profile_path, "r") as f:
+                profiles = json.load(f)
+        except (OSError, ValueError):
+            profiles = {}
+    profiles[machine_key] = {"settle_time": tuner.settle_time, "updated": time.time()}
+    temp_path = profile_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(temp_path, profile_path)
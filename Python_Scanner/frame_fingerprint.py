@@ -0,0 +1,56 @@
+import cv2
+import numpy as np
+
+# catches captures that still show the previous drive, before they are sent to be scanned
+# each capture gets a perceptual fingerprint, a small grayscale thumbnail of the panel
+# each cell of the thumbnail averages a few pixels, so capture noise mostly cancels out, but the cells are still small
+# enough that changing a single character on the panel changes a handful of them a lot
+# a capture whose fingerprint has no cells that changed from the last drive we sent is the same drive again
+
+
+# the fingerprint of a BGR frame, fingerprint_size is (width, height)
+def get_fingerprint(frame, fingerprint_size=(128, 192)):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, fingerprint_size, interpolation=cv2.INTER_AREA)
+
+
+# how many cells of the two fingerprints differ by more than the threshold (0-255)
+def count_changed_cells(fingerprint_a, fingerprint_b, threshold):
+    difference = cv2.absdiff(fingerprint_a, fingerprint_b)
+    return int(np.count_nonzero(difference > threshold))
+
+
+class DuplicateFrameDetector:
+    change_threshold = 24  # difference in a cell that counts as it changing
+    max_changed_cells = 0  # changed cells that still count as the same frame
+    max_recaptures = 2  # times to capture a drive again before sending it anyway
+
+    def __init__(self, fingerprint_size=(128, 192)):
+        self.fingerprint_size = fingerprint_size
+        self.previous_fingerprint = None  # fingerprint of the last frame that was sent
+        self.candidate_fingerprint = None  # fingerprint of the frame last checked
+        self.hits = 0  # captures that were the previous drive again
+        self.misses = 0  # captures that were a new drive
+
+    # check a capture against the last frame that was sent, counts as a hit or a miss
+    def is_duplicate(self, frame):
+        self.candidate_fingerprint = get_fingerprint(frame, self.fingerprint_size)
+        duplicate = (
+            self.previous_fingerprint is not None
+            and count_changed_cells(
+                self.candidate_fingerprint, self.previous_fingerprint, self.change_threshold
+            )
+            <= self.max_changed_cells
+        )
+        if duplicate:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return duplicate
+
+    # the frame last checked is being sent, so it's the one to compare the next capture against
+    # frame is the one being sent instead, if it was captured again after it was checked
+    def accept(self, frame=None):
+        if frame is not None:
+            self.candidate_fingerprint = get_fingerprint(frame, self.fingerprint_size)
+        self.previous_fingerprint = self.candidate_fingerprint
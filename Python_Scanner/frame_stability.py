@@ -0,0 +1,76 @@
+import time
+from frame_fingerprint import get_fingerprint, count_changed_cells
+
+# waits for the disk drive detail panel to finish loading before it is captured, instead of sleeping a fixed time
+# the panel is polled and each frame is shrunk to a grayscale sample for comparison, the same fingerprint the
+# duplicate frame check uses, so a few changed characters change a handful of cells a lot
+# two samples differ when any cell changed past a threshold, rather than on the average over the whole panel, which
+# a few digits hardly move (eg: two drives of the same set and partition, or text that is still fading in)
+# a frame is accepted once the panel differs from the previous drive's capture and then stops changing for a few polls
+# so each drive waits exactly as long as the game takes to load it, and mid-animation frames never get through
+
+
+class FrameStabilityWaiter:
+    sample_size = (128, 192)  # (width, height) of the comparison sample
+    change_threshold = 24  # difference in a cell (0-255) that counts as the panel moving on from the previous drive
+    settle_threshold = 8  # difference in a cell between polls that counts as the panel still animating
+
+    def __init__(
+        self,
+        grab_frame,
+        stable_frames=2,
+        timeout=1.0,
+        poll_interval=0.02,
+        sleep=time.sleep,
+        clock=time.perf_counter,
+    ):
+        self.grab_frame = grab_frame  # returns the current panel as a BGR array
+        self.stable_frames = stable_frames  # identical polls in a row needed to accept a frame
+        self.timeout = timeout  # hard limit on how long to wait for a drive
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.clock = clock
+        self.previous_sample = None  # sample of the last accepted drive
+
+    def get_sample(self, frame):
+        return get_fingerprint(frame, self.sample_size)
+
+    def differs(self, sample_a, sample_b, threshold=None):
+        threshold = self.change_threshold if threshold is None else threshold
+        return count_changed_cells(sample_a, sample_b, threshold) > 0
+
+    # the frame being sent for this drive, if it isn't the one wait returned (eg: it was captured again)
+    def set_previous(self, frame):
+        self.previous_sample = self.get_sample(frame)
+
+    # returns (frame, status) where status is
+    #   "stable" - the panel changed from the previous drive and then settled
+    #   "unchanged" - timed out still showing what the previous drive showed
+    #   "unstable" - timed out while the panel was still changing
+    def wait(self):
+        start = self.clock()
+        changed = self.previous_sample is None
+        last_sample = None
+        stable_count = 0
+        while True:
+            frame = self.grab_frame()
+            sample = self.get_sample(frame)
+            if not changed and self.differs(sample, self.previous_sample):
+                changed = True
+            if changed:
+                if last_sample is not None and not self.differs(
+                    sample, last_sample, self.settle_threshold
+                ):
+                    stable_count += 1
+                else:
+                    stable_count = 0  # still animating, throw away the run so far
+                if stable_count >= self.stable_frames - 1:
+                    self.previous_sample = sample
+                    return frame, "stable"
+            last_sample = sample
+            if self.clock() - start >= self.timeout:
+                if not changed:
+                    self.previous_sample = sample
+                    return frame, "unchanged"
+                return frame, "unstable"
+            self.sleep(self.poll_interval)
@@ -0,0 +1,123 @@
+import os
+import time
+from typing import NamedTuple, Optional
+from multiprocessing import Queue, Value
+from multiprocessing import shared_memory
+import numpy as np
+
+# moves drive captures from getImages to the image scanner workers
+# raw capture buffers go through a bounded ring of shared memory slots, and the queue only carries small descriptors
+# the ring has a fixed memory budget, and getImages blocks when every slot is in flight, so neither side can use unbounded RAM
+# spooling the captures to scan_input as .png files is still available for debugging
+
+
+class FrameDescriptor(NamedTuple):
+    partition: int
+    scan_number: int
+    capture_time: float
+    slot_id: Optional[int] = None  # the ring slot holding the frame, None when spooled to disk
+    shape: Optional[tuple] = None  # shape of the BGR frame in the slot
+    path: Optional[str] = None  # where the frame was spooled to, None when in the ring
+    screen_size: Optional[tuple] = None  # (width, height) of the screen it was captured from
+
+    @property
+    def name(self):
+        return f"Partition{self.partition}Scan{self.scan_number}"
+
+
+default_ring_memory_mb = 64
+
+
+class FrameRing:
+    def __init__(self, frame_shape, memory_budget=default_ring_memory_mb * 1024 * 1024):
+        self.frame_shape = tuple(frame_shape)
+        self.slot_size = int(np.prod(self.frame_shape))
+        # always keep at least two slots so capture and OCR can overlap
+        self.slot_count = max(2, memory_budget // self.slot_size)
+        self.memory_budget = self.slot_count * self.slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=self.memory_budget)
+        self.owner = True
+        self.free_slots = Queue()
+        for slot_id in range(self.slot_count):
+            self.free_slots.put(slot_id)
+        self.in_flight = Value("i", 0)
+
+    # only the shared memory name is sent to the other processes, they attach to the same block
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["shm"] = self.shm.name
+        state["owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=state["shm"])
+
+    def slot_view(self, slot_id, shape=None):
+        shape = shape or self.frame_shape
+        return np.ndarray(
+            shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot_id * self.slot_size
+        )
+
+    # copy a frame into a free slot, blocking while the ring is full
+    def put_frame(self, frame):
+        if frame.nbytes > self.slot_size:
+            raise ValueError(
+                f"Frame of shape {frame.shape} doesn't fit in a {self.slot_size} byte ring slot"
+            )
+        slot_id = self.free_slots.get()
+        with self.in_flight.get_lock():
+            self.in_flight.value += 1
+        self.slot_view(slot_id, frame.shape)[:] = frame
+        return slot_id
+
+    # a view into the slot, only valid until the slot is released
+    def read_frame(self, descriptor: FrameDescriptor):
+        return self.slot_view(descriptor.slot_id, descriptor.shape)
+
+    def release(self, slot_id):
+        with self.in_flight.get_lock():
+            self.in_flight.value -= 1
+        self.free_slots.put(slot_id)
+
+    def in_flight_depth(self):
+        return self.in_flight.value
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# build the descriptor for a capture and hand the frame over, either through the ring or by spooling it to disk
+def send_frame(
+    queue: Queue,
+    frame,
+    partition,
+    scan_number,
+    frame_ring=None,
+    capture_time=None,
+    spool_folder="./scan_input",
+    screen_size=None,
+):
+    capture_time = capture_time or time.time()
+    if frame_ring is None:
+        import cv2  # only needed to spool, the frame ring doesn't encode anything
+
+        path = os.path.join(spool_folder, f"Partition{partition}Scan{scan_number}.png")
+        cv2.imwrite(path, frame)
+        queue.put(
+            FrameDescriptor(partition, scan_number, capture_time, path=path, screen_size=screen_size)
+        )
+    else:
+        slot_id = frame_ring.put_frame(frame)
+        queue.put(
+            FrameDescriptor(
+                partition,
+                scan_number,
+                capture_time,
+                slot_id=slot_id,
+                shape=frame.shape,
+                screen_size=screen_size,
+            )
+        )
@@ -0,0 +1,109 @@
+import re
+import math
+from functools import lru_cache
+import numpy as np
+from validMetadata import (
+    valid_set_names,
+    valid_partition_1_main_stats,
+    valid_partition_2_main_stats,
+    valid_partition_3_main_stats,
+    valid_partition_4_main_stats,
+    valid_partition_5_main_stats,
+    valid_partition_6_main_stats,
+    valid_random_stats,
+)
+
+# fuzzy matching of OCR'd strings against the valid metadata, used to correct OCR mistakes
+# scores a string against every candidate with the same 2-shingle cosine similarity as strsimpy's Cosine(2), but the
+# candidate profiles are built once up front and all candidates are scored in a single matrix product
+# recent OCR strings are cached, since the same few stat names come up over and over
+
+shingle_size = 2
+space_pattern = re.compile("\\s+")
+
+
+# count the shingles of a string, whitespace runs are collapsed to a single space first (like strsimpy)
+def get_profile(string, k=shingle_size):
+    profile = {}
+    string = space_pattern.sub(" ", string)
+    for i in range(len(string) - k + 1):
+        shingle = string[i : i + k]
+        profile[shingle] = profile.get(shingle, 0) + 1
+    return profile
+
+
+class FuzzyIndex:
+    cache_size = 256
+
+    def __init__(self, candidates):
+        self.candidates = list(candidates)
+        self.vocabulary = {}
+        profiles = [get_profile(candidate) for candidate in self.candidates]
+        for profile in profiles:
+            for shingle in profile:
+                self.vocabulary.setdefault(shingle, len(self.vocabulary))
+        # one row of shingle counts per candidate
+        self.profile_matrix = np.zeros(
+            (len(self.candidates), len(self.vocabulary)), dtype=np.float64
+        )
+        for row, profile in enumerate(profiles):
+            for shingle, count in profile.items():
+                self.profile_matrix[row, self.vocabulary[shingle]] = count
+        self.norms = np.sqrt((self.profile_matrix**2).sum(axis=1))
+        # candidates too short to have a shingle only ever match themselves
+        self.too_short = np.array(
+            [len(candidate) < shingle_size for candidate in self.candidates]
+        )
+        self.closest = lru_cache(maxsize=self.cache_size)(self.find_closest)
+
+    # the cosine similarity of the string to every candidate
+    def similarities(self, string):
+        if len(string) < shingle_size:
+            similarities = np.zeros(len(self.candidates))
+        else:
+            profile = get_profile(string)
+            query = np.zeros(len(self.vocabulary), dtype=np.float64)
+            for shingle, count in profile.items():
+                index = self.vocabulary.get(shingle)
+                if index is not None:
+                    query[index] = count
+            query_norm = math.sqrt(sum(count * count for count in profile.values()))
+            if query_norm == 0:
+                # a whitespace only string has no shingles, strsimpy fails the same way
+                raise ZeroDivisionError("float division by zero")
+            with np.errstate(divide="ignore", invalid="ignore"):  # the too short ones, zeroed below
+                similarities = (self.profile_matrix @ query) / (query_norm * self.norms)
+            similarities[self.too_short] = 0.0
+        # an exact match is always a perfect score
+        for i, candidate in enumerate(self.candidates):
+            if candidate == string:
+                similarities[i] = 1.0
+        return similarities
+
+    # the most similar candidate, ties go to the later candidate like the old linear scan
+    def find_closest(self, string):
+        similarities = self.similarities(string)
+        reversed_best = int(np.argmax(similarities[::-1]))
+        return self.candidates[len(self.candidates) - 1 - reversed_best]
+
+
+# the metadata lists we correct against, by the name their index is looked up with
+candidate_lists = {
+    "set": valid_set_names,
+    "main_stats_partition_1": valid_partition_1_main_stats,
+    "main_stats_partition_2": valid_partition_2_main_stats,
+    "main_stats_partition_3": valid_partition_3_main_stats,
+    "main_stats_partition_4": valid_partition_4_main_stats,
+    "main_stats_partition_5": valid_partition_5_main_stats,
+    "main_stats_partition_6": valid_partition_6_main_stats,
+    "sub_stats": valid_random_stats,
+}
+
+# indexes for the metadata lists we correct against, each built the first time it's looked up
+_indexes = {}
+
+
+def get_fuzzy_index(name):
+    if name not in _indexes:
+        _indexes[name] = FuzzyIndex(candidate_lists[name])
+    return _indexes[name]
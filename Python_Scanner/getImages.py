@@ -1,15 +1,41 @@
 import math
 import os
 import sys
-import pyautogui
+import cv2
 import logging
-from keyboard import press
 from multiprocessing import Queue
-
-# screen resolutions supported enum
-class ScreenResolution:
-    RES_1440P = (2560, 1440)
-    RES_1080P = (1920, 1080)
+from frame_transport import FrameRing, send_frame
+from frame_stability import FrameStabilityWaiter
+from frame_fingerprint import DuplicateFrameDetector
+from capture_tuner import (
+    CaptureTimingTuner,
+    get_machine_key,
+    load_timing_profile,
+    save_timing_profile,
+)
+from template_bank import (
+    prepare_templates,
+    equipment_button_template,
+    empty_cell_template,
+    scrollbar_end_template,
+)
+from scan_checkpoint import ScanCheckpoint, ResumePoint
+from grid_analyzer import GridAnalyzer, scrollbar_confidence
+from ui_calibration import (
+    UiGeometry,
+    GridCalibrator,
+    PanelCalibrator,
+    load_geometry,
+    get_default_panel_region,
+    is_panel_cropped,
+    save_geometry,
+    row_count,
+)
+from screen_backend import create_screen_backend, get_screen_size
+from screen_recording import RecordingReader
+from metrics import registry
+from process_supervisor import report
+from tracing import tracer
 
 
 def resource_path(relative_path):
@@ -32,54 +58,123 @@ def setup_logging(log_file_path):
     )
 
 
-# Get the screen resolution
-screenWidth, screenHeight = pyautogui.size()
-
-# get the screen resolution enum
-screenResolution = ScreenResolution.RES_1440P if screenWidth == 2560 else ScreenResolution.RES_1080P
+# the screen backend everything is seen and done through (the real screen, or a recording of it), set up by setupScreen
+screen = None
+
+# the screen resolution, and the paths of the templates scaled to it
+screenWidth, screenHeight = None, None
+templates = {}
+
+# the shared memory ring captures are sent through, None to spool them to scan_input as .png files instead
+frameRing: FrameRing = None
+
+# waits for each drive's panel to settle before it is captured, set up in getImages
+frameWaiter: FrameStabilityWaiter = None
+
+# fingerprints each capture so one still showing the previous drive is captured again instead of being sent
+duplicateDetector = DuplicateFrameDetector()
+
+# tunes the settle time from the scanner's per-drive results, which arrive on the feedback queue
+captureTuner = CaptureTimingTuner()
+feedbackQueue: Queue = None
+
+# where the grid, the drive panel, the disk core and the equipment button are on screen, set up with the screen from
+# this resolution's calibration profile, and the calibrators measuring whatever the profile doesn't have yet
+uiGeometry: UiGeometry = None
+diskDriveRegion = None  # the panel region this scan captures
+gridCalibrator: GridCalibrator = None
+panelCalibrator: PanelCalibrator = None
+
+# finds the filled cells and the end of the disk drives in each page of the grid, set up with the screen
+gridAnalyzer: GridAnalyzer = None
+
+# records each captured row so an interrupted scan can be resumed, and the scans in the current partition that were
+# skipped because they never settled
+scanCheckpoint = ScanCheckpoint()
+skippedScans = []
+
+
+# set up the screen backend and get the screen resolution from it
+# record_path saves everything seen and done to a recording, replay_path plays a recording back instead of the game
+# capture picks how the real screen is captured: "mss", "pyautogui" or "auto" (mss if it's installed)
+# recalibrate ignores the saved UI calibration profile, so everything is measured again
+def setupScreen(record_path=None, replay_path=None, capture="auto", recalibrate=False):
+    global screen, screenWidth, screenHeight, templates, gridAnalyzer, uiGeometry, diskDriveRegion
+    if screen is not None:
+        screen.close()
+    screen = create_screen_backend(record_path, replay_path, capture)
+    screenWidth, screenHeight = screen.size()
+    # resolutions we don't have templates for get the 1440p ones scaled to fit, once, and cached for next time
+    templates = prepare_templates("./Target_Images", (screenWidth, screenHeight))
+    uiGeometry = loadUiGeometry(
+        (screenWidth, screenHeight),
+        replay_path is not None,
+        screen.get_metadata("ui_geometry"),
+        recalibrate,
+    )
+    screen.set_metadata("ui_geometry", uiGeometry.to_dict())
+    diskDriveRegion = uiGeometry.panel_region
+    gridAnalyzer = GridAnalyzer(uiGeometry, templates[empty_cell_template])
 
 
 def switchToZZZ():
     logging.info("Switching to ZenlessZoneZero")
-    ZZZWindow = pyautogui.getWindowsWithTitle("ZenlessZoneZero")[0]
-    if ZZZWindow.isActive == False:
-        pyautogui.press(
-            "altleft"
-        )  # Somehow this is needed to switch to the window, Why though?
-        ZZZWindow.activate()
+    screen.activate_window("ZenlessZoneZero")
     logging.info("Switched to ZenlessZoneZero")
 
 
+@tracer.traced()
 def getToEquipmentScreen(queue: Queue, pageLoadTime):
     logging.info("Getting to the equipment screen")
     # press c to get to the character screen
-    press("c")
+    screen.press_key("c")
     logging.info("Pressed c for character screen")
     # wait for the character screen to load
-    pyautogui.sleep(pageLoadTime)
-    # adjust the target based on devMode
-    target = "./Target_Images/zzz-equipment-button.png"
-
-    # if the screen resolution is 1080p, we need to adjust the target
-    if screenResolution == ScreenResolution.RES_1080P:
-        target = "./Target_Images/zzz-equipment-button-1080p.png"
-
+    screen.sleep(pageLoadTime)
+    # the equipment button, at the screen's resolution
+    target = templates[equipment_button_template]
 
     # press the equipment button to get to the equipment screen
-    try:
-        equipmentButton = pyautogui.locateOnScreen(target, confidence=0.8)
-    except Exception as e:
-        logging.error(f"Error locating equipment button:  + {e}")
-        logging.error(f"Current directory: {os.getcwd()}")
+    # once we know where it is, only the area around it is checked, the whole screen is searched if it's moved
+    equipmentButton = None
+    if uiGeometry.equipment_button is not None:
+        equipmentButton = screen.locate(
+            target, confidence=0.8, region=getEquipmentButtonRegion(uiGeometry.equipment_button)
+        )
+    if equipmentButton is None:
+        equipmentButton = screen.locate(target, confidence=0.8)
+        if equipmentButton is not None:
+            uiGeometry.equipment_button = tuple(int(v) for v in equipmentButton)
+            uiGeometry.mark_calibrated("equipment_button")
     logging.info("Located equipment button: " + str(equipmentButton))
     if equipmentButton == None:
         logging.error("Equipment button not found")
+        logging.error(f"Current directory: {os.getcwd()}")
         print("Equipment button not found")
         queue.put("Error")  # cause the process to end early
         sys.exit(1)
-    pyautogui.click(equipmentButton)
+    screen.click(*getCenter(equipmentButton))
     # wait for the equipment screen to load
-    pyautogui.sleep(pageLoadTime)
+    screen.sleep(pageLoadTime)
+
+
+# the area to check for the equipment button, its saved box padded by its own size on every side
+def getEquipmentButtonRegion(box):
+    left, top, width, height = box
+    regionLeft = max(0, left - width)
+    regionTop = max(0, top - height)
+    return (
+        regionLeft,
+        regionTop,
+        min(screenWidth, left + 2 * width) - regionLeft,
+        min(screenHeight, top + 2 * height) - regionTop,
+    )
+
+
+# the center of a (left, top, width, height) box found on screen
+def getCenter(box):
+    left, top, width, height = box
+    return left + width / 2, top + height / 2
 
 
 def getXYOfCircleEdge(centerX, centerY, radius, angle):
@@ -88,12 +183,13 @@ def getXYOfCircleEdge(centerX, centerY, radius, angle):
     return x, y
 
 
+@tracer.traced()
 def selectParition(diskNumber):
-    diskradius = 0.25 * screenHeight
-    diskCoreCenter = (0.75 * screenWidth, screenHeight / 2)
+    diskradius = uiGeometry.disk_radius
+    diskCoreCenter = uiGeometry.disk_core_center
 
     # move the mouse to the center Y and the right side of the screen (75%)
-    pyautogui.moveTo(diskCoreCenter)
+    screen.move_to(*diskCoreCenter)
 
     match diskNumber:
         case 1:
@@ -101,246 +197,379 @@ def selectParition(diskNumber):
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 225
             )
-            pyautogui.moveTo(x, y)
+            screen.move_to(x, y)
         case 2:
             # move the disk at 180 degrees (disk 2)
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 180
             )
-            pyautogui.moveTo(x, y)
+            screen.move_to(x, y)
         case 3:
             # move the disk at 135 degrees (disk 3)
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 135
             )
-            pyautogui.moveTo(x, y)
+            screen.move_to(x, y)
         case 4:
             # move to the disk at 45 degrees (disk 4)
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 45
             )
-            pyautogui.moveTo(x, y)
+            screen.move_to(x, y)
         case 5:
             # move to the disk at 0 degrees (disk 5)
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 0
             )
-            pyautogui.moveTo(x, y)
+            screen.move_to(x, y)
         case 6:
             # move to the disk at 315 degrees (disk 6)
             x, y = getXYOfCircleEdge(
                 diskCoreCenter[0], diskCoreCenter[1], diskradius, 315
             )
-            pyautogui.moveTo(x, y)
-    pyautogui.click()
+            screen.move_to(x, y)
+    screen.click()
 
 
-def scanPartition(partitionNumber, queue: Queue, discScanTime):
-    startPosition = (0.075 * screenWidth, 0.15 * screenHeight)  # start top left
-    distanceBetwenColumns = 0.07 * screenWidth
-    distanceBetwenRows = 0.158
-    columnNumber = 4  # in 1440p, we have 4 columns
-    rowNumber = 5  # in 1440p, we have 5 rows
-    endOfDiskDrives = scanForEndOfDiskDrives(distanceBetwenRows)
+@tracer.traced()
+def scanPartition(partitionNumber, queue: Queue, discScanTime, resumePoint: ResumePoint = None):
+    startPosition = uiGeometry.first_cell  # start top left
+    distanceBetwenColumns, distanceBetwenRows = uiGeometry.cell_spacing
+    rowNumber = row_count
 
-    pyautogui.moveTo(startPosition)
+    screen.move_to(*startPosition)
 
     # loop through this row of disk drives
-    # if the end of the disk drives is visible, we'll need to figure out which of the 4 columns is the last one
-    # and only continue down the row until we reach the last column with a disk drive
+    # each page is looked at once, to see which of its cells have a disk drive in them and if the end of the disk
+    # drives is on it, rows are only scanned up to their last disk drive
 
     curRowStart = startPosition
     scanNumber = 1
-    while True:  # Changed to infinite loop with explicit break
-        scanNumber = scanRow(
-            columnNumber,
-            curRowStart,
-            distanceBetwenColumns,
-            partitionNumber,
-            queue,
-            discScanTime,
-            scanNumber,
-        )
-        
-        endOfDiskDrives = scanForEndOfDiskDrives(distanceBetwenRows)
-        if endOfDiskDrives:
-            break  # Exit after scanning the row where we found the end
-            
-        pyautogui.scroll(-1)
+    scrollCount = 0
+    startRow = 1
+    if resumePoint is not None:
+        # scroll back down to the row we're resuming from, one scroll per row like the scan itself
+        scrollCount = resumePoint.scroll
+        startRow = resumePoint.page_row
+        scanNumber = resumePoint.scan_number
+        for _ in range(scrollCount):
+            screen.scroll(-1)
+        logging.info(f"Resuming partition {partitionNumber} from {resumePoint}")
+
+    if startRow == 1:
+        while True:  # Changed to infinite loop with explicit break
+            grid = scanForEndOfDiskDrives()
+            rowStartScan = scanNumber
+            scanNumber = scanRow(
+                grid.get_filled_columns(1),
+                curRowStart,
+                distanceBetwenColumns,
+                partitionNumber,
+                queue,
+                discScanTime,
+                scanNumber,
+            )
+            recordRow(partitionNumber, scrollCount, 1, rowStartScan, scanNumber, grid.end_found)
+            if grid.end_found:
+                break  # Exit after scanning the row where we found the end
+
+            screen.scroll(-1)
+            scrollCount += 1
+        startRow = 2
+    else:
+        # resuming part way down the last page
+        grid = scanForEndOfDiskDrives()
 
     # for loop for the remaining rows on the final page of disk drives
-    for i in range(2, rowNumber + 1):
+    for i in range(startRow, rowNumber + 1):
         curRowStart = (
-            curRowStart[0],
-            curRowStart[1] + distanceBetwenRows * screenHeight,
+            startPosition[0],
+            startPosition[1] + (i - 1) * distanceBetwenRows,
         )
-        endOfDiskDrives = False
-        scanNumber = scanRowUntilEndOfDiskDrives(
-            columnNumber,
-            i,
+        rowStartScan = scanNumber
+        scanNumber = scanRow(
+            grid.get_filled_columns(i),
             curRowStart,
             distanceBetwenColumns,
-            distanceBetwenRows,
             partitionNumber,
             queue,
             discScanTime,
             scanNumber,
         )
+        recordRow(partitionNumber, scrollCount, i, rowStartScan, scanNumber)
+    scanCheckpoint.complete_partition(partitionNumber)
 
 
-def scanRow(
-    columns,
-    rowStartPosition,
-    distanceBetwenColumns,
-    partitionNumber,
-    queue: Queue,
-    discScanTime,
-    scanNumber=1,
-):
-    #pyautogui.click()
-    for i in range(1, columns + 1):
-        x = rowStartPosition[0] + (i - 1) * distanceBetwenColumns
-        y = rowStartPosition[1]
-        pyautogui.moveTo(x, y)
-        pyautogui.click()
-        scanNumber = scanDiskDrive(partitionNumber, queue, discScanTime, scanNumber)
-    return scanNumber
+# save a captured row to the checkpoint, along with any drives in it that were skipped
+def recordRow(partitionNumber, scroll, pageRow, rowStartScan, nextScan, endFound=False):
+    scans = range(rowStartScan, nextScan)
+    skipped = [scan for scan in skippedScans if scan in scans]
+    scanCheckpoint.record_row(partitionNumber, scroll, pageRow, scans, skipped, endFound)
 
 
-# a version of scanRow that uses endOfDiskDrives to determine when to stop
-# used on rows 2-5 on the final page of disk drives
-def scanRowUntilEndOfDiskDrives(
+# scan the first few columns of a row, the ones with a disk drive in them
+def scanRow(
     columns,
-    rowNum,
     rowStartPosition,
     distanceBetwenColumns,
-    distanceBetwenRows,
     partitionNumber,
     queue: Queue,
     discScanTime,
     scanNumber=1,
 ):
-    # check the current row for the end of disk drives
-    endOfDiskDrives = scanForEndOfDiskDrives(distanceBetwenRows, rowNum)
-    #pyautogui.click()
     for i in range(1, columns + 1):
         x = rowStartPosition[0] + (i - 1) * distanceBetwenColumns
         y = rowStartPosition[1]
-        # check if the x is past or at the end of the disk drives
-        # if so, break the loop
-        if endOfDiskDrives != False and x >= endOfDiskDrives[0]:
-            break
-        pyautogui.moveTo(x, y)
-        pyautogui.click()
+        tracer.set_context(scan=scanNumber)
+        screen.move_to(x, y)
+        screen.click()
         scanNumber = scanDiskDrive(partitionNumber, queue, discScanTime, scanNumber)
     return scanNumber
 
 
-def scanForEndOfDiskDrives(distanceBetwenRows, rowNumber=None):
+# take one capture of the disk drive grid, and work out which cells have a disk drive and if the end of them is showing
+@tracer.traced()
+def scanForEndOfDiskDrives():
+    with registry.timer("grid_analysis_seconds"):
+        analysis = gridAnalyzer.analyze(screen.screenshot(gridAnalyzer.region))
+        # a page without an empty cell can still be the last one, which only the scrollbar shows
+        if not analysis.end_found:
+            analysis.scrollbar_end = isScrollbarAtEnd()
+    if gridCalibrator is not None:
+        gridCalibrator.observe(analysis)
+    return analysis
 
-    if rowNumber == None:
-        try:
-            target = "./Target_Images/zzz-no-disk-drive-icon.png"
-            if screenResolution == ScreenResolution.RES_1080P:
-                target = "./Target_Images/zzz-no-disk-drive-icon-1080p.png"
-            endOfDiskDrivesIcon = pyautogui.locateOnScreen(
-                target,
-                confidence=0.8,
-            )
-        except:
-            endOfDiskDrivesIcon = False
-
-        try:
-            target = "./Target_Images/zzz-no-disk-drive-scrollbar.png"
-            if screenResolution == ScreenResolution.RES_1080P:
-                target = "./Target_Images/zzz-no-disk-drive-scrollbar-1080p.png"
-            endOfDiskDrivesScrollbar = pyautogui.locateOnScreen(
-                target,
-                confidence=0.95,
-            )
-        except:
-            endOfDiskDrivesScrollbar = False
-        # return false if both the icon and the scrollbar are not visible
-        if endOfDiskDrivesIcon == False and endOfDiskDrivesScrollbar == False:
-            return False
-        # else, return the one that is not false
-        if endOfDiskDrivesIcon != False:
-            return endOfDiskDrivesIcon
-        return endOfDiskDrivesScrollbar
-
-    rowModifier = 0.1 + (distanceBetwenRows * (rowNumber - 1))
 
-    # check if the end of the disk drives is visible
-    endOfDiskDrives = False
-    try:
-        target = "./Target_Images/zzz-no-disk-drive-icon.png"
-        if screenResolution == ScreenResolution.RES_1080P:
-            target = "./Target_Images/zzz-no-disk-drive-icon-1080p.png"
-        endOfDiskDrives = pyautogui.locateOnScreen(
-            target,
-            confidence=0.8,
-            region=(
-                int(0.04 * screenWidth),  # left
-                int(rowModifier * screenHeight),  # top
-                int(0.275 * screenWidth),  # width
-                int(0.125 * screenHeight),  # height
-            ),
-        )
-    except:
-        endOfDiskDrives = False
-    return endOfDiskDrives
+# whether the scrollbar is at the bottom, it isn't in the grid capture so the whole screen is searched for it
+def isScrollbarAtEnd():
+    target = templates[scrollbar_end_template]
+    return screen.locate(target, confidence=scrollbar_confidence) is not None
 
 
 def testSnapshot(distanceBetwenRows, rowNumber):
     rowModifier = 0.1 + (distanceBetwenRows * (rowNumber - 1))
-    screenshot = pyautogui.screenshot(
-        region=(
+    screenshot = screen.screenshot(
+        (
             int(0.04 * screenWidth),  # left
             int(rowModifier * screenHeight),  # top
             int(0.275 * screenWidth),  # width
             int(0.125 * screenHeight),  # height
         )
     )
-    screenshot.save("DiskDriveImages/test" + str(rowNumber) + ".png")
+    cv2.imwrite("DiskDriveImages/test" + str(rowNumber) + ".png", screenshot)
+
+
+# the region of the screen showing the selected disk drive's details
+def getDiskDriveRegion():
+    return diskDriveRegion
+
+
+# how long to wait at most for a drive's panel to settle
+# discScanTime used to be a fixed wait for every drive, so it's scaled up to leave room for the odd slow load
+def getCaptureTimeout(discScanTime):
+    return max(1.0, 4 * discScanTime)
+
+
+# the UI geometry for a scan at the screen size
+# a replay has to click where the recording did, so it uses the geometry saved in the recording (recordings made before
+# there was calibration used the default one)
+def loadUiGeometry(screenSize, replaying=False, recordedGeometry=None, recalibrate=False):
+    if replaying:
+        geometry = UiGeometry(screenSize)
+        if recordedGeometry is not None:
+            geometry.load_dict(recordedGeometry)
+        return geometry
+    if recalibrate:
+        return UiGeometry(screenSize)
+    return load_geometry(screenSize)
+
+
+# the panel has been cut down to the text on it, rather than captured at its full height
+def isPanelCalibrated():
+    return uiGeometry.panel_line_pitch is not None
+
+
+# the shape of the largest disk drive capture as a BGR array, used to size the frame ring
+# it's the whole panel even when the panel is calibrated, so a drive the calibrated panel cuts off can be captured again
+# this is worked out without setting up a screen backend, so the orchestrator can size the ring before getImages
+# starts without having to capture anything itself
+def getDiskDriveFrameShape(replay_path=None, recalibrate=False):
+    if replay_path is not None:
+        recording = RecordingReader(replay_path)
+        geometry = loadUiGeometry(recording.screen_size, True, recording.metadata.get("ui_geometry"))
+        recording.close()
+    else:
+        geometry = loadUiGeometry(get_screen_size(), recalibrate=recalibrate)
+    left, top, width, height = get_default_panel_region(geometry.screen_size)
+    return (height, width, 3)
+
+
+# grab the disk drive detail panel as a BGR array
+def grabDiskDriveFrame():
+    with registry.timer("screenshot_seconds"):
+        return screen.screenshot(getDiskDriveRegion())
 
 
+# check the frame against the last drive we sent, and count how often the game hadn't moved on yet
+def isDuplicateFrame(frame):
+    duplicate = duplicateDetector.is_duplicate(frame)
+    registry.increment("duplicate_frames", result="hit" if duplicate else "miss")
+    return duplicate
+
+
+@tracer.traced()
 def scanDiskDrive(paritionNumber, queue: Queue, discScanTime, scanNumber=1):
-    # get a screenshot of the disk drive after waiting for it to load, save it to a file
-    pyautogui.sleep(discScanTime)
-    screenshot = pyautogui.screenshot(
-        region=(
-            int(0.31 * screenWidth),  # left
-            int(0.1 * screenHeight),  # top
-            int(0.2 * screenWidth),  # width
-            int(0.55 * screenHeight),  # height
+    global diskDriveRegion
+    # catch up on how the scanner got on with the last few drives, and give this one the tuned settle time
+    captureTuner.drain(feedbackQueue)
+    waitStart = screen.clock()
+    if captureTuner.settle_time > 0:
+        screen.sleep(captureTuner.settle_time)
+    # wait for the disk drive to load, the waiter polls the panel until it changes from the last drive and settles
+    frame, status = frameWaiter.wait()
+    registry.increment("capture_status", status=status)
+    if status == "unstable":
+        # the panel was still animating when we timed out, give it one more go before giving up on this drive
+        logging.warning(
+            f"Partition {paritionNumber} scan {scanNumber} didn't settle in time, waiting again"
         )
+        frame, status = frameWaiter.wait()
+        registry.increment("capture_status", status=status)
+        if status == "unstable":
+            logging.error(
+                f"Partition {paritionNumber} scan {scanNumber} never settled, skipping it"
+            )
+            skippedScans.append(scanNumber)
+            registry.increment("drives_skipped", reason="unstable")
+            return scanNumber + 1
+    elif status == "unchanged":
+        logging.warning(
+            f"Partition {paritionNumber} scan {scanNumber} looks the same as the previous drive"
+        )
+    # make sure the game has actually moved on from the last drive we sent
+    recaptures = 0
+    while isDuplicateFrame(frame):
+        if recaptures >= duplicateDetector.max_recaptures:
+            # two identical drives next to each other in the grid look exactly the same, so rather than drop a real
+            # drive it's sent anyway, at worst the previous drive is scanned twice
+            logging.warning(
+                f"Partition {paritionNumber} scan {scanNumber} still looks like the previous drive after {recaptures} "
+                "re-captures, sending it anyway in case it's an identical drive"
+            )
+            registry.increment("duplicate_suspected")
+            break
+        recaptures += 1
+        logging.warning(
+            f"Partition {paritionNumber} scan {scanNumber} is the previous drive again, re-capturing"
+        )
+        frame, status = frameWaiter.wait()
+        registry.increment("capture_status", status=status)
+    duplicateDetector.accept()
+    registry.observe("capture_wait_seconds", screen.clock() - waitStart)
+    registry.increment("drives_captured")
+    if panelCalibrator is not None:
+        panelCalibrator.observe(frame)
+    elif isPanelCalibrated() and is_panel_cropped(frame, uiGeometry):
+        # the calibrated panel may have cut this drive off, so it's captured again with the whole panel, and so is
+        # every drive after it (the frame ring always has room for the whole panel)
+        logging.warning(
+            f"Partition {paritionNumber} scan {scanNumber} has more text than the calibrated panel was measured for, "
+            "capturing it again with the whole panel"
+        )
+        registry.increment("panel_calibration_resets")
+        uiGeometry.reset_panel()
+        diskDriveRegion = uiGeometry.panel_region
+        frame = grabDiskDriveFrame()
+        frameWaiter.set_previous(frame)
+        duplicateDetector.accept(frame)
+    # send the frame to the scanner with its partition number and scan number
+    # the scanner is told the screen size, the panel's size doesn't give it away once the panel has been calibrated
+    send_frame(
+        queue, frame, paritionNumber, scanNumber, frameRing, screen_size=(screenWidth, screenHeight)
     )
-    # save with partition number and scan number
-    save_path = (
-        "./scan_input/Partition"
-        + str(paritionNumber)
-        + "Scan"
-        + str(scanNumber)
-        + ".png"
-    )
-    screenshot.save(save_path)
-    # put the image path in the queue
-    queue.put(save_path)
     return scanNumber + 1
 
 
 # the main function that will be called to get the images by the orchestrator
-def getImages(queue: Queue, pageLoadTime, discScanTime):
+# discScanTime is the most we'll wait for a drive to settle, most drives are captured well before that
+def getImages(
+    queue: Queue,
+    pageLoadTime,
+    discScanTime,
+    frame_ring: FrameRing = None,
+    stable_frames=2,
+    feedback_queue: Queue = None,
+    autotune=True,
+    resume_point: ResumePoint = None,
+    record_path=None,
+    replay_path=None,
+    capture="auto",
+    recalibrate=False,
+):
+    global frameRing, frameWaiter, captureTuner, feedbackQueue, scanCheckpoint, skippedScans
+    global duplicateDetector, gridCalibrator, panelCalibrator
+    # logging is set up first, anything logged before it would set up logging to the console instead of templog.txt
     log_file_path = resource_path("scan_output/templog.txt")
     setup_logging(log_file_path)
-    switchToZZZ()
-    getToEquipmentScreen(queue, pageLoadTime)
-    # go through the 6 partitions
-    for i in range(1, 7):
-        selectParition(i)
-        scanPartition(i, queue, discScanTime)
+    setupScreen(record_path, replay_path, capture, recalibrate)
+    # measure the parts of the UI this resolution's profile doesn't have yet
+    gridCalibrator = GridCalibrator() if "grid" not in uiGeometry.calibrated else None
+    panelCalibrator = PanelCalibrator() if "panel" not in uiGeometry.calibrated else None
+    frameRing = frame_ring
+    feedbackQueue = feedback_queue
+    frameWaiter = FrameStabilityWaiter(
+        grabDiskDriveFrame,
+        stable_frames=stable_frames,
+        timeout=getCaptureTimeout(discScanTime),
+        sleep=screen.sleep,
+        clock=screen.clock,
+    )
+    duplicateDetector = DuplicateFrameDetector()
+
+    # start from the settle time learned on this machine last time
+    machineKey = get_machine_key(screenWidth, screenHeight)
+    captureTuner = CaptureTimingTuner(enabled=autotune)
+    if autotune:
+        timingProfile = load_timing_profile(machineKey)
+        if timingProfile:
+            captureTuner.set_settle_time(timingProfile["settle_time"])
+
+    # when resuming, forget the rows we're about to scan again and skip the partitions that are already done
+    scanCheckpoint = ScanCheckpoint().load() if resume_point else ScanCheckpoint()
+    firstPartition = 1
+    if resume_point is not None:
+        scanCheckpoint.truncate(resume_point.partition_number, resume_point.row_index)
+        firstPartition = resume_point.partition_number
+
+    try:
+        switchToZZZ()
+        # the orchestrator checks how long it took from starting the scan to the game being in front against its budget
+        report("milestone", "getImages", name="first_input")
+        getToEquipmentScreen(queue, pageLoadTime)
+        # go through the 6 partitions
+        for i in range(firstPartition, 7):
+            skippedScans = []
+            tracer.set_context(partition=i, scan=None)
+            selectParition(i)
+            scanPartition(i, queue, discScanTime, resume_point if i == firstPartition else None)
+    finally:
+        # finishes off the recording if we're making one, even if the scan didn't make it to the end
+        screen.close()
     # put a message in the queue to signal the end of the image collection
     queue.put("Done")
+    logging.info(
+        f"Duplicate frame check: {duplicateDetector.hits} hits, {duplicateDetector.misses} misses"
+    )
+
+    if autotune:
+        save_timing_profile(machineKey, captureTuner)
+
+    # save what was measured, the next scan at this resolution loads it instead of working it out again
+    for calibrator in (gridCalibrator, panelCalibrator):
+        if calibrator is not None:
+            calibrator.calibrate(uiGeometry)
+    if uiGeometry.changed:
+        save_geometry(uiGeometry)
 
 
 # a test function to run the getImages function
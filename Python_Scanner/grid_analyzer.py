@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from ui_calibration import UiGeometry, column_count, row_count
+
+# works out which cells of the disk drive inventory grid have a drive in them, from a single capture of the grid
+# the empty cell icon is matched against the whole capture in one pass, and each cell takes the best match whose
+# centre falls inside it, so every visible cell is classified at once instead of searching the screen row by row
+# the end of the drives is reached when any cell on the page is empty, or the scrollbar is at the bottom
+# the scrollbar isn't part of the grid capture, so a full page is checked for it separately (see getImages)
+# where the grid and its cells are comes from the UI geometry (see ui_calibration)
+
+empty_cell_confidence = 0.8
+scrollbar_confidence = 0.95
+
+
+# the grid as seen in one capture
+class GridAnalysis:
+    def __init__(self, filled, scrollbar_end=False, empty_cells=None):
+        self.filled = filled  # (row, column) -> True if there is a drive in the cell
+        self.scrollbar_end = scrollbar_end
+        self.empty_cells = empty_cells or {}  # (row, column) -> screen position of the empty cell icon's centre
+
+    @property
+    def end_found(self):
+        return self.scrollbar_end or not self.filled.all()
+
+    # how many drives there are in a row (numbered from 1) before its first empty cell
+    def get_filled_columns(self, row_number):
+        row = self.filled[row_number - 1]
+        return int(np.argmin(row)) if not row.all() else len(row)
+
+
+class GridAnalyzer:
+    def __init__(self, geometry: UiGeometry, empty_cell_template):
+        self.geometry = geometry
+        self.empty_cell_template = cv2.imread(empty_cell_template, cv2.IMREAD_GRAYSCALE)
+        if self.empty_cell_template is None:
+            raise FileNotFoundError(f"Could not load the empty cell icon {empty_cell_template}")
+        self.region = tuple(geometry.grid_region)
+        self.row_bounds, self.column_bounds = self.get_cell_bounds()
+
+    # where each cell starts in the match scores, a match is in a cell if the icon's centre is
+    # the scores are indexed by the icon's top left corner, so the bounds are shifted back by half the icon
+    def get_cell_bounds(self):
+        icon_height, icon_width = self.empty_cell_template.shape
+        left, top, width, height = self.region
+        score_width, score_height = width - icon_width + 1, height - icon_height + 1
+        if score_width < 1 or score_height < 1:
+            raise ValueError("The empty cell icon is bigger than the grid")
+        spacing_x, spacing_y = self.geometry.cell_spacing
+        column_starts = [i * spacing_x - icon_width // 2 for i in range(column_count)]
+        row_starts = [i * spacing_y - icon_height // 2 for i in range(row_count)]
+        column_bounds = np.clip(np.round(column_starts).astype(int), 0, score_width - 1)
+        row_bounds = np.clip(np.round(row_starts).astype(int), 0, score_height - 1)
+        if np.any(np.diff(column_bounds) <= 0) or np.any(np.diff(row_bounds) <= 0):
+            raise ValueError("The grid's cells are too small for the empty cell icon")
+        return row_bounds, column_bounds
+
+    # classify every cell of a BGR capture of the grid region
+    def analyze(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        scores = cv2.matchTemplate(gray, self.empty_cell_template, cv2.TM_CCOEFF_NORMED)
+        # the best score in each cell, as a (row, column) grid
+        cell_scores = np.maximum.reduceat(
+            np.maximum.reduceat(scores, self.row_bounds, axis=0), self.column_bounds, axis=1
+        )
+        empty = cell_scores >= empty_cell_confidence
+        return GridAnalysis(~empty, empty_cells=self.get_empty_cells(scores, empty))
+
+    # where the icon was found in each empty cell, for calibrating the grid
+    def get_empty_cells(self, scores, empty):
+        icon_height, icon_width = self.empty_cell_template.shape
+        row_ends = np.append(self.row_bounds[1:], scores.shape[0])
+        column_ends = np.append(self.column_bounds[1:], scores.shape[1])
+        empty_cells = {}
+        for row, column in zip(*np.nonzero(empty)):
+            cell = scores[
+                self.row_bounds[row] : row_ends[row], self.column_bounds[column] : column_ends[column]
+            ]
+            y, x = np.unravel_index(np.argmax(cell), cell.shape)
+            empty_cells[(int(row), int(column))] = (
+                self.region[0] + self.column_bounds[column] + x + icon_width / 2,
+                self.region[1] + self.row_bounds[row] + y + icon_height / 2,
+            )
+        return empty_cells
@@ -1,21 +1,22 @@
 import re
 import sys
+import copy
+import time
+from contextlib import contextmanager
 from multiprocessing import Queue
+from queue import Full
 import os
-import json
 import logging
-import pytesseract
-from strsimpy import Cosine  # used for string cosine similarity
-from preprocess_images import preprocess_image
+import validMetadata
+import ocr_engine
+import fuzzy_matcher
+from ocr_engine import get_ocr_engine
+from fuzzy_matcher import get_fuzzy_index  # indexes of the valid metadata, for correcting OCR mistakes
+from frame_transport import FrameRing
+from scan_spool import ScanSpool, build_scan_data
+from metrics import registry
+from tracing import tracer
 from validMetadata import (
-    valid_set_names,
-    valid_partition_1_main_stats,
-    valid_partition_2_main_stats,
-    valid_partition_3_main_stats,
-    valid_partition_4_main_stats,
-    valid_partition_5_main_stats,
-    valid_partition_6_main_stats,
-    valid_random_stats,
     percentage_main_stats,
     validate_disk_drive,
     get_expected_main_stat_value,
@@ -23,12 +24,10 @@ from validMetadata import (
     get_rarity_stats,
 )
 
-debug = False
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+# opencv, the panel layout and the OCR cache are imported where they're used, so the orchestrator and the collector,
+# which only need this module's helpers, don't load them too
 
-# set the path to the tesseract-ocr folder
-tesseract_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Tesseract-OCR") + "\\tesseract.exe"
-pytesseract.pytesseract.tesseract_cmd = tesseract_path
+debug = False
 
 
 def resource_path(relative_path):
@@ -91,9 +90,9 @@ def drive_rarity_from_max_level(max_level):
 def scan_image(image_path):
     # default_config = "--oem 1 -l eng"
     # old_config = "--oem 1 -l ZZZ --tessdata-dir ./tessdata"
-    config = "--oem 1 -l eng --psm 6"  # force NN+LSTM finetuned model
+    # the engine is loaded once per process and reused for every drive (see ocr_engine.py)
     try:
-        text = pytesseract.image_to_string(image_path, config=config)
+        text = get_ocr_engine().image_to_string(image_path)
     except Exception as e:
         logging.error("Error while scanning image: " + str(e))
         print("Error while scanning image: " + str(e))
@@ -103,40 +102,122 @@ def scan_image(image_path):
     return split_text
 
 
-def extract_metadata(result_text, image_path):
+# OCR only the bands of a learned panel layout, each with its own page segmentation mode
+# the headers the bands skip are put back in so extract_metadata can parse the result like a full panel scan
+def scan_image_bands(image, layout):
+    from panel_layout import band_psm
+
+    engine = get_ocr_engine()
+    band_text = {}
+    for name, (top, bottom) in layout.bands.items():
+        text = engine.image_to_string(image[top:bottom], psm=band_psm[name])
+        band_text[name] = list(filter(None, text.split("\n")))
+    # a drive with more sub-stats than the ones the layout was learned from could push the set name out of the band,
+    # so make sure it's there instead of reading whatever line is
+    set_lines = [i for i, text in enumerate(band_text["details"]) if "Set" in text]
+    if not set_lines or set_lines[0] + 1 >= len(band_text["details"]):
+        raise ValueError("the set name isn't in the details band")
+    return (
+        band_text["level"]
+        + ["Main Stat"]
+        + band_text["main_stat"]
+        + ["Sub-Stats"]
+        + band_text["details"]
+    )
+
+
+# scan a preprocessed drive panel and pull its metadata out
+# once the panel layout is learned only the field bands are OCRed, falling back to the whole panel if they can't be parsed
+# the whole panel is OCRed line by line, so while the layout is being learned the same pass shows where the fields are
+def scan_and_extract(processed_image, partition_number):
+    from panel_layout import get_panel_layout
+
+    layout = get_panel_layout(processed_image.shape)
+    if layout.ready:
+        try:
+            with stage("ocr"):
+                band_text = scan_image_bands(processed_image, layout)
+            with stage("extract"):
+                result_metadata = extract_metadata(band_text, partition_number)
+            layout.record_hit()
+            return result_metadata
+        except Exception as e:
+            logging.warning(f"Could not parse the panel bands, scanning the whole panel: {e}")
+            layout.record_miss()
+    # one OCR pass gives both the panel's text and where each line of it is
+    # image_to_string's text is the same lines joined by newlines, so extract_metadata sees what it always has
+    with stage("ocr"):
+        lines = get_ocr_engine().image_to_lines(processed_image)
+    with stage("extract"):
+        text = "\n".join(line_text for line_text, _, _ in lines)
+        result_metadata = extract_metadata(list(filter(None, text.split("\n"))), partition_number)
+    if not layout.ready:
+        layout.learn(lines)
+    return result_metadata
+
+
+# time a scanner stage into the metrics, and into the trace if we're tracing
+@contextmanager
+def stage(name):
+    with registry.timer(f"{name}_seconds"), tracer.span(name, "scanner"):
+        yield
+
+
+# raised when a field of the drive can't be read from the OCR text, field is one of the metadata failure types
+class MetadataParseError(Exception):
+    def __init__(self, field, error):
+        super().__init__(f"Could not read the {field}: {error}")
+        self.field = field
+
+
+# tag anything that goes wrong in the block with the field we were reading
+@contextmanager
+def parsing(field):
+    try:
+        yield
+    except MetadataParseError:
+        raise
+    except Exception as e:
+        raise MetadataParseError(field, e) from e
+
+
+# the partition number comes from the capture (see get_scan_id), it isn't shown on the drive itself
+def extract_metadata(result_text, partition_number):
     # grab the data we need from the input text
-    set_name = result_text[find_index_in_list("Set", result_text) + 1]
-    # get partition number via the image path (eg: Partition1Scan1.png would be 1)
-    partition_number = re.search(r"Partition(\d+)Scan", image_path).group(1)
+    with parsing("set_name"):
+        set_name = result_text[find_index_in_list("Set", result_text) + 1]
+    partition_number = str(partition_number)
     # get the current and max levels of the drive, in the form of Lv. Current/Max
-    drive_level = find_string_in_list(
-        "/", result_text
-    )  # might swap back to "Lv." if this is too permissive
-    # clean out any text other than numbers and slashes and trim the string
-    drive_level = re.sub("[^0-9/]", "", drive_level).strip()
-    drive_max_level = drive_level.split("/")[1].strip()
-    drive_current_level = re.sub("\D", "", drive_level.split("/")[0])
-    # convert a current level of 00 to 0, etc
-    if drive_current_level[0] == "0":
-        drive_current_level = "0"
+    with parsing("level"):
+        drive_level = find_string_in_list(
+            "/", result_text
+        )  # might swap back to "Lv." if this is too permissive
+        # clean out any text other than numbers and slashes and trim the string
+        drive_level = re.sub("[^0-9/]", "", drive_level).strip()
+        drive_max_level = drive_level.split("/")[1].strip()
+        drive_current_level = re.sub("\D", "", drive_level.split("/")[0])
+        # convert a current level of 00 to 0, etc
+        if drive_current_level[0] == "0":
+            drive_current_level = "0"
     # base stat is found after the "Main Stat" line
-    drive_base_stat_combined = result_text[find_index_in_list("Main", result_text) + 1]
+    with parsing("main_stat"):
+        drive_base_stat_combined = result_text[find_index_in_list("Main", result_text) + 1]
 
-    drive_base_stat = re.sub("[\d%]", "", drive_base_stat_combined).strip()
+        drive_base_stat = re.sub("[\d%]", "", drive_base_stat_combined).strip()
 
-    # if there are no numbers in the base stat, don't try to grab it, we'll rely on correcting it later
-    drive_base_stat_number_missing = False
-    if not any(char.isdigit() for char in drive_base_stat_combined):
-        drive_base_stat_number_missing = True
+        # if there are no numbers in the base stat, don't try to grab it, we'll rely on correcting it later
+        drive_base_stat_number_missing = False
+        if not any(char.isdigit() for char in drive_base_stat_combined):
+            drive_base_stat_number_missing = True
 
-    # get the base stat name and number from the combined string
-    # strip out any numbers or % signs from the string, what remains is the base stat name
-    drive_base_stat_number = None
-    if not drive_base_stat_number_missing:
-        # get the number from the string, and if it had a %, include it, this is the base stat number
-        drive_base_stat_number = re.search(
-            r"\d+(\.\d+)?%?", drive_base_stat_combined
-        ).group()
+        # get the base stat name and number from the combined string
+        # strip out any numbers or % signs from the string, what remains is the base stat name
+        drive_base_stat_number = None
+        if not drive_base_stat_number_missing:
+            # get the number from the string, and if it had a %, include it, this is the base stat number
+            drive_base_stat_number = re.search(
+                r"\d+(\.\d+)?%?", drive_base_stat_combined
+            ).group()
 
     # the random stats of the drive should be stored as a pair, with the stat name and its value
     # they are found in the text after the "Sub-Stats" line and before the "Set Effect" line
@@ -198,16 +279,10 @@ def extract_metadata(result_text, image_path):
 
 
 def find_closest_stat(
-    stat, valid_stats
-):  # find the closest stat in the input list to the input stat
-    cosine = Cosine(2)
-    closest_stat = None
-    closest_stat_similarity = 0
-    for valid_stat in valid_stats:
-        similarity = cosine.similarity(stat, valid_stat)
-        if similarity >= closest_stat_similarity:
-            closest_stat_similarity = similarity
-            closest_stat = valid_stat
+    stat, valid_stats_name
+):  # find the closest stat in the named list of valid stats (see fuzzy_matcher.candidate_lists) to the input stat
+    # the index scores every valid stat at once, and remembers recent lookups
+    closest_stat = get_fuzzy_index(valid_stats_name).closest(stat)
 
     # if the original stat had a plus modifier (eg: +1 at the end), add it and the following number to the corrected stat
     if "+" in stat:
@@ -225,39 +300,39 @@ def find_closest_stat(
 def correct_metadata(metadata):
     # correct the set name
     set_name = metadata["set_name"]
-    closest_set_name = find_closest_stat(set_name, valid_set_names)
+    closest_set_name = find_closest_stat(set_name, "set")
     metadata["set_name"] = closest_set_name
 
     # based off of the partition number, we can correct the main (base) stat
     partition_number = metadata["partition_number"]
     if partition_number == "1":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_1_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_1"
         )
         metadata["drive_base_stat"] = closest_stat
     elif partition_number == "2":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_2_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_2"
         )
         metadata["drive_base_stat"] = closest_stat
     elif partition_number == "3":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_3_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_3"
         )
         metadata["drive_base_stat"] = closest_stat
     elif partition_number == "4":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_4_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_4"
         )
         metadata["drive_base_stat"] = closest_stat
     elif partition_number == "5":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_5_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_5"
         )
         metadata["drive_base_stat"] = closest_stat
     elif partition_number == "6":
         closest_stat = find_closest_stat(
-            metadata["drive_base_stat"], valid_partition_6_main_stats
+            metadata["drive_base_stat"], "main_stats_partition_6"
         )
         metadata["drive_base_stat"] = closest_stat
 
@@ -265,7 +340,7 @@ def correct_metadata(metadata):
     # we'll be checking the stat_name against the valid_random_stats list
     for i in range(len(metadata["random_stats"])):
         stat_name = metadata["random_stats"][i][0]
-        closest_stat = find_closest_stat(stat_name, valid_random_stats)
+        closest_stat = find_closest_stat(stat_name, "sub_stats")
         metadata["random_stats"][i] = (closest_stat, metadata["random_stats"][i][1])
 
     # correct the main stat value
@@ -342,49 +417,143 @@ def correct_metadata(metadata):
         )
 
 
-# the main function that will be called to process the images in orchestrator.py
-def imageScanner(queue: Queue):
+# get the (partition, scan number) of a drive capture from its path (eg: Partition1Scan7.png would be (1, 7))
+def get_scan_id(image_path):
+    match = re.search(r"Partition(\d+)Scan(\d+)", image_path)
+    return int(match.group(1)), int(match.group(2))
+
+
+max_worker_count = 8  # past this the capture process can't keep the workers busy anyway
+
+
+# pick how many scanner workers to run, leaving a core free for the getImages process
+def get_worker_count(requested_workers=None):
+    if requested_workers:
+        return max(1, int(requested_workers))
+    cpu_count = os.cpu_count() or 2
+    return max(1, min(cpu_count - 1, max_worker_count))
+
+
+# each worker runs tesseract single threaded - with several workers, its own OpenMP threads would just fight over the cores
+def limit_ocr_threads():
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+# the OCR result cache, its namespace covers everything that goes into turning a panel into corrected metadata
+def get_ocr_cache():
+    import panel_layout
+    from preprocess_images import preprocess_image
+    from rarity_classifier import RarityClassifier
+    from ocr_cache import OcrCache, get_cache_namespace
+
+    namespace = get_cache_namespace(
+        get_ocr_engine().model_id(),
+        functions=(
+            preprocess_image,
+            scan_and_extract,
+            scan_image_bands,
+            extract_metadata,
+            find_string_in_list,
+            find_index_in_list,
+            drive_rarity_from_max_level,
+            find_closest_stat,
+            correct_metadata,
+            fuzzy_matcher.get_profile,
+            fuzzy_matcher.FuzzyIndex.similarities,
+            fuzzy_matcher.FuzzyIndex.find_closest,
+        ),
+        tables=(validMetadata, ocr_engine, panel_layout, RarityClassifier),
+    )
+    return OcrCache(namespace)
+
+
+# a scanner worker, several of these consume the capture queue concurrently
+# each processed drive is sent to the collector as (partition, scan number, status, metadata, capture time)
+# where status is "valid", "invalid" (failed validation) or "error" (couldn't be analyzed)
+# frames either come through the shared memory frame ring, or are read from the .png files spooled to scan_input
+# drives that were read before (and haven't changed) come out of the OCR cache instead of being scanned again
+def imageScanner(
+    queue: Queue,
+    result_queue: Queue,
+    worker_id=0,
+    frame_ring: FrameRing = None,
+    use_ocr_cache=True,
+):
+    from preprocess_images import preprocess_image
+
     setup_logging()
-    # scan through all images in the scan_input folder
-    scan_data = []
-    imagenum = 0
-    consecutive_errors = 0
-    logging.info("Ready to process disk drives")
-    getImagesDone = False
-    while not getImagesDone:
-        while not queue.empty():
-            image_path = queue.get()
-            if image_path == "Done":
-                getImagesDone = True
-                break
-            elif (
-                image_path == "Error"
-            ):  # if the getImages process has crashed, stop the program
-                logging.critical(
-                    "Failed to get to the equipment screen - try increasing the page load time"
-                )
-                sys.exit(1)
-            logging.info(f"Processing disk drive # {imagenum}, at {image_path}")
-            if debug:
-                print(f"Processing {image_path}")
-            try:
-                processed_image = preprocess_image(
-                    image_path, target_images_folder="./Target_Images"
-                )
-                result = scan_image(processed_image)
-                result_metadata = extract_metadata(result, image_path)
-            except Exception as e:
-                logging.error(f"Error analyzing drive #{imagenum}, skipping it: {e}")
-                consecutive_errors += 1
-                # if we have more than 10 consecutive errors, stop the program and log it - probably wrong timing settings
-                if consecutive_errors > 10:
-                    logging.critical(
-                        "Over 10 consecutive errors, stopping the program - try increasing the time between disc drive scans"
+    ocr_cache = get_ocr_cache() if use_ocr_cache else None
+    logging.info(f"Scanner worker {worker_id} ready to process disk drives")
+    while True:
+        with tracer.span("waitForFrame", "wait"):
+            frame = queue.get()
+        if frame == "Done":
+            # put the signal back so the other workers see it too
+            queue.put("Done")
+            break
+        elif (
+            frame == "Error"
+        ):  # if the getImages process has crashed, stop the program
+            queue.put("Error")
+            logging.critical(
+                "Failed to get to the equipment screen - try increasing the page load time"
+            )
+            sys.exit(1)
+        partition_number, scan_number = frame.partition, frame.scan_number
+        image_path = frame.path or frame.name
+        tracer.set_context(partition=partition_number, scan=scan_number)
+        # how long the capture sat in the queue (and the frame ring) before a worker picked it up
+        registry.observe("queue_dwell_seconds", max(0.0, time.time() - frame.capture_time))
+        logging.info(f"Processing disk drive at {image_path} on worker {worker_id}")
+        if debug:
+            print(f"Processing {image_path}")
+        try:
+            with stage("preprocess"):
+                if frame.slot_id is not None:
+                    # preprocessing makes its own copy, so the slot can go back to getImages straight after
+                    try:
+                        processed_image = preprocess_image(
+                            frame_ring.read_frame(frame),
+                            target_images_folder="./Target_Images",
+                            screen_size=frame.screen_size,
+                        )
+                    finally:
+                        frame_ring.release(frame.slot_id)
+                else:
+                    processed_image = preprocess_image(
+                        frame.path,
+                        target_images_folder="./Target_Images",
+                        screen_size=frame.screen_size,
                     )
-                    sys.exit(1)
-                continue
-            correct_metadata(result_metadata)
-            valid_disk_drive, error_message = validate_disk_drive(
+            result_metadata = None
+            if ocr_cache is not None:
+                with tracer.span("ocr_cache", "scanner"):
+                    result_metadata = ocr_cache.get(processed_image, partition_number)
+                registry.increment(
+                    "ocr_cache_lookups", result="miss" if result_metadata is None else "hit"
+                )
+            cached = result_metadata is not None
+            if not cached:
+                result_metadata = scan_and_extract(processed_image, partition_number)
+        except Exception as e:
+            logging.error(f"Error analyzing drive at {image_path}, skipping it: {e}")
+            registry.increment("drives_processed", status="error")
+            registry.increment(
+                "failures", type=e.field if isinstance(e, MetadataParseError) else "other"
+            )
+            result_queue.put(
+                (partition_number, scan_number, "error", None, frame.capture_time)
+            )
+            continue
+        if not cached:
+            with stage("correct"):
+                correct_metadata(result_metadata)
+        # validation converts some of the values in place, so the cache gets them as they were before it
+        cache_entry = None
+        if ocr_cache is not None and not cached:
+            cache_entry = copy.deepcopy(result_metadata)
+        with stage("validate"):
+            valid_disk_drive, error_message, failure_type = validate_disk_drive(
                 result_metadata["set_name"],
                 result_metadata["drive_current_level"],
                 result_metadata["drive_max_level"],
@@ -393,27 +562,85 @@ def imageScanner(queue: Queue):
                 result_metadata["drive_base_stat_number"],
                 result_metadata["random_stats"],
             )
-            if valid_disk_drive:
-                scan_data.append(result_metadata)
-            else:
-                logging.error(
-                    f"Disk drive #{imagenum} failed validation, skipping: {error_message}"
+        if valid_disk_drive:
+            registry.increment("drives_processed", status="valid")
+            # only valid drives are cached, so a misread is never saved for next time
+            if cache_entry is not None:
+                ocr_cache.put(processed_image, partition_number, cache_entry)
+            result_queue.put(
+                (partition_number, scan_number, "valid", result_metadata, frame.capture_time)
+            )
+        else:
+            logging.error(
+                f"Disk drive at {image_path} failed validation, skipping: {error_message}"
+            )
+            registry.increment("drives_processed", status="invalid")
+            registry.increment("failures", type=failure_type)
+            result_queue.put(
+                (partition_number, scan_number, "invalid", None, frame.capture_time)
+            )
+        logging.info(f"Finished processing disk drive at {image_path}")
+        if debug:  # log out the output
+            for key, value in result_metadata.items():
+                print(f"{key}: {value}")
+            print("--------------------------------------------------")
+    if ocr_cache is not None:
+        logging.info(
+            f"Worker {worker_id} OCR cache: {ocr_cache.hits} hits, {ocr_cache.misses} misses"
+        )
+        ocr_cache.close()
+    result_queue.put("Done")
+
+
+# collects the results of all scanner workers and writes them out in (partition, scan number) order
+# valid drives are appended to the scan_data.jsonl spool as they come in, so a crash doesn't lose them
+# each drive's outcome is also sent back to getImages on the feedback queue, so it can tune its capture timing
+# the queue is bounded, so once it fills up (eg: after the capture is over) outcomes are dropped instead of piling up
+def scanCollector(result_queue: Queue, worker_count, feedback_queue: Queue = None):
+    setup_logging()
+    spool = ScanSpool()
+    workers_done = 0
+    # the current run of errors, only spooled once it ends, so if we give up on them a resumed scan tries them again
+    consecutive_errors = []
+    while workers_done < worker_count:
+        result = result_queue.get()
+        if result == "Done":
+            workers_done += 1
+            continue
+        partition_number, scan_number, status, result_metadata, capture_time = result
+        if feedback_queue is not None:
+            try:
+                feedback_queue.put_nowait(status == "valid")
+            except Full:
+                pass  # getImages is behind or done capturing, it only tunes from recent drives anyway
+        if status == "error":
+            consecutive_errors.append((partition_number, scan_number, capture_time))
+            # if we have more than 10 consecutive errors, stop the program and log it - probably wrong timing settings
+            if len(consecutive_errors) > 10:
+                logging.critical(
+                    "Over 10 consecutive errors, stopping the program - try increasing the time between disc drive scans"
                 )
-            logging.info(f"Finished processing disk drive #{imagenum}")
-            consecutive_errors = 0
-            imagenum += 1
-            if debug:  # log out the output
-                for key, value in result_metadata.items():
-                    print(f"{key}: {value}")
-                print("--------------------------------------------------")
+                spool.close()
+                sys.exit(1)
+            continue
+        # drives that failed are spooled too, so a resumed scan knows they were already tried
+        for error_partition, error_scan, error_capture_time in consecutive_errors:
+            spool.append(error_partition, error_scan, None, "error", error_capture_time)
+        consecutive_errors = []
+        spool.append(partition_number, scan_number, result_metadata, status, capture_time)
+    for error_partition, error_scan, error_capture_time in consecutive_errors:
+        spool.append(error_partition, error_scan, None, "error", error_capture_time)
+    spool.close()
 
     # write the data to a JSON file for later use inside of the scan_output folder
+    # workers finish out of order, so the drives are put back in the order they were captured
     logging.info("Finished processing. Writing scan data to file")
-    with open("scan_output/scan_data.json", "w") as f:
-        json.dump(scan_data, f, indent=4)
+    build_scan_data()
 
 
 if __name__ == "__main__":
+    from preprocess_images import preprocess_image
+
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     # test the scanner on a single image
     save_path = resource_path("./scan_output/Partition2Scan7.png")
@@ -423,9 +650,9 @@ if __name__ == "__main__":
         image_path, save_path=save_path, target_images_folder="./Target_Images"
     )
     result = scan_image(processed_image)
-    result_metadata = extract_metadata(result, image_path)
+    result_metadata = extract_metadata(result, get_scan_id(image_path)[0])
     correct_metadata(result_metadata)
-    valid_disk_drive, error_message = validate_disk_drive(
+    valid_disk_drive, error_message, failure_type = validate_disk_drive(
         result_metadata["set_name"],
         result_metadata["drive_current_level"],
         result_metadata["drive_max_level"],
@@ -0,0 +1,109 @@
+import sys
+import json
+import time
+
+# an opt-in profile of how long each module takes to import, like python -X importtime but from inside the process,
+# so each supervised process can send its own to the supervisor when it finishes (see process_supervisor)
+# the profiler sits in front of the other import finders, and times each module's loader while it runs the module
+# a module's total time includes the modules it imports, its self time doesn't
+# only the first import of a module is timed, a forked process starts with everything its parent already imported, so
+# on Linux (where processes are forked) the supervised processes' profiles only have what they import after starting,
+# and are nearly empty - they're marked as forked in the profile, on Windows each process imports everything itself
+
+import_profile_path = "scan_output/import_profile.json"
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.imports = {}  # module name -> {"self": seconds, "total": seconds}
+        self.stack = []  # how long the modules imported by each import in progress took
+        self.active = False
+
+    def start(self):
+        if not self.active:
+            sys.meta_path.insert(0, self)
+            self.active = True
+
+    def stop(self):
+        if self.active:
+            sys.meta_path.remove(self)
+            self.active = False
+
+    # find the module with the finders behind us, and time the loader they found it with
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = TimedLoader(spec.loader, self)
+        return spec
+
+    def begin(self):
+        self.stack.append(0.0)
+
+    def end(self, name, total):
+        children = self.stack.pop()
+        if self.stack:
+            self.stack[-1] += total
+        self.imports[name] = {"self": total - children, "total": total}
+
+    def get_imports(self):
+        return dict(self.imports)
+
+
+class TimedLoader:
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # the module only sees its real loader, we're just in the way while it runs
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.profiler.begin()
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.profiler.end(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+# the modules that took longest to import themselves, as a line for the console
+def get_import_summary(imports, top=5):
+    slowest = sorted(imports.items(), key=lambda item: item[1]["self"], reverse=True)[:top]
+    total = sum(timing["self"] for timing in imports.values())
+    return f"{total:.3f}s in {len(imports)} modules, slowest: " + ", ".join(
+        f"{name} {timing['self']:.3f}s" for name, timing in slowest
+    )
+
+
+# write the import profile of every process, {process name: {module name: {"self", "total"}}}
+# forked is the names of the processes that were forked, so started with their parent's imports
+def write_import_profile(profiles, path=import_profile_path, forked=()):
+    output = {}
+    for name, imports in profiles.items():
+        output[name] = {
+            "forked": name in forked,
+            "total_seconds": sum(timing["self"] for timing in imports.values()),
+            "modules": dict(
+                sorted(imports.items(), key=lambda item: item[1]["self"], reverse=True)
+            ),
+        }
+    with open(path, "w") as f:
+        json.dump(output, f, indent=4)
+
+
+# the import profiler of the current process
+import_profiler = ImportProfiler()
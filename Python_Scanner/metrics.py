@@ -0,0 +1,198 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+
+# a small registry of counters and histograms for the capture and scan processes
+# each process records into its own registry, and sends a snapshot of it to the supervisor when it finishes (see
+# process_supervisor.run_supervised), which merges them into one registry for the whole scan
+# at the end of the scan the merged registry is written out as a summary, and optionally in the Prometheus text format
+# metrics are identified by a name and optional labels, eg: drives_processed{status="valid"}
+
+metrics_path = "scan_output/metrics.json"
+prometheus_path = "scan_output/metrics.prom"
+prometheus_prefix = "zzz_scanner_"
+
+# upper bounds of the histogram buckets, in seconds
+default_buckets = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf,
+)
+
+
+class Histogram:
+    def __init__(self, buckets=default_buckets):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def merge(self, other):
+        self.count += other["count"]
+        self.sum += other["sum"]
+        self.max = max(self.max, other["max"])
+        for i, count in enumerate(other["bucket_counts"]):
+            self.bucket_counts[i] += count
+
+    # estimate a quantile by interpolating inside the bucket it falls in
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "bucket_counts": list(self.bucket_counts),
+        }
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+
+# labels are kept as a sorted tuple of (name, value) pairs, so they can be part of a dictionary key
+def get_label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def format_labels(label_key):
+    if not label_key:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in label_key) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters = {}  # (name, labels) -> count
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, get_label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, get_label_key(labels))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    # time the block into a histogram
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def get_counter(self, name, **labels):
+        return self.counters.get((name, get_label_key(labels)), 0)
+
+    # the total of a counter over all its labels, or broken down by one of them
+    def get_counter_totals(self, name, by=None):
+        totals = {}
+        for (counter_name, label_key), count in self.counters.items():
+            if counter_name != name:
+                continue
+            group = dict(label_key).get(by) if by else None
+            totals[group] = totals.get(group, 0) + count
+        return totals if by else totals.get(None, 0)
+
+    # a picklable copy of the registry, to send to another process
+    def snapshot(self):
+        return {
+            "counters": [[name, list(labels), count] for (name, labels), count in self.counters.items()],
+            "histograms": [
+                [name, list(labels), histogram.snapshot()]
+                for (name, labels), histogram in self.histograms.items()
+            ],
+        }
+
+    def merge(self, snapshot):
+        for name, labels, count in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            self.counters[key] = self.counters.get(key, 0) + count
+        for name, labels, histogram in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].merge(histogram)
+
+    def summary(self):
+        return {
+            "counters": {
+                name + format_labels(labels): count
+                for (name, labels), count in sorted(self.counters.items())
+            },
+            "histograms": {
+                name + format_labels(labels): histogram.summary()
+                for (name, labels), histogram in sorted(self.histograms.items())
+            },
+        }
+
+    def write_summary(self, path=metrics_path, **extra):
+        summary = self.summary()
+        summary.update(extra)
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=4)
+
+    # the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {prometheus_prefix}{name} counter")
+            for (counter_name, labels), count in sorted(self.counters.items()):
+                if counter_name == name:
+                    lines.append(f"{prometheus_prefix}{name}{format_labels(labels)} {count}")
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {prometheus_prefix}{name} histogram")
+            for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative += count
+                    bucket_labels = labels + (("le", "+Inf" if bound == math.inf else repr(bound)),)
+                    lines.append(
+                        f"{prometheus_prefix}{name}_bucket{format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(f"{prometheus_prefix}{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{prometheus_prefix}{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=prometheus_path):
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+
+# the registry of the current process
+registry = MetricsRegistry()
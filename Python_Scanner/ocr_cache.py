@@ -0,0 +1,125 @@
+import json
+import time
+import types
+import sqlite3
+import hashlib
+import logging
+
+# caches the metadata read off each drive panel across scans, so an unchanged drive doesn't go through tesseract again
+# entries are keyed by a hash of the preprocessed panel and the partition it was captured in
+# every entry belongs to a namespace, a hash of everything that decides what metadata a panel gives us (the OCR model,
+# the preprocessing and parsing code and the valid metadata tables), so changing any of them throws the old entries away
+# the cache is kept under a size limit by dropping the entries that were used least recently
+
+cache_path = "scan_output/ocr_cache.sqlite"
+default_max_bytes = 32 * 1024 * 1024
+
+
+# hash a function's bytecode and constants, but not its line numbers, so it only changes when the function does
+def hash_code(code, digest):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            hash_code(const, digest)
+        else:
+            digest.update(repr(const).encode())
+
+
+# hash the plain data (tables, thresholds, etc) of a module or class
+def hash_values(namespace, digest):
+    for name, value in sorted(vars(namespace).items()):
+        if name.startswith("__"):
+            continue
+        if isinstance(value, (str, int, float, bool, list, tuple, dict)):
+            digest.update(name.encode())
+            digest.update(repr(value).encode())
+
+
+def get_cache_namespace(model_id, functions=(), tables=()):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(model_id.encode())
+    for function in functions:
+        hash_code(function.__code__, digest)
+    for table in tables:
+        hash_values(table, digest)
+    return digest.hexdigest()
+
+
+def get_cache_key(processed_image, partition_number):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{partition_number}:{processed_image.shape}".encode())
+    digest.update(processed_image.tobytes())
+    return digest.hexdigest()
+
+
+class OcrCache:
+    eviction_interval = 50  # entries added between checks of the cache size
+
+    def __init__(self, namespace, path=cache_path, max_bytes=default_max_bytes):
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        # every scanner worker has its own connection, sqlite serialises the writes
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, namespace TEXT, metadata TEXT, size INTEGER, last_used REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        with self.connection:
+            removed = self.connection.execute(
+                "DELETE FROM results WHERE namespace != ?", (namespace,)
+            ).rowcount
+        if removed:
+            logging.info(f"OCR cache is out of date, removed {removed} entries")
+
+    # the metadata cached for this panel, or None if it isn't cached
+    def get(self, processed_image, partition_number):
+        key = get_cache_key(processed_image, partition_number)
+        row = self.connection.execute(
+            "SELECT metadata FROM results WHERE key = ? AND namespace = ?",
+            (key, self.namespace),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.connection:
+            self.connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        return json.loads(row[0])
+
+    def put(self, processed_image, partition_number, metadata):
+        key = get_cache_key(processed_image, partition_number)
+        metadata_json = json.dumps(metadata)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (key, self.namespace, metadata_json, len(metadata_json) + len(key), time.time()),
+            )
+        self.added += 1
+        if self.added % self.eviction_interval == 0:
+            self.evict()
+
+    # drop the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        with self.connection:
+            removed = self.connection.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS total FROM results) "
+                "WHERE total > ?)",
+                (self.max_bytes,),
+            ).rowcount
+        if removed:
+            logging.info(f"OCR cache is full, removed {removed} least recently used entries")
+
+    def close(self):
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,160 @@
+import os
+import logging
+
+# OCR engine layer used by the image scanner
+# the preferred engine keeps a single tesseract instance (and its LSTM model) loaded for the lifetime of the process
+# and hands it the in-memory numpy buffers from preprocess_image, so we skip the temp file + process spawn + model load
+# that pytesseract.image_to_string pays for every drive
+# pytesseract is kept as the fallback if tesserocr isn't installed or can't load the model
+# both are only imported when an engine is created, so processes that never OCR anything (eg: the collector) don't
+# pay for them at startup
+
+# the language and page segmentation mode we scan drive panels with
+ocr_language = "eng"
+default_psm = 6  # assume a single uniform block of text
+
+# set the path to the tesseract-ocr folder
+tesseract_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Tesseract-OCR")
+tesseract_path = tesseract_folder + "\\tesseract.exe"
+tessdata_path = os.path.join(tesseract_folder, "tessdata")
+
+
+# identifies the trained model we OCR with, so results cached with a different model are thrown away
+def get_traineddata_id(tessdata=tessdata_path, language=ocr_language):
+    traineddata = os.path.join(tessdata, f"{language}.traineddata")
+    if not os.path.exists(traineddata):
+        return f"{language}-system"
+    stat = os.stat(traineddata)
+    return f"{language}-{stat.st_size}-{int(stat.st_mtime)}"
+
+
+class PytesseractEngine:
+    # spawns a tesseract process per call, slow but always available
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+
+        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.pytesseract = pytesseract
+
+    def image_to_string(self, image, psm=default_psm):
+        config = f"--oem 1 -l {ocr_language} --psm {psm}"  # force NN+LSTM finetuned model
+        return self.pytesseract.image_to_string(image, config=config)
+
+    # the text lines found in the image as a list of (text, top, bottom)
+    def image_to_lines(self, image, psm=default_psm):
+        config = f"--oem 1 -l {ocr_language} --psm {psm}"
+        data = self.pytesseract.image_to_data(
+            image, config=config, output_type=self.pytesseract.Output.DICT
+        )
+        lines = {}
+        for i in range(len(data["text"])):
+            word = data["text"][i].strip()
+            if not word:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            top = data["top"][i]
+            bottom = top + data["height"][i]
+            if key in lines:
+                text, line_top, line_bottom = lines[key]
+                lines[key] = (text + " " + word, min(line_top, top), max(line_bottom, bottom))
+            else:
+                lines[key] = (word, top, bottom)
+        return [lines[key] for key in sorted(lines)]
+
+    def model_id(self):
+        try:
+            version = self.pytesseract.get_tesseract_version()
+        except Exception:
+            version = "unknown"
+        return f"{self.name}-{version}-{get_traineddata_id()}"
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    # keeps one tesseract api (and its loaded model) around and feeds it raw image buffers
+    name = "tesserocr"
+
+    def __init__(self, tessdata=tessdata_path, language=ocr_language):
+        from tesserocr import PyTessBaseAPI, OEM, RIL, iterate_level
+
+        self.RIL = RIL
+        self.iterate_level = iterate_level
+        # use the bundled tessdata if we have it, otherwise let tesseract find its own
+        if os.path.isdir(tessdata):
+            self.api = PyTessBaseAPI(
+                path=tessdata, lang=language, psm=default_psm, oem=OEM.LSTM_ONLY
+            )
+        else:
+            self.api = PyTessBaseAPI(lang=language, psm=default_psm, oem=OEM.LSTM_ONLY)
+        self.psm = default_psm
+
+    def set_image(self, image, psm):
+        if isinstance(image, str):  # allow image paths like pytesseract does
+            self.api.SetImageFile(image)
+        else:
+            # preprocess_image gives us a single channel uint8 array, hand its buffer straight to tesseract
+            if image.ndim == 3:
+                height, width, channels = image.shape
+            else:
+                height, width = image.shape
+                channels = 1
+            if not image.flags["C_CONTIGUOUS"]:
+                image = image.copy()
+            self.api.SetImageBytes(
+                image.tobytes(), width, height, channels, width * channels
+            )
+        if psm != self.psm:
+            self.api.SetPageSegMode(psm)
+            self.psm = psm
+
+    def image_to_string(self, image, psm=default_psm):
+        self.set_image(image, psm)
+        return self.api.GetUTF8Text()
+
+    # the text lines found in the image as a list of (text, top, bottom)
+    def image_to_lines(self, image, psm=default_psm):
+        self.set_image(image, psm)
+        self.api.Recognize()
+        iterator = self.api.GetIterator()
+        if iterator is None:  # nothing was found
+            return []
+        lines = []
+        for line in self.iterate_level(iterator, self.RIL.TEXTLINE):
+            text = line.GetUTF8Text(self.RIL.TEXTLINE)
+            box = line.BoundingBox(self.RIL.TEXTLINE)
+            if text and text.strip() and box:
+                lines.append((text.strip(), box[1], box[3]))
+        return lines
+
+    def model_id(self):
+        return f"{self.name}-{self.api.Version()}-{get_traineddata_id()}"
+
+    def close(self):
+        self.api.End()
+
+
+# one engine per process (each scanner worker gets its own), created on first use
+_engine = None
+
+
+def create_ocr_engine(prefer="tesserocr"):
+    if prefer == "tesserocr":
+        try:
+            return TesserocrEngine()
+        except ImportError:
+            pass  # tesserocr is optional, we fall back to pytesseract without it
+        except Exception as e:
+            logging.warning(f"Could not start tesserocr, falling back to pytesseract: {e}")
+    return PytesseractEngine()
+
+
+def get_ocr_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_ocr_engine()
+        logging.info(f"Using {_engine.name} OCR engine")
+    return _engine
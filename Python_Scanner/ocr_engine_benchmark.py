@@ -0,0 +1,75 @@
+# compare the per-drive latency of the persistent tesserocr engine against the pytesseract fallback
+# usage: python ocr_engine_benchmark.py [image folder] [repeats]
+import os, sys, time, statistics
+from preprocess_images import preprocess_image
+from ocr_engine import PytesseractEngine, TesserocrEngine
+
+
+def time_engine(engine, images, repeats):
+    # returns the per-drive latencies (in seconds) and the first output for each image
+    latencies = []
+    outputs = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            text = engine.image_to_string(image)
+            latencies.append(time.perf_counter() - start)
+            if len(outputs) < len(images):
+                outputs.append(text)
+    return latencies, outputs
+
+
+def print_summary(name, latencies):
+    print(
+        f"{name}: {len(latencies)} scans, "
+        f"mean {statistics.mean(latencies) * 1000:.1f}ms, "
+        f"median {statistics.median(latencies) * 1000:.1f}ms, "
+        f"max {max(latencies) * 1000:.1f}ms per drive"
+    )
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    image_folder = sys.argv[1] if len(sys.argv) > 1 else "scan_input"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    image_files = sorted(f for f in os.listdir(image_folder) if f.endswith(".png"))
+    if not image_files:
+        print(f"No .png drive captures found in {image_folder}")
+        sys.exit(1)
+
+    # preprocess once up front so we only time the OCR stage
+    images = [
+        preprocess_image(os.path.join(image_folder, f), target_images_folder="./Target_Images")
+        for f in image_files
+    ]
+    print(f"Benchmarking {len(images)} drives x {repeats} repeats")
+
+    pytesseract_latencies, pytesseract_outputs = time_engine(
+        PytesseractEngine(), images, repeats
+    )
+    print_summary("pytesseract", pytesseract_latencies)
+
+    # the model load is a one off cost per worker, so time it separately
+    load_start = time.perf_counter()
+    try:
+        engine = TesserocrEngine()
+    except ImportError:
+        print("tesserocr is not installed - skipping the persistent engine")
+        sys.exit(0)
+    print(f"tesserocr model load: {(time.perf_counter() - load_start) * 1000:.1f}ms")
+    tesserocr_latencies, tesserocr_outputs = time_engine(engine, images, repeats)
+    engine.close()
+    print_summary("tesserocr", tesserocr_latencies)
+
+    speedup = statistics.mean(pytesseract_latencies) / statistics.mean(tesserocr_latencies)
+    print(f"Speedup: {speedup:.2f}x")
+
+    # both engines run the same model, so the text should match - flag any drive where it doesn't
+    mismatches = [
+        image_files[i]
+        for i in range(len(images))
+        if pytesseract_outputs[i].strip() != tesserocr_outputs[i].strip()
+    ]
+    if mismatches:
+        print(f"Output differs between engines for: {', '.join(mismatches)}")
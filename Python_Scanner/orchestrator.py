@@ -1,12 +1,16 @@
-import sys
-import os, re, time
-from multiprocessing import Process, Queue, freeze_support
+import argparse
+import os, re, sys, time
+from multiprocessing import Queue, freeze_support, get_start_method
+from import_profiler import import_profiler, import_profile_path, write_import_profile, get_import_summary
 
 # python script that controls the scanning of the disk drives
 # logging to file is handled by the the imageScanner.py and getImages.py scripts themselves
 
+# the most seconds it should take from starting a scan to the first input to the game, warned about when it's over
+startup_budget_seconds = 5.0
 
-def prepareForScan():
+
+def prepareForScan(resume=False):
 
     # create the scan_input directory if it doesn't exist
     if not os.path.exists("scan_input"):
@@ -21,9 +25,12 @@ def prepareForScan():
         if file.endswith(".png"):
             os.remove("scan_input/" + file)
 
-    # delete old .json file in the scan_output directory
-    if os.path.exists("scan_output/scan_data.json"):
-        os.remove("scan_output/scan_data.json")
+    # delete old .json file, results spool and checkpoint in the scan_output directory
+    # unless we're resuming, in which case the new results are added to the old ones
+    if not resume:
+        for file in ("scan_data.json", "scan_data.jsonl", "scan_checkpoint.json"):
+            if os.path.exists("scan_output/" + file):
+                os.remove("scan_output/" + file)
 
     # find any old log files in the scan_output directory
     old_log_files = []
@@ -74,97 +81,295 @@ def cleanupImages():
 if __name__ == "__main__":
     freeze_support()  # Needed to prevent infinite import loop on Windows when building the exe
     overallStartTime = time.time()
+    # checked before the arguments are parsed, so the imports below are profiled too
+    if "--profile-imports" in sys.argv:
+        import_profiler.start()
 
     # get current directory so we can return to it later
     current_directory = os.getcwd()
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    prepareForScan()
 
-    from getImages import getImages
-    from imageScanner import imageScanner
+    from getImages import getImages, getDiskDriveFrameShape
+    from frame_transport import FrameRing, default_ring_memory_mb
+    from capture_tuner import feedback_queue_size
+    from process_supervisor import Supervisor
+    from scan_checkpoint import ScanCheckpoint, checkpoint_path, find_resume_point
+    from scan_spool import get_processed_scans, build_scan_data
+    from scan_history import record_scan
+    from metrics import metrics_path, prometheus_path
+    from tracing import trace_path, write_trace
+    from ui_calibration import calibration_path
+    from imageScanner import (
+        imageScanner,
+        scanCollector,
+        get_worker_count,
+        limit_ocr_threads,
+    )
 
     # get  arguments from the command line when running the script
-    # this will come in the form of: python orchestrator.py <PageLoadTime> <DiscScanTime>
-    # if we don't have the correct number of arguments, we will keep the defaults
+    # this will come in the form of: python orchestrator.py <PageLoadTime> <DiscScanTime> [--workers N] [--resume]
+    # if we don't have the page load and disc scan times, we will keep the defaults
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pageLoadTime", type=float, nargs="?", default=2)
+    parser.add_argument("discScanTime", type=float, nargs="?", default=0.25)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of image scanner workers (defaults to one per spare core)",
+    )
+    parser.add_argument(
+        "--stable-frames",
+        type=int,
+        default=2,
+        help="identical polls of a drive's panel needed before it is captured",
+    )
+    parser.add_argument(
+        "--no-autotune",
+        action="store_true",
+        help="don't tune the capture settle time from the scan results",
+    )
+    parser.add_argument(
+        "--spool-to-disk",
+        action="store_true",
+        help="save captures to scan_input as .png files instead of sending them through shared memory (for debugging)",
+    )
+    parser.add_argument(
+        "--ring-memory",
+        type=int,
+        default=default_ring_memory_mb,
+        help="memory budget in MB for captures waiting to be scanned",
+    )
+    parser.add_argument(
+        "--no-ocr-cache",
+        action="store_true",
+        help="scan every drive again instead of reusing the results of earlier scans",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        default=None,
+        help="save every screenshot and input of the scan to a recording that can be replayed later",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        default=None,
+        help="play back a recording instead of scanning the game, no game or display needed",
+    )
+    parser.add_argument(
+        "--capture",
+        choices=("auto", "mss", "pyautogui"),
+        default="auto",
+        help="how the screen is captured, auto uses mss if it's installed",
+    )
+    parser.add_argument(
+        "--recalibrate",
+        action="store_true",
+        help=f"measure where the game's UI is again instead of loading it from {calibration_path}",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="carry on from where the last scan stopped, keeping the drives it already scanned",
+    )
+    parser.add_argument(
+        "--prometheus",
+        action="store_true",
+        help=f"also write the scan's metrics in the Prometheus text format to {prometheus_path}",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help=f"write a timeline of the capture and scanner processes to {trace_path} (Chrome trace format)",
+    )
+    parser.add_argument(
+        "--profile-imports",
+        action="store_true",
+        help=f"time how long each module takes to import in every process, written to {import_profile_path}",
+    )
+    parser.add_argument(
+        "--launch-time",
+        type=float,
+        default=None,
+        help="when the scan was started (eg: the start scan button was clicked) in seconds since the epoch, "
+        "defaults to when the scanner started",
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=startup_budget_seconds,
+        help="the most seconds it should take from starting the scan to the first input to the game",
+    )
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay can't be used together")
+
+    # work out where the last scan got to before anything is cleaned up
+    resumePoint = None
+    if args.resume:
+        if not os.path.exists(checkpoint_path):
+            print("No scan to resume, starting a new scan")
+            args.resume = False
+        else:
+            resumePoint = find_resume_point(ScanCheckpoint().load(), get_processed_scans())
+            if resumePoint is None:
+                print("The last scan already finished, nothing to resume")
+                build_scan_data()
+                sys.exit(0)
+            print(f"Resuming the scan from {resumePoint}")
+    prepareForScan(resume=args.resume)
+
+    pageLoadTime = args.pageLoadTime
+    discScanTime = args.discScanTime
+    workerCount = get_worker_count(args.workers)
+
+    # set before the workers start so they inherit it
+    limit_ocr_threads()
+
+    # captures in flight are bounded by the ring's memory budget
+    # the screen size (from the real screen or the recording) and the UI calibration decide the size of the captures
+    frame_ring = None
+    if not args.spool_to_disk:
+        frame_ring = FrameRing(
+            getDiskDriveFrameShape(args.replay, args.recalibrate),
+            memory_budget=args.ring_memory * 1024 * 1024,
+        )
+        print(
+            f"Sending captures through {frame_ring.slot_count} shared memory slots "
+            f"({frame_ring.memory_budget / (1024 * 1024):.1f} MB)"
+        )
 
-    pageLoadTime = 2
-    discScanTime = 0.25
+    image_queue = Queue()
+    result_queue = Queue()
+    feedback_queue = Queue(maxsize=feedback_queue_size)  # per-drive results going back to getImages
+    supervisor = Supervisor(trace=args.trace, profile_imports=args.profile_imports)
+    supervisor.add(
+        "getImages",
+        "getImages",
+        getImages,
+        (
+            (image_queue),
+            (pageLoadTime),
+            (discScanTime),
+            (frame_ring),
+            (args.stable_frames),
+            (feedback_queue),
+            (not args.no_autotune),
+            (resumePoint),
+            (args.record),
+            (args.replay),
+            (args.capture),
+            (args.recalibrate),
+        ),
+    )
+    for i in range(workerCount):
+        supervisor.add(
+            f"imageScanner worker {i}",
+            "imageScanner",
+            imageScanner,
+            (image_queue, result_queue, i, frame_ring, not args.no_ocr_cache),
+        )
+    supervisor.add(
+        "scanCollector",
+        "imageScanner",
+        scanCollector,
+        (result_queue, workerCount, feedback_queue),
+    )
+    print(f"Starting {workerCount} image scanner workers")
 
-    if len(sys.argv) == 3:
-        pageLoadTime = float(sys.argv[1])
-        discScanTime = float(sys.argv[2])
+    # Monitor the processes - shutdown gracefully as soon as any of them fails
+    scanFinished = supervisor.run()
 
-    image_queue = Queue()
-    GetImagesStartTime = time.time()
-    GetImagesEndTime = 0
-    imageScannerEndTime = 0
-    imageScannerStartTime = time.time()
-    GetImagesStopped = False
-    imageScannerStopped = False
-    get_images_process = Process(
-        target=getImages, args=((image_queue), (pageLoadTime), (discScanTime))
-    )
-    image_scanner_process = Process(target=imageScanner, args=(image_queue,))
-
-    get_images_process.start()
-    image_scanner_process.start()
-
-    # Monitor the processes - shutdown gracefully if one of them fails
-    while True:
-        get_images_process.join(timeout=0.1)
-        image_scanner_process.join(timeout=0.1)
-
-        if get_images_process.exitcode is not None:
-            if get_images_process.exitcode == 1:
-                print(
-                    "getImages process exited with error code 1. Terminating imageScanner process."
-                )
-                image_scanner_process.terminate()
-                break
-            elif get_images_process.exitcode == 0 and not GetImagesStopped:
-                print("getImages process completed successfully.")
-                GetImagesEndTime = time.time()
-                GetImagesStopped = True
-
-        if image_scanner_process.exitcode is not None:
-            if image_scanner_process.exitcode == 1:
-                print(
-                    "imageScanner process exited with error code 1. Terminating getImages process."
-                )
-                get_images_process.terminate()
-                break
-            elif image_scanner_process.exitcode == 0 and not imageScannerStopped:
-                print("imageScanner process completed successfully.")
-                imageScannerEndTime = time.time()
-                imageScannerStopped = True
-
-        if not get_images_process.is_alive() and not image_scanner_process.is_alive():
-            break
+    # keep this scan's drives so later scans can be compared against it
+    if scanFinished:
+        try:
+            runId = record_scan()
+            print(f"Saved scan {runId} to the scan history")
+        except Exception as e:
+            print(f"Could not save the scan to the scan history: {e}")
 
+    if frame_ring is not None:
+        frame_ring.close()
     cleanupImages()
 
+    # each stage's time is from when its first process started to when its last one finished, as they reported it
+    stageSeconds = {}
+    for stage in ("getImages", "imageScanner"):
+        stage_times = supervisor.stage_times(stage)
+        if stage_times is not None:
+            stageSeconds[stage] = stage_times[1] - stage_times[0]
+
+    # the metrics every process sent back, merged by the supervisor
+    metrics = supervisor.metrics
+    # how long it took from starting the scan to getImages' first input to the game
+    launchTime = args.launch_time or overallStartTime
+    startupSeconds = None
+    if "first_input" in supervisor.milestones:
+        startupSeconds = supervisor.milestones["first_input"] - launchTime
+        metrics.observe("startup_seconds", startupSeconds)
+    try:
+        metrics.write_summary(
+            metrics_path,
+            finished_cleanly=scanFinished,
+            workers=workerCount,
+            stage_seconds=stageSeconds,
+            startup_seconds=startupSeconds,
+            startup_budget_seconds=args.startup_budget,
+        )
+        if args.prometheus:
+            metrics.write_prometheus(prometheus_path)
+    except OSError as e:
+        print(f"Could not write the scan metrics: {e}")
+    if args.trace:
+        try:
+            write_trace(supervisor.trace_events, trace_path, workers=workerCount)
+            print(f"Wrote the scan trace to {trace_path}")
+        except OSError as e:
+            print(f"Could not write the scan trace: {e}")
+    if args.profile_imports:
+        import_profiler.stop()
+        importProfiles = {"orchestrator": import_profiler.get_imports()}
+        importProfiles.update(supervisor.import_profiles)
+        for name, imports in importProfiles.items():
+            print(f"Imports in {name}: {get_import_summary(imports)}")
+        # forked processes start with what the orchestrator imported, so only its own profile is complete
+        forkedProcesses = ()
+        if get_start_method() == "fork":
+            forkedProcesses = tuple(supervisor.import_profiles)
+            print("The processes were forked, so their profiles leave out what the orchestrator had imported")
+        try:
+            write_import_profile(importProfiles, import_profile_path, forked=forkedProcesses)
+            print(f"Wrote the import profile to {import_profile_path}")
+        except OSError as e:
+            print(f"Could not write the import profile: {e}")
+
     os.chdir(current_directory)
 
-    print("Get Images Time: ", GetImagesEndTime - GetImagesStartTime)
-    print("Image Scanner Time: ", imageScannerEndTime - imageScannerStartTime)
+    for stage, label in (("getImages", "Get Images Time"), ("imageScanner", "Image Scanner Time")):
+        if stage in stageSeconds:
+            print(f"{label}: ", stageSeconds[stage])
     print("Overall Time: ", time.time() - overallStartTime)
+    if startupSeconds is not None:
+        print(f"Time to first input: {startupSeconds:.2f}s (budget {args.startup_budget:.2f}s)")
+        if startupSeconds > args.startup_budget:
+            print(
+                f"Warning: the scan took {startupSeconds - args.startup_budget:.2f}s longer than its budget to start, "
+                "run with --profile-imports to see where the time went"
+            )
 
-
-    log_path = os.path.join("Python_Scanner", "scan_output", "log.txt")
-    # Calculate error rate
-    if os.path.exists(log_path):
-        try:
-            with open(log_path, "r") as file:
-                log_lines = file.readlines()
-                print(f"Successfully read {len(log_lines)} lines from log file")
-                error_count = sum('ERROR' in line for line in log_lines)
-                info_count = sum('INFO - Processing' in line for line in log_lines)
-                if info_count > 0:
-                    error_rate = error_count / info_count * 100
-                    print(f"Error Rate: {error_rate:.2f}% ({error_count} errors out of {info_count} scans)")
-                else:
-                    print("No scans were processed - cannot calculate error rate")
-        except Exception as e:
-            print(f"Error reading log file: {str(e)}")
+    # Calculate error rate, from what the scanner workers counted rather than by reading the log back
+    drivesProcessed = metrics.get_counter_totals("drives_processed", by="status")
+    scanCount = sum(drivesProcessed.values())
+    if scanCount > 0:
+        errorCount = scanCount - drivesProcessed.get("valid", 0)
+        errorRate = errorCount / scanCount * 100
+        print(f"Error Rate: {errorRate:.2f}% ({errorCount} errors out of {scanCount} scans)")
+        failures = metrics.get_counter_totals("failures", by="type")
+        if failures:
+            print(
+                "Failures by type: "
+                + ", ".join(f"{failureType}: {count}" for failureType, count in sorted(failures.items()))
+            )
     else:
-        print("No log file found - cannot calculate error rate")
+        print("No scans were processed - cannot calculate error rate")
@@ -0,0 +1,140 @@
+import os
+import json
+import logging
+
+# learns where each field sits on a preprocessed drive panel, so later drives only OCR those bands
+# the panel layout is fixed for a given resolution (and preprocess_image always scales it to the same size), so once
+# we've seen where the fields are on a few drives we can skip the headers and the set effect text entirely
+# the bands are:
+#   level - the "Lv. current/max" line
+#   main_stat - the main stat name and value, the line after "Main Stat"
+#   details - from the first sub-stat down to the set name, OCRed as one block since the number of sub-stats varies
+#     it reaches as far down as the set name would be on a drive with every sub-stat, even if the drives it was learned
+#     from had fewer
+
+# page segmentation modes for each band
+band_psm = {
+    "level": 7,  # a single line
+    "main_stat": 7,
+    "details": 6,  # a uniform block of lines
+}
+
+
+class PanelLayout:
+    learning_drives = 3  # drives to learn from before switching to band OCR
+    max_misses = 3  # band OCR failures in a row before going back to learning
+    band_padding = 4  # pixels of padding around each band
+    max_sub_stats = 4  # the most sub-stats a drive can have
+
+    def __init__(self, image_shape, profile_path=None):
+        self.image_shape = tuple(image_shape[:2])
+        self.profile_path = profile_path
+        self.observations = []
+        self.bands = None  # band name -> (top, bottom)
+        self.misses = 0
+        if profile_path and os.path.exists(profile_path):
+            self.load()
+
+    @property
+    def ready(self):
+        return self.bands is not None
+
+    # learn the bands from the (text, top, bottom) lines of a full panel OCR that was parsed successfully
+    def learn(self, lines):
+        bands = find_bands(lines)
+        if bands is None:
+            return
+        self.observations.append(bands)
+        if len(self.observations) < self.learning_drives:
+            return
+        height = self.image_shape[0]
+        self.bands = {
+            name: (
+                max(0, min(o[name][0] for o in self.observations) - self.band_padding),
+                min(height, max(o[name][1] for o in self.observations) + self.band_padding),
+            )
+            for name in band_psm
+        }
+        # make room for the sub-stats none of the drives we learned from had
+        missing_sub_stats = self.max_sub_stats - max(o["sub_stats"] for o in self.observations)
+        if missing_sub_stats > 0:
+            line_pitch = max(o["line_pitch"] for o in self.observations)
+            top, bottom = self.bands["details"]
+            self.bands["details"] = (top, min(height, int(bottom + missing_sub_stats * line_pitch)))
+        self.observations = []
+        logging.info(f"Learned panel layout {self.bands}")
+        self.save()
+
+    # a drive's bands couldn't be parsed, go back to full panel OCR if it keeps happening
+    def record_miss(self):
+        self.misses += 1
+        if self.misses >= self.max_misses:
+            logging.warning("Panel layout keeps failing, relearning it")
+            self.bands = None
+            self.misses = 0
+
+    def record_hit(self):
+        self.misses = 0
+
+    def load(self):
+        try:
+            with open(self.profile_path, "r") as f:
+                profile = json.load(f)
+            if tuple(profile["image_shape"]) == self.image_shape:
+                self.bands = {name: tuple(band) for name, band in profile["bands"].items()}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Could not load panel layout from {self.profile_path}: {e}")
+
+    def save(self):
+        if not self.profile_path:
+            return
+        # several workers can learn at once, so write to a temp file and swap it in
+        temp_path = f"{self.profile_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"image_shape": self.image_shape, "bands": self.bands}, f, indent=4)
+        os.replace(temp_path, self.profile_path)
+
+
+# find each band's (top, bottom) from the lines of a full panel OCR, the same way extract_metadata finds the fields
+def find_bands(lines):
+    texts = [text for text, _, _ in lines]
+
+    def first_index(substring):
+        for i, text in enumerate(texts):
+            if substring in text:
+                return i
+        return None
+
+    level_index = first_index("/")
+    main_index = first_index("Main")
+    sub_index = first_index("Sub")
+    set_index = first_index("Set")
+    if None in (level_index, main_index, sub_index, set_index):
+        return None
+    if not (main_index + 1 < sub_index < set_index < len(lines) - 1):
+        return None
+    # the sub-stats are the lines between their header and the set effect's, one each
+    sub_stats = set_index - sub_index - 1
+    return {
+        "level": lines[level_index][1:],
+        "main_stat": lines[main_index + 1][1:],
+        "details": (lines[sub_index + 1][1], lines[set_index + 1][2]),
+        "sub_stats": sub_stats,
+        "line_pitch": (lines[set_index][1] - lines[sub_index][1]) / (sub_stats + 1),
+    }
+
+
+# one layout per preprocessed image size, per process
+_layouts = {}
+
+
+def get_panel_layout(image_shape, profile_folder="scan_output"):
+    key = tuple(image_shape[:2])
+    if key not in _layouts:
+        profile_path = None
+        if profile_folder and os.path.isdir(profile_folder):
+            profile_path = os.path.join(
+                profile_folder, f"panel_layout_{key[1]}x{key[0]}.json"
+            )
+        _layouts[key] = PanelLayout(key, profile_path)
+    return _layouts[key]
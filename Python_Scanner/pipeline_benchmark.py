@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import cv2
+import numpy as np
+from multiprocessing import Queue, freeze_support
+
+# end to end benchmark of the scanner pipeline, it runs without the game so it works on Linux
+# the drives come from either
+#   a folder of captures (PartitionXScanY.png, eg: saved by orchestrator.py --spool-to-disk), fed to the scanner
+#   a recording of a real scan (orchestrator.py --record), replayed through getImages
+# it reports the throughput, the latency of each drive (from its capture to its result reaching the collector), the
+# time from the last capture to the final scan_data.json, the peak memory of each process and, given golden labels,
+# how many drives were read correctly
+# results are written as JSON so runs can be compared
+# the pipeline runs in a temporary folder of its own (with a copy of Target_Images), so the scan output, checkpoint and
+# profiles it writes never touch the last real scan in the scanner's scan_output
+# usage: python pipeline_benchmark.py <capture folder or recording> [--labels golden.jsonl] [--workers N]
+
+from frame_transport import FrameRing, send_frame, default_ring_memory_mb
+from process_supervisor import Supervisor
+from tracing import write_trace
+from scan_spool import read_spool, spool_path, scan_data_path
+from imageScanner import (
+    imageScanner,
+    scanCollector,
+    get_scan_id,
+    get_worker_count,
+    limit_ocr_threads,
+)
+
+benchmark_folder = "scan_output/benchmarks"
+
+
+# the captures in a folder as (path, partition, scan number), in the order they were captured
+def list_corpus(corpus_folder):
+    corpus = []
+    for file in os.listdir(corpus_folder):
+        if file.endswith(".png") and file.startswith("Partition"):
+            partition, scan_number = get_scan_id(file)
+            corpus.append((os.path.join(corpus_folder, file), partition, scan_number))
+    corpus.sort(key=lambda capture: (capture[1], capture[2]))
+    return corpus
+
+
+# stands in for getImages, sends each capture in the corpus to the scanner
+def feed_corpus(queue: Queue, corpus, frame_ring: FrameRing = None, capture_interval=0.0):
+    for path, partition, scan_number in corpus:
+        send_frame(queue, cv2.imread(path), partition, scan_number, frame_ring)
+        if capture_interval > 0:
+            time.sleep(capture_interval)
+    queue.put("Done")
+
+
+# the drives we should have read, from a file in the same format as the scan_data.jsonl spool
+def load_labels(labels_path):
+    return {
+        (record["partition"], record["scan"]): record["drive"]
+        for record in read_spool(labels_path)
+        if record.get("drive") is not None
+    }
+
+
+def get_percentiles(values):
+    if not values:
+        return None
+    values = np.array(values) * 1000
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+    }
+
+
+# compare what was read against the golden labels, drive by drive and field by field
+def get_accuracy(drives, labels):
+    correct_drives = 0
+    field_counts = {}
+    for key, label in labels.items():
+        # round trip through json so tuples and lists compare the same
+        drive = json.loads(json.dumps(drives.get(key)))
+        label = json.loads(json.dumps(label))
+        if drive == label:
+            correct_drives += 1
+        for field, value in label.items():
+            correct, total = field_counts.get(field, (0, 0))
+            field_counts[field] = (
+                correct + (drive is not None and drive.get(field) == value),
+                total + 1,
+            )
+    return {
+        "labelled_drives": len(labels),
+        "drive_accuracy": correct_drives / len(labels) if labels else None,
+        "field_accuracy": {
+            field: correct / total for field, (correct, total) in field_counts.items()
+        },
+    }
+
+
+# a temporary folder laid out like the scanner's, for the pipeline to run in
+def create_benchmark_folder():
+    folder = tempfile.mkdtemp(prefix="zzz_benchmark_")
+    shutil.copytree("Target_Images", os.path.join(folder, "Target_Images"))
+    os.makedirs(os.path.join(folder, "scan_output"))
+    os.makedirs(os.path.join(folder, "scan_input"))
+    return folder
+
+
+def run_benchmark(args):
+    scanner_directory = os.getcwd()
+    folder = create_benchmark_folder()
+    os.chdir(folder)
+    try:
+        return run_pipeline(args, folder)
+    finally:
+        os.chdir(scanner_directory)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_pipeline(args, folder):
+    limit_ocr_threads()
+    worker_count = get_worker_count(args.workers)
+    replay = os.path.isfile(args.source)
+
+    if replay:
+        from getImages import getImages, getDiskDriveFrameShape
+
+        frame_shape = getDiskDriveFrameShape(replay_path=args.source)
+        drive_count = None
+    else:
+        corpus = list_corpus(args.source)
+        if not corpus:
+            print(f"No captures found in {args.source}")
+            sys.exit(1)
+        # the ring's slots have to fit the biggest capture
+        frame_shape = tuple(
+            int(size) for size in np.max([cv2.imread(path).shape for path, _, _ in corpus], axis=0)
+        )
+        drive_count = len(corpus)
+
+    frame_ring = FrameRing(frame_shape, memory_budget=args.ring_memory * 1024 * 1024)
+    image_queue = Queue()
+    result_queue = Queue()
+    # the processes are told where to run, a spawned process would otherwise end up wherever importing us moved it to
+    supervisor = Supervisor(trace=args.trace is not None, working_folder=folder)
+    if replay:
+        supervisor.add(
+            "getImages",
+            "capture",
+            getImages,
+            (
+                image_queue,
+                0,  # page load time, the recording already has the screens loaded
+                args.disc_scan_time,
+                frame_ring,
+                args.stable_frames,
+                None,  # no feedback queue
+                False,  # don't tune the capture timing
+                None,  # resume point
+                None,  # record path
+                args.source,  # replay path
+            ),
+        )
+    else:
+        supervisor.add(
+            "feed_corpus",
+            "capture",
+            feed_corpus,
+            (image_queue, corpus, frame_ring, args.capture_interval),
+        )
+    for i in range(worker_count):
+        supervisor.add(
+            f"imageScanner worker {i}",
+            "imageScanner",
+            imageScanner,
+            (image_queue, result_queue, i, frame_ring, args.ocr_cache),
+        )
+    supervisor.add("scanCollector", "imageScanner", scanCollector, (result_queue, worker_count))
+
+    print(
+        f"Benchmarking {drive_count or 'the recorded'} drives from {args.source} with {worker_count} workers"
+    )
+    start_time = time.time()
+    finished = supervisor.run()
+    frame_ring.close()
+
+    records = list(read_spool(spool_path))
+    capture_times = [r["captured"] for r in records if r.get("captured") is not None]
+    latencies = [
+        r["processed"] - r["captured"] for r in records if r.get("captured") is not None
+    ]
+    drives = {
+        (r["partition"], r["scan"]): r["drive"] for r in records if r["status"] == "valid"
+    }
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+
+    results = {
+        "source": os.path.abspath(args.source),
+        "mode": "replay" if replay else "corpus",
+        "started": start_time,
+        "finished_cleanly": finished,
+        "workers": worker_count,
+        "drives": len(records),
+        "statuses": statuses,
+    }
+    if capture_times and os.path.exists(scan_data_path):
+        json_time = os.path.getmtime(scan_data_path)
+        elapsed = json_time - min(capture_times)
+        results["elapsed_seconds"] = elapsed
+        results["drives_per_second"] = len(records) / elapsed if elapsed > 0 else None
+        results["last_capture_to_json_seconds"] = json_time - max(capture_times)
+    results["latency_ms"] = get_percentiles(latencies)
+    results["stage_seconds"] = {}
+    for stage in ("capture", "imageScanner"):
+        stage_times = supervisor.stage_times(stage)
+        if stage_times is not None:
+            results["stage_seconds"][stage] = stage_times[1] - stage_times[0]
+    results["peak_rss_mb"] = {
+        p.name: p.peak_rss / (1024 * 1024) if p.peak_rss is not None else None
+        for p in supervisor.processes
+    }
+    # where the time went inside each drive, from the metrics the processes sent back
+    results["metrics"] = supervisor.metrics.summary()
+    if args.labels:
+        results["accuracy"] = get_accuracy(drives, load_labels(args.labels))
+    if args.trace:
+        write_trace(supervisor.trace_events, args.trace, source=results["source"])
+        results["trace"] = args.trace
+    return results
+
+
+if __name__ == "__main__":
+    freeze_support()
+    parser = argparse.ArgumentParser(description="Benchmark the scanner pipeline without the game")
+    parser.add_argument("source", help="folder of PartitionXScanY.png captures, or a scan recording")
+    parser.add_argument("--labels", default=None, help="golden labels, in the scan_data.jsonl format")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="where to write the results")
+    parser.add_argument(
+        "--capture-interval",
+        type=float,
+        default=0.0,
+        help="seconds between feeding captures from a folder, 0 feeds them as fast as the ring takes them",
+    )
+    parser.add_argument("--disc-scan-time", type=float, default=0.25)
+    parser.add_argument("--stable-frames", type=int, default=2)
+    parser.add_argument("--ring-memory", type=int, default=default_ring_memory_mb)
+    parser.add_argument(
+        "--ocr-cache",
+        action="store_true",
+        help="use the OCR result cache (off by default, so every drive is scanned)",
+    )
+    parser.add_argument(
+        "--trace", default=None, metavar="PATH", help="also write a Chrome trace of the run to PATH"
+    )
+    args = parser.parse_args()
+    # paths are relative to where we were run from, but the pipeline runs in the scanner's folder
+    launch_directory = os.getcwd()
+    args.source = os.path.join(launch_directory, args.source)
+    args.labels = os.path.join(launch_directory, args.labels) if args.labels else None
+    args.trace = os.path.join(launch_directory, args.trace) if args.trace else None
+    output = os.path.join(launch_directory, args.output) if args.output else None
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = run_benchmark(args)
+
+    if output is None:
+        os.makedirs(benchmark_folder, exist_ok=True)
+        output = os.path.join(
+            benchmark_folder, time.strftime("benchmark_%Y%m%d_%H%M%S.json", time.localtime())
+        )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(json.dumps(results, indent=4))
+    print(f"Results written to {output}")
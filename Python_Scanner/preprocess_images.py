@@ -1,14 +1,20 @@
 import os, cv2
+from template_bank import screen_size_from_panel
+from rarity_classifier import get_rarity_classifier
 
 
 # given a path, preprocess the image for tesseract
+# NOTE: you can also pass in a BGR image array (eg: a frame from the shared memory ring) instead of a path
+# screen_size is the screen the panel was captured from, without it it's worked out from the panel's size
 def preprocess_image(
-    image_path, save_path=None, target_images_folder="../Target_Images"
+    image_path, save_path=None, target_images_folder="../Target_Images", screen_size=None
 ):
-    rarity_icon_threshold = 0.8
     agent_icon_threshold = 0.8
     # Load the image
-    image = cv2.imread(image_path)
+    if isinstance(image_path, str):
+        image = cv2.imread(image_path)
+    else:
+        image = image_path
 
     # Convert the image to grayscale
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -18,47 +24,24 @@ def preprocess_image(
         gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
     )
 
-    # Define icon paths for both resolutions
-    rank_icons = {
-        'S': ['zzz-disk-drive-S-icon.png', 'zzz-disk-drive-S-icon-1080p.png'],
-        'A': ['zzz-disk-drive-A-icon.png', 'zzz-disk-drive-A-icon-1080p.png'],
-        'B': ['zzz-disk-drive-B-icon.png', 'zzz-disk-drive-B-icon-1080p.png']
-    }
-
-    # Load and match all icon variants
-    best_match = {'score': 0, 'icon': None, 'loc': None, 'match_result': None}
-    
-    for rank, icon_files in rank_icons.items():
-        for icon_file in icon_files:
-            icon = cv2.imread(
-                os.path.join(target_images_folder, icon_file),
-                cv2.IMREAD_GRAYSCALE,
-            )
-            
-            try:
-                match_result = cv2.matchTemplate(
-                    binary_image, icon, cv2.TM_CCOEFF_NORMED
-                )
-                max_val = cv2.minMaxLoc(match_result)[1]
-                
-                if max_val > rarity_icon_threshold and max_val > best_match['score']:
-                    best_match = {
-                        'score': max_val,
-                        'icon': icon,
-                        'loc': cv2.minMaxLoc(match_result)[3],
-                        'match_result': match_result
-                    }
-            except cv2.error:
-                continue
-
-    rank_match = None
+    # find the rarity icon, the classifier only searches around where it found the icon on earlier drives
+    rarity_classifier = get_rarity_classifier(
+        target_images_folder,
+        tuple(screen_size) if screen_size else screen_size_from_panel(binary_image.shape),
+    )
+    rarity_match = rarity_classifier.classify(binary_image, image)
+
+    best_match = {'score': 0, 'icon': None, 'loc': None}
+    if rarity_match is not None:
+        rank, score, loc, icon = rarity_match
+        best_match = {'score': score, 'icon': icon, 'loc': loc}
+
     # If we found a match above threshold, black out the icon area
     if best_match['icon'] is not None:
         binary_image[
             best_match['loc'][1] : best_match['loc'][1] + best_match['icon'].shape[0],
             best_match['loc'][0] : best_match['loc'][0] + best_match['icon'].shape[1],
         ] = 0
-        rank_match = best_match['match_result']  # Store the actual template matching result
 
     # remove agent icons
     # this should be done without recognition, as we don't know what the agent icons look like
@@ -70,7 +53,7 @@ def preprocess_image(
     agent_icon_y_offset = 0
 
     # calculate the agent icon bounding box
-    if rank_match is not None:
+    if best_match['icon'] is not None:
         agent_icon_y = best_match['loc'][1] + agent_icon_y_offset
         agent_icon_width = int(best_match['icon'].shape[1] * agent_icon_size_modifier)
         agent_icon_height = int(best_match['icon'].shape[0] * agent_icon_size_modifier)
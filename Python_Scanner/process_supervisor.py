@@ -0,0 +1,207 @@
+import os
+import sys
+import time
+import logging
+import importlib
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+from metrics import MetricsRegistry, registry
+from tracing import tracer
+from import_profiler import import_profiler
+
+# starts the scanner's processes and watches them until they are all done
+# instead of polling, the supervisor blocks on the process sentinels (which become ready when a process exits) and on a
+# control pipe per process, so it reacts the moment anything exits abnormally
+# each process reports its own start and end times over its control pipe, so the stage timings are the real ones
+# rather than whenever the main loop happened to notice
+# when a process ends it also sends what it recorded in its metrics registry, and the supervisor merges them all
+# the same goes for its trace, if the supervisor was asked to trace the processes, and its import profile, if it was
+# asked to profile the imports (the target is then imported by name once the process has started, so its imports are
+# timed too)
+# every process runs in the supervisor's working folder (or the one it was given), whatever importing the script it
+# was started from did to its own (a spawned process imports it again, eg: on Windows)
+# a process can also report milestones (eg: its first input to the game), the supervisor keeps the time of the first
+# report of each
+
+# the control pipe of the current process, set when it is started by a supervisor
+control_connection = None
+
+
+# send an event (eg: a stage starting or ending) to the supervisor, does nothing if we weren't started by one
+def report(event, stage=None, **data):
+    if control_connection is None:
+        return
+    try:
+        control_connection.send((event, stage, time.time(), data))
+    except (OSError, ValueError):
+        pass  # the supervisor has gone away, nothing to report to
+
+
+# the most memory this process has used so far in bytes, None where we can't tell (eg: Windows)
+def get_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS reports bytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+# the entry point of every supervised process
+# target is the function to run, or the (module name, function name) to import it from
+def run_supervised(
+    stage, target, args, connection, name=None, trace=False, profile_imports=False, working_folder=None
+):
+    global control_connection
+    control_connection = connection
+    if working_folder is not None:
+        os.chdir(working_folder)
+    if profile_imports:
+        import_profiler.start()
+    if trace:
+        tracer.enable(name)
+    report("start", stage)
+    try:
+        if isinstance(target, tuple):
+            module_name, function_name = target
+            target = getattr(importlib.import_module(module_name), function_name)
+        target(*args)
+    finally:
+        report(
+            "end",
+            stage,
+            peak_rss=get_peak_rss(),
+            metrics=registry.snapshot(),
+            trace=tracer.get_events(),
+            imports=import_profiler.get_imports() if profile_imports else None,
+        )
+        connection.close()
+
+
+# where a supervised process can import its target from by name, None if it can't (eg: it's in the script being run)
+def get_target_name(target):
+    module_name = getattr(target, "__module__", None)
+    function_name = getattr(target, "__qualname__", "")
+    if module_name in (None, "__main__", "__mp_main__") or "." in function_name:
+        return None
+    return (module_name, function_name)
+
+
+class SupervisedProcess:
+    def __init__(
+        self, name, stage, target, args, trace=False, profile_imports=False, working_folder=None
+    ):
+        self.name = name
+        self.stage = stage
+        self.reader, writer = Pipe(duplex=False)
+        if profile_imports:
+            target = get_target_name(target) or target
+        self.process = Process(
+            target=run_supervised,
+            args=(stage, target, args, writer, name, trace, profile_imports, working_folder),
+            name=name,
+        )
+        self.writer = writer
+        self.start_time = None
+        self.end_time = None
+        self.peak_rss = None  # bytes, as the process reported it when it finished
+
+    @property
+    def exitcode(self):
+        return self.process.exitcode
+
+
+class Supervisor:
+    def __init__(self, trace=False, profile_imports=False, working_folder=None):
+        self.processes = []
+        # the folder the processes run in (where scan_output and scan_input are), ours unless we're told otherwise
+        self.working_folder = working_folder or os.getcwd()
+        self.failed = None  # the process that exited abnormally, if any
+        self.metrics = MetricsRegistry()  # the metrics of every process, merged as they finish
+        self.trace = trace
+        self.trace_events = []  # the trace of every process, if tracing
+        self.profile_imports = profile_imports
+        self.import_profiles = {}  # process name -> its import profile, if profiling the imports
+        self.milestones = {}  # milestone name -> when it was first reported
+
+    # add a process to a stage, a stage can have any number of processes (eg: the scanner workers)
+    def add(self, name, stage, target, args=()):
+        supervised = SupervisedProcess(
+            name, stage, target, args, self.trace, self.profile_imports, self.working_folder
+        )
+        self.processes.append(supervised)
+        return supervised
+
+    def start(self):
+        for supervised in self.processes:
+            supervised.process.start()
+            # the child has its own copy of the write end now
+            supervised.writer.close()
+
+    # block until every process has exited, or one exits abnormally and the rest are terminated
+    # returns True if everything finished cleanly
+    def run(self):
+        self.start()
+        sentinels = {p.process.sentinel: p for p in self.processes}
+        readers = {p.reader: p for p in self.processes}
+        while sentinels:
+            for ready in wait(list(sentinels) + list(readers)):
+                if ready in readers:
+                    self.handle_message(readers, ready)
+                elif ready in sentinels:
+                    supervised = sentinels.pop(ready)
+                    supervised.process.join()
+                    # pick up anything the process sent right before it exited
+                    while supervised.reader in readers and supervised.reader.poll():
+                        self.handle_message(readers, supervised.reader)
+                    if supervised.end_time is None:
+                        supervised.end_time = time.time()
+                    if supervised.exitcode != 0:
+                        self.handle_failure(supervised)
+                        return False
+                    print(f"{supervised.name} process completed successfully.")
+        return True
+
+    def handle_message(self, readers, reader):
+        supervised = readers[reader]
+        try:
+            event, stage, timestamp, data = reader.recv()
+        except (EOFError, OSError):
+            # the process closed its end, its sentinel will tell us how it exited
+            del readers[reader]
+            return
+        if event == "start":
+            supervised.start_time = timestamp
+        elif event == "end":
+            supervised.end_time = timestamp
+            supervised.peak_rss = data.get("peak_rss")
+            if data.get("metrics"):
+                self.metrics.merge(data["metrics"])
+            self.trace_events.extend(data.get("trace") or [])
+            if data.get("imports") is not None:
+                self.import_profiles[supervised.name] = data["imports"]
+        elif event == "milestone":
+            self.milestones.setdefault(data["name"], timestamp)
+        else:
+            logging.info(f"{supervised.name}: {event} {data}")
+
+    def handle_failure(self, supervised):
+        self.failed = supervised
+        print(
+            f"{supervised.name} process exited with error code {supervised.exitcode}. Terminating the other processes."
+        )
+        for other in self.processes:
+            if other.process.is_alive():
+                other.process.terminate()
+        for other in self.processes:
+            other.process.join()
+
+    # (start, end) of a stage, from the earliest start to the latest end of its processes
+    def stage_times(self, stage):
+        processes = [p for p in self.processes if p.stage == stage]
+        starts = [p.start_time for p in processes if p.start_time is not None]
+        ends = [p.end_time for p in processes if p.end_time is not None]
+        if not starts or not ends:
+            return None
+        return min(starts), max(ends)
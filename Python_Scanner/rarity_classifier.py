@@ -0,0 +1,123 @@
+import os
+import math
+import cv2
+import numpy as np
+from template_bank import TemplateBank, get_template_bank
+
+# finds the rarity icon on a drive panel without template matching the whole panel
+# the icon always sits in about the same spot, so after a few full panel matches we calibrate a small region of
+# interest around where it was found and only search there
+# each rank's icon also has its own colour, so we learn the hue of each rank as we go and try the rank whose hue is
+# closest first, stopping as soon as one matches confidently
+
+
+class RarityClassifier:
+    match_threshold = 0.8  # same as the full panel search
+    confident_threshold = 0.9  # stop trying the other ranks past this
+    calibration_matches = 3  # full panel matches to see before restricting the search
+    roi_padding = 0.5  # padding around the calibrated icon box, as a fraction of the icon size
+
+    def __init__(self, template_bank: TemplateBank):
+        self.template_bank = template_bank
+        self.icon_boxes = []  # (x0, y0, x1, y1) of the icons found by full panel matches
+        self.roi = None  # (x0, y0, x1, y1) to search once calibrated
+        self.rank_hues = {}  # rank -> learned hue of its icon
+
+    # returns the (rank, score, top left location, icon) of the best match, or None if no icon was found
+    def classify(self, binary_image, image=None):
+        if self.roi is not None:
+            match = self.match_region(binary_image, image, self.roi)
+            if match is not None:
+                return match
+        # not calibrated yet or the icon moved, search the whole panel
+        height, width = binary_image.shape[:2]
+        match = self.match_region(binary_image, image, (0, 0, width, height))
+        if match is not None:
+            self.calibrate(match, image, binary_image.shape)
+        return match
+
+    def match_region(self, binary_image, image, region):
+        x0, y0, x1, y1 = region
+        search_area = binary_image[y0:y1, x0:x1]
+        best_match = None
+        for rank in self.rank_order(image, region):
+            icon = self.template_bank.rarity_icons[rank]
+            if search_area.shape[0] < icon.shape[0] or search_area.shape[1] < icon.shape[1]:
+                continue
+            match_result = cv2.matchTemplate(search_area, icon, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(match_result)
+            if max_val > self.match_threshold and (
+                best_match is None or max_val > best_match[1]
+            ):
+                best_match = (rank, max_val, (max_loc[0] + x0, max_loc[1] + y0), icon)
+                if max_val >= self.confident_threshold:
+                    break
+        return best_match
+
+    # try the ranks whose learned hue is closest to the region's hue first, unlearned ranks keep their usual order
+    def rank_order(self, image, region):
+        ranks = list(self.template_bank.rarity_icons)
+        if image is None or not self.rank_hues:
+            return ranks
+        hue = icon_hue(image, region)
+        if hue is None:
+            return ranks
+        return sorted(
+            ranks,
+            key=lambda rank: hue_distance(hue, self.rank_hues[rank])
+            if rank in self.rank_hues
+            else 180,
+        )
+
+    def calibrate(self, match, image, image_shape):
+        rank, _, (x, y), icon = match
+        box = (x, y, x + icon.shape[1], y + icon.shape[0])
+        if image is not None:
+            hue = icon_hue(image, box)
+            if hue is not None:
+                self.rank_hues[rank] = hue
+        if self.roi is not None:
+            return
+        self.icon_boxes.append(box)
+        if len(self.icon_boxes) < self.calibration_matches:
+            return
+        # cover every icon we've seen, padded so the search can absorb a little jitter
+        pad_x = int(icon.shape[1] * self.roi_padding)
+        pad_y = int(icon.shape[0] * self.roi_padding)
+        self.roi = (
+            max(0, min(b[0] for b in self.icon_boxes) - pad_x),
+            max(0, min(b[1] for b in self.icon_boxes) - pad_y),
+            min(image_shape[1], max(b[2] for b in self.icon_boxes) + pad_x),
+            min(image_shape[0], max(b[3] for b in self.icon_boxes) + pad_y),
+        )
+
+
+# the mean hue (0-180, like cv2) of the saturated pixels in a region of a BGR image, or None if it has no colour
+def icon_hue(image, region):
+    x0, y0, x1, y1 = region
+    hsv = cv2.cvtColor(image[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+    colored = (hsv[:, :, 1] > 80) & (hsv[:, :, 2] > 80)
+    if np.count_nonzero(colored) < 10:
+        return None
+    # hue wraps around, so average it as an angle
+    angles = hsv[:, :, 0][colored].astype(np.float32) * (math.pi / 90)
+    mean_angle = math.atan2(np.sin(angles).mean(), np.cos(angles).mean())
+    return (mean_angle * 90 / math.pi) % 180
+
+
+def hue_distance(hue_a, hue_b):
+    difference = abs(hue_a - hue_b) % 180
+    return min(difference, 180 - difference)
+
+
+# one classifier per template bank, so each worker calibrates once
+_classifiers = {}
+
+
+def get_rarity_classifier(target_images_folder, screen_size):
+    key = (os.path.abspath(target_images_folder), screen_size)
+    if key not in _classifiers:
+        _classifiers[key] = RarityClassifier(
+            get_template_bank(target_images_folder, screen_size)
+        )
+    return _classifiers[key]
@@ -0,0 +1,125 @@
+import os
+import json
+import logging
+
+# keeps track of how far a scan got, so an interrupted scan can carry on from where it stopped instead of starting over
+# getImages records every row of drives it captures, along with where that row was on screen, in a checkpoint file
+# the scan spool records every drive the scanner processed, so together they tell us the first row with drives that
+# were captured but never made it through the scanner (or weren't captured at all), which is where a resumed scan starts
+
+checkpoint_path = "scan_output/scan_checkpoint.json"
+
+partition_count = 6
+rows_per_page = 5  # rows of drives on screen at once
+
+
+# where a row of drives is on screen
+#   scroll - how many times the list was scrolled down before the row was scanned
+#   page_row - the row on screen, 1 for the top row (scanned while scrolling) and 2-5 for the rest of the last page
+class ScanCheckpoint:
+    def __init__(self, path=checkpoint_path):
+        self.path = path
+        self.partitions = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.partitions = {int(k): v for k, v in data.get("partitions", {}).items()}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read scan checkpoint, starting from the beginning: {e}")
+            self.partitions = {}
+        return self
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"partitions": self.partitions}, f, indent=4)
+        os.replace(temp_path, self.path)
+
+    def get_partition(self, partition_number):
+        return self.partitions.setdefault(partition_number, {"rows": [], "complete": False})
+
+    # record a captured row, skipped are the scan numbers that were never sent to the scanner
+    # end_found is whether the end of the drives was visible after a top row, ie: the list won't scroll any further
+    def record_row(self, partition_number, scroll, page_row, scans, skipped=(), end_found=False):
+        self.get_partition(partition_number)["rows"].append(
+            {
+                "scroll": scroll,
+                "page_row": page_row,
+                "scans": list(scans),
+                "skipped": list(skipped),
+                "end_found": end_found,
+            }
+        )
+        self.save()
+
+    def complete_partition(self, partition_number):
+        self.get_partition(partition_number)["complete"] = True
+        self.save()
+
+    # forget everything from this row onwards, it is about to be scanned again
+    def truncate(self, partition_number, row_index):
+        for later in [p for p in self.partitions if p > partition_number]:
+            del self.partitions[later]
+        partition = self.get_partition(partition_number)
+        del partition["rows"][row_index:]
+        partition["complete"] = False
+        self.save()
+
+
+# where a resumed scan starts, the row at row_index of the partition's checkpoint is scanned again
+class ResumePoint:
+    def __init__(self, partition_number, row_index=0, scroll=0, page_row=1, scan_number=1):
+        self.partition_number = partition_number
+        self.row_index = row_index
+        self.scroll = scroll
+        self.page_row = page_row
+        self.scan_number = scan_number
+
+    def __repr__(self):
+        return (
+            f"partition {self.partition_number} row {self.row_index + 1} "
+            f"(scroll {self.scroll}, page row {self.page_row}, scan {self.scan_number})"
+        )
+
+
+# the row after this one, or None if it was the last row of the partition
+def get_next_row(row):
+    if row["page_row"] == 1 and not row["end_found"]:
+        return row["scroll"] + 1, 1
+    if row["page_row"] >= rows_per_page:
+        return None
+    return row["scroll"], row["page_row"] + 1
+
+
+# the first row with a drive that wasn't processed (or was skipped), or None if the whole scan finished
+# processed_scans is the set of (partition, scan number) the scanner got through
+def find_resume_point(checkpoint: ScanCheckpoint, processed_scans):
+    for partition_number in range(1, partition_count + 1):
+        partition = checkpoint.partitions.get(partition_number)
+        if partition is None:
+            return ResumePoint(partition_number)
+        rows = partition["rows"]
+        for row_index, row in enumerate(rows):
+            # skipped drives were never sent to the scanner, so they're missing too and their row is scanned again
+            missing = [scan for scan in row["scans"] if (partition_number, scan) not in processed_scans]
+            if missing:
+                return ResumePoint(
+                    partition_number, row_index, row["scroll"], row["page_row"], row["scans"][0]
+                )
+        if partition["complete"]:
+            continue
+        # the capture stopped between rows, carry on from the row after the last one it recorded
+        if not rows:
+            return ResumePoint(partition_number)
+        next_row = get_next_row(rows[-1])
+        scan_number = max([scan for row in rows for scan in row["scans"]], default=0) + 1
+        if next_row is None:
+            # every row was captured, the partition just wasn't marked complete
+            partition["complete"] = True
+            continue
+        return ResumePoint(partition_number, len(rows), next_row[0], next_row[1], scan_number)
+    return None
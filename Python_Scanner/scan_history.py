@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+# keeps every finished scan's drives in a local SQLite database, so we can tell what changed between two scans
+# (drives that were added, removed or upgraded) and export only that, instead of re-sending the whole inventory
+# drives are matched between scans by a fingerprint of what can't change when a drive is levelled up: its set,
+# partition, rarity, main stat and the sub-stats it's sure to have dropped with
+
+history_path = "scan_output/scan_history.sqlite"
+
+# sub-stats a drive of each rarity always drops with, the rest are added as it levels up
+fingerprint_sub_stats = {"S": 3, "A": 2, "B": 1}
+
+
+# the name of a sub-stat without its rank ups (eg: DEF+1 -> DEF)
+def get_sub_stat_base_name(sub_stat_name):
+    return re.sub(r"\+\d+$", "", sub_stat_name).strip()
+
+
+def get_drive_fingerprint(drive):
+    sub_stat_names = [
+        get_sub_stat_base_name(name)
+        for name, _ in drive["random_stats"][: fingerprint_sub_stats.get(drive["drive_rarity"], 1)]
+    ]
+    identity = [
+        drive["set_name"],
+        str(drive["partition_number"]),
+        drive["drive_rarity"],
+        drive["drive_base_stat"],
+    ] + sub_stat_names
+    return hashlib.blake2b("|".join(identity).encode(), digest_size=12).hexdigest()
+
+
+def get_drive_level(drive):
+    try:
+        return int(drive["drive_current_level"])
+    except (TypeError, ValueError):
+        return 0
+
+
+class ScanHistory:
+    def __init__(self, path=history_path):
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                finished REAL,
+                drive_count INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS drives (
+                run_id INTEGER REFERENCES runs (id) ON DELETE CASCADE,
+                fingerprint TEXT,
+                level INTEGER,
+                metadata TEXT
+            );
+            CREATE INDEX IF NOT EXISTS drives_run ON drives (run_id, fingerprint);
+            CREATE INDEX IF NOT EXISTS drives_fingerprint ON drives (fingerprint, run_id);
+            """
+        )
+
+    # save a finished scan, returns its run id
+    def add_run(self, drives, finished=None):
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (finished, drive_count) VALUES (?, ?)",
+                (finished or time.time(), len(drives)),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO drives VALUES (?, ?, ?, ?)",
+                [
+                    (run_id, get_drive_fingerprint(drive), get_drive_level(drive), json.dumps(drive))
+                    for drive in drives
+                ],
+            )
+        return run_id
+
+    # (id, finished, drive count) of the saved scans, newest last
+    def get_runs(self):
+        return self.connection.execute(
+            "SELECT id, finished, drive_count FROM runs ORDER BY id"
+        ).fetchall()
+
+    # the ids of the last two scans, for diffing the latest scan against the one before it
+    def get_latest_runs(self):
+        ids = [
+            row[0]
+            for row in self.connection.execute("SELECT id FROM runs ORDER BY id DESC LIMIT 2")
+        ]
+        if len(ids) < 2:
+            return None
+        return ids[1], ids[0]
+
+    # the drives of a scan grouped by fingerprint
+    def get_drives(self, run_id):
+        drives = {}
+        for fingerprint, metadata in self.connection.execute(
+            "SELECT fingerprint, metadata FROM drives WHERE run_id = ? ORDER BY fingerprint, level",
+            (run_id,),
+        ):
+            drives.setdefault(fingerprint, []).append(json.loads(metadata))
+        return drives
+
+    # every saved version of a drive, as (run id, metadata)
+    def get_drive_history(self, fingerprint):
+        return [
+            (run_id, json.loads(metadata))
+            for run_id, metadata in self.connection.execute(
+                "SELECT run_id, metadata FROM drives WHERE fingerprint = ? ORDER BY run_id",
+                (fingerprint,),
+            )
+        ]
+
+    # the drives added, removed and upgraded (as (before, after) pairs) between two scans
+    def diff(self, old_run_id, new_run_id):
+        old_drives = self.get_drives(old_run_id)
+        new_drives = self.get_drives(new_run_id)
+        added, removed, upgraded = [], [], []
+        for fingerprint in sorted(set(old_drives) | set(new_drives)):
+            old_group = list(old_drives.get(fingerprint, []))
+            new_group = list(new_drives.get(fingerprint, []))
+            # drives that didn't change at all are paired up first, they can have the same fingerprint as another drive
+            for drive in list(new_group):
+                if drive in old_group:
+                    old_group.remove(drive)
+                    new_group.remove(drive)
+            # then what's left is paired up by level, a drive can only go up in level
+            old_group.sort(key=get_drive_level)
+            new_group.sort(key=get_drive_level)
+            while old_group and new_group:
+                before = old_group[0]
+                after = next(
+                    (d for d in new_group if get_drive_level(d) >= get_drive_level(before)), None
+                )
+                if after is None:
+                    break
+                old_group.pop(0)
+                new_group.remove(after)
+                upgraded.append((before, after))
+            removed.extend(old_group)
+            added.extend(new_group)
+        return added, removed, upgraded
+
+    def export_delta(self, old_run_id, new_run_id, output_path):
+        added, removed, upgraded = self.diff(old_run_id, new_run_id)
+        delta = {
+            "from_run": old_run_id,
+            "to_run": new_run_id,
+            "added": added,
+            "removed": removed,
+            "upgraded": [{"before": before, "after": after} for before, after in upgraded],
+        }
+        with open(output_path, "w") as f:
+            json.dump(delta, f, indent=4)
+        return delta
+
+    def close(self):
+        self.connection.close()
+
+
+# save the drives in scan_data.json as a new scan
+def record_scan(scan_data_path="scan_output/scan_data.json", path=history_path):
+    with open(scan_data_path, "r") as f:
+        drives = json.load(f)
+    history = ScanHistory(path)
+    try:
+        return history.add_run(drives)
+    finally:
+        history.close()
+
+
+def describe_drive(drive):
+    return (
+        f"{drive['set_name']} [{drive['partition_number']}] {drive['drive_rarity']} "
+        f"Lv.{drive['drive_current_level']} {drive['drive_base_stat']}"
+    )
+
+
+# lets us look at the history from the command line:
+#   python scan_history.py runs
+#   python scan_history.py diff [old run] [new run]
+#   python scan_history.py export [old run] [new run] --output delta.json
+if __name__ == "__main__":
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Query the history of past scans")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("runs", help="list the saved scans")
+    for command in ("diff", "export"):
+        command_parser = subparsers.add_parser(
+            command, help="compare two scans (defaults to the last two)"
+        )
+        command_parser.add_argument("old_run", type=int, nargs="?")
+        command_parser.add_argument("new_run", type=int, nargs="?")
+        if command == "export":
+            command_parser.add_argument(
+                "--output", default="scan_output/scan_delta.json", help="where to write the delta"
+            )
+    args = parser.parse_args()
+
+    history = ScanHistory()
+    if args.command == "runs":
+        for run_id, finished, drive_count in history.get_runs():
+            print(f"{run_id}: {time.ctime(finished)} - {drive_count} drives")
+        sys.exit(0)
+
+    runs = (args.old_run, args.new_run)
+    if None in runs:
+        runs = history.get_latest_runs()
+        if runs is None:
+            print("Need at least two saved scans to compare")
+            sys.exit(1)
+    if args.command == "export":
+        delta = history.export_delta(runs[0], runs[1], args.output)
+        print(
+            f"Wrote {len(delta['added'])} added, {len(delta['removed'])} removed and "
+            f"{len(delta['upgraded'])} upgraded drives to {args.output}"
+        )
+    else:
+        added, removed, upgraded = history.diff(*runs)
+        print(f"Scan {runs[0]} -> scan {runs[1]}")
+        for drive in added:
+            print(f"+ {describe_drive(drive)}")
+        for drive in removed:
+            print(f"- {describe_drive(drive)}")
+        for before, after in upgraded:
+            print(f"^ {describe_drive(before)} -> Lv.{after['drive_current_level']}")
+    history.close()
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+
+# streams scan results to disk as they are processed, so a crash part way through a scan doesn't lose the drives
+# already scanned and memory doesn't grow with the size of the inventory
+# every drive the scanner gets through is appended to a JSON Lines spool with its status, which is flushed to disk in
+# small batches, so a resumed scan knows which drives are already done
+# scan_data.json is then built from the valid drives in the spool, in (partition, scan number) order
+
+spool_path = "scan_output/scan_data.jsonl"
+scan_data_path = "scan_output/scan_data.json"
+
+
+class ScanSpool:
+    def __init__(self, path=spool_path, batch_size=10):
+        self.path = path
+        self.batch_size = batch_size  # drives to buffer before flushing to disk
+        self.pending = 0
+        self.file = open(path, "a", encoding="utf-8")
+
+    # status is "valid", "invalid" or "error", only valid drives carry their metadata
+    # captured and processed are when the drive was captured and when its result got here, for timing the scan
+    def append(self, partition_number, scan_number, result_metadata, status="valid", capture_time=None):
+        record = {
+            "partition": partition_number,
+            "scan": scan_number,
+            "status": status,
+            "captured": capture_time,
+            "processed": time.time(),
+            "drive": result_metadata if status == "valid" else None,
+        }
+        self.file.write(json.dumps(record) + "\n")
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+# every record in the spool, in the order they were written
+def read_spool(path=spool_path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+
+
+# read the (partition, scan number) of each drive in the spool, and the status and start of its line
+# if a drive was spooled more than once (eg: rescanned after resuming) the last one wins, unless that would throw away
+# a valid read of it
+def index_spool(path=spool_path):
+    index = {}
+    if not os.path.exists(path):
+        return index
+    with open(path, "rb") as f:
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            key = (record["partition"], record["scan"])
+            status = record.get("status", "valid")
+            if status != "valid" and index.get(key, (None, None))[1] == "valid":
+                continue
+            index[key] = (offset, status)
+    return index
+
+
+# the (partition, scan number) of every drive the scanner got through, whatever the result
+def get_processed_scans(path=spool_path):
+    return set(index_spool(path))
+
+
+# write scan_data.json from the spool, one drive at a time, in the order the drives were captured
+def build_scan_data(path=spool_path, output_path=scan_data_path):
+    index = {
+        key: offset for key, (offset, status) in index_spool(path).items() if status == "valid"
+    }
+    temp_path = output_path + ".tmp"
+    with open(path if index else os.devnull, "rb") as spool, open(
+        temp_path, "w", encoding="utf-8"
+    ) as output:
+        if not index:
+            output.write("[]")
+        else:
+            # the same layout json.dump(scan_data, f, indent=4) would give
+            output.write("[\n")
+            for i, key in enumerate(sorted(index)):
+                spool.seek(index[key])
+                drive = json.loads(spool.readline())["drive"]
+                drive_json = json.dumps(drive, indent=4).replace("\n", "\n    ")
+                output.write(("    " if i == 0 else ",\n    ") + drive_json)
+            output.write("\n]")
+    os.replace(temp_path, output_path)
+    return len(index)
@@ -0,0 +1,461 @@
+import sys
+import time
+import json
+import cv2
+import numpy as np
+from screen_recording import RecordingWriter, RecordingReader
+from screen_capture import MssGrabber, FakeGrabber, find_template, mss
+from tracing import tracer
+
+# everything getImages does to the screen (screenshots, finding images on screen, mouse and keyboard input) goes
+# through a screen backend, so the capture doesn't have to be talking to the game
+#   LiveScreenBackend - the real screen, through pyautogui and keyboard
+#   FastScreenBackend - the real screen, captured through mss into reused buffers, with input still through pyautogui
+#   FakeScreenBackend - a screen image instead of the real screen, inputs do nothing, for running without a display
+#   RecordingScreenBackend - the real screen, but everything seen and done is also saved to a recording
+#   ReplayScreenBackend - plays a recording back, for running the whole scan without the game (eg: on Linux)
+#   TracingScreenBackend - wraps any of the others and adds a span to the trace for everything done to the screen
+# screenshots are BGR arrays and found images are (left, top, width, height) tuples, or None if they weren't found
+# set_metadata saves a value in the recording (only the recording backend keeps it) and get_metadata reads it back
+# from the recording being replayed (None from every other backend)
+
+
+class ReplayError(Exception):
+    pass
+
+
+class LiveScreenBackend:
+    name = "live"
+
+    def __init__(self):
+        # only importable on a machine with a display, so they're imported when the live screen is actually used
+        import pyautogui
+        from keyboard import press
+
+        self.pyautogui = pyautogui
+        self.keyboard_press = press
+
+    def size(self):
+        width, height = self.pyautogui.size()
+        return width, height
+
+    def screenshot(self, region):
+        screenshot = self.pyautogui.screenshot(region=region)
+        # convert from RGB to the BGR layout cv2 expects
+        return np.asarray(screenshot)[:, :, ::-1]
+
+    def locate(self, target, confidence, region=None):
+        try:
+            box = self.pyautogui.locateOnScreen(target, confidence=confidence, region=region)
+        except Exception:  # newer versions of pyautogui raise when the image isn't on screen
+            return None
+        if box is None:
+            return None
+        return tuple(int(value) for value in box)
+
+    def move_to(self, x, y):
+        self.pyautogui.moveTo(x, y)
+
+    def click(self, x=None, y=None):
+        self.pyautogui.click(x, y)
+
+    def scroll(self, clicks):
+        self.pyautogui.scroll(clicks)
+
+    def press_key(self, key):
+        self.keyboard_press(key)
+
+    def activate_window(self, title):
+        window = self.pyautogui.getWindowsWithTitle(title)[0]
+        if window.isActive == False:
+            self.pyautogui.press(
+                "altleft"
+            )  # Somehow this is needed to switch to the window, Why though?
+            window.activate()
+
+    def get_metadata(self, key):
+        return None
+
+    def set_metadata(self, key, value):
+        pass
+
+    def sleep(self, seconds):
+        self.pyautogui.sleep(seconds)
+
+    def clock(self):
+        return time.perf_counter()
+
+    def close(self):
+        pass
+
+
+# loads the grayscale templates images are searched for with, once each
+class TemplateCache:
+    def __init__(self):
+        self.templates = {}
+
+    def get(self, target):
+        if target not in self.templates:
+            template = cv2.imread(target, cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                raise FileNotFoundError(f"Could not load {target}")
+            self.templates[target] = template
+        return self.templates[target]
+
+
+# find an image on the screen by capturing just the searched region in grayscale and matching it there
+def locate_with_grabber(grabber, templates, screen_size, target, confidence, region=None):
+    if region is None:
+        region = (0, 0, *screen_size)
+    box = find_template(grabber.grab(region, "gray"), templates.get(target), confidence)
+    if box is None:
+        return None
+    return (region[0] + box[0], region[1] + box[1], box[2], box[3])
+
+
+class FastScreenBackend(LiveScreenBackend):
+    name = "fast"
+
+    def __init__(self):
+        super().__init__()
+        self.grabber = MssGrabber()
+        self.templates = TemplateCache()
+
+    def screenshot(self, region):
+        return self.grabber.grab(region)
+
+    def locate(self, target, confidence, region=None):
+        return locate_with_grabber(
+            self.grabber, self.templates, self.size(), target, confidence, region
+        )
+
+    def close(self):
+        self.grabber.close()
+
+
+class FakeScreenBackend:
+    name = "fake"
+
+    # screen is a BGR image of the whole screen, or a function returning one
+    def __init__(self, screen, screen_size=None):
+        self.grabber = FakeGrabber(screen)
+        self.templates = TemplateCache()
+        if screen_size is None:
+            height, width = self.grabber.get_screen().shape[:2]
+            screen_size = (width, height)
+        self.screen_size = tuple(screen_size)
+        self.inputs = []  # (action, args) of every input, in order
+        self.time = 0.0
+
+    def size(self):
+        return self.screen_size
+
+    def screenshot(self, region):
+        return self.grabber.grab(region)
+
+    def locate(self, target, confidence, region=None):
+        return locate_with_grabber(
+            self.grabber, self.templates, self.screen_size, target, confidence, region
+        )
+
+    def move_to(self, x, y):
+        self.inputs.append(("move_to", get_input_args(x, y)))
+
+    def click(self, x=None, y=None):
+        self.inputs.append(("click", get_input_args(x, y)))
+
+    def scroll(self, clicks):
+        self.inputs.append(("scroll", [clicks]))
+
+    def press_key(self, key):
+        self.inputs.append(("press_key", [key]))
+
+    def activate_window(self, title):
+        self.inputs.append(("activate_window", [title]))
+
+    def get_metadata(self, key):
+        return None
+
+    def set_metadata(self, key, value):
+        pass
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+    def clock(self):
+        return self.time
+
+    def close(self):
+        self.grabber.close()
+
+
+# input arguments are saved as whole pixels, which is all the mouse can do anyway
+def get_input_args(*args):
+    return [round(arg) if isinstance(arg, float) else arg for arg in args if arg is not None]
+
+
+# what a screenshot or image search was looking at, they are matched up on replay by this
+def get_observation_key(event):
+    if event["type"] == "screenshot":
+        return json.dumps(["screenshot", event["region"]])
+    return json.dumps(["locate", event["target"], event["confidence"], event["region"]])
+
+
+class RecordingScreenBackend:
+    name = "record"
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.writer = RecordingWriter(path, backend.size())
+
+    def size(self):
+        return self.backend.size()
+
+    def screenshot(self, region):
+        start = self.backend.clock()
+        frame = self.backend.screenshot(region)
+        self.writer.add_event(
+            {
+                "type": "screenshot",
+                "region": list(region),
+                "frame": self.writer.add_frame(frame),
+                "duration": self.backend.clock() - start,
+            }
+        )
+        return frame
+
+    def locate(self, target, confidence, region=None):
+        start = self.backend.clock()
+        box = self.backend.locate(target, confidence, region)
+        self.writer.add_event(
+            {
+                "type": "locate",
+                "target": target,
+                "confidence": confidence,
+                "region": list(region) if region is not None else None,
+                "result": list(box) if box is not None else None,
+                "duration": self.backend.clock() - start,
+            }
+        )
+        return box
+
+    def record_input(self, action, *args):
+        self.writer.add_event({"type": "input", "action": action, "args": get_input_args(*args)})
+
+    def move_to(self, x, y):
+        self.record_input("move_to", x, y)
+        self.backend.move_to(x, y)
+
+    def click(self, x=None, y=None):
+        self.record_input("click", x, y)
+        self.backend.click(x, y)
+
+    def scroll(self, clicks):
+        self.record_input("scroll", clicks)
+        self.backend.scroll(clicks)
+
+    def press_key(self, key):
+        self.record_input("press_key", key)
+        self.backend.press_key(key)
+
+    def activate_window(self, title):
+        self.record_input("activate_window", title)
+        self.backend.activate_window(title)
+
+    def get_metadata(self, key):
+        return None
+
+    def set_metadata(self, key, value):
+        self.writer.metadata[key] = value
+
+    def sleep(self, seconds):
+        self.backend.sleep(seconds)
+
+    def clock(self):
+        return self.backend.clock()
+
+    def close(self):
+        self.writer.close()
+        self.backend.close()
+
+
+# plays a recording back on a virtual clock, so it runs as fast as the scanner can keep up
+# the inputs have to come in the same order as they were recorded, and each screenshot or image search is answered
+# with what was recorded for it after the same input, so the replay always sees the same screens the recording did
+# if the capture polls more often than it did when recording, the last recorded answer is given again
+class ReplayScreenBackend:
+    name = "replay"
+
+    def __init__(self, path):
+        self.recording = RecordingReader(path)
+        self.inputs = []
+        self.observations = {}  # (inputs so far, observation key) -> recorded events
+        for event in self.recording.events:
+            if event["type"] == "input":
+                self.inputs.append(event)
+            else:
+                key = (len(self.inputs), get_observation_key(event))
+                self.observations.setdefault(key, []).append(event)
+        self.input_index = 0
+        self.observation_counts = {}
+        self.time = 0.0
+
+    def size(self):
+        return self.recording.screen_size
+
+    def observe(self, event):
+        key = (self.input_index, get_observation_key(event))
+        events = self.observations.get(key)
+        if not events:
+            raise ReplayError(
+                f"The recording has nothing for {key[1]} after input {self.input_index}"
+            )
+        count = self.observation_counts.get(key, 0)
+        self.observation_counts[key] = count + 1
+        recorded = events[min(count, len(events) - 1)]
+        self.time += recorded["duration"]
+        return recorded
+
+    def screenshot(self, region):
+        recorded = self.observe({"type": "screenshot", "region": list(region)})
+        return self.recording.get_frame(recorded["frame"])
+
+    def locate(self, target, confidence, region=None):
+        recorded = self.observe(
+            {
+                "type": "locate",
+                "target": target,
+                "confidence": confidence,
+                "region": list(region) if region is not None else None,
+            }
+        )
+        if recorded["result"] is None:
+            return None
+        return tuple(recorded["result"])
+
+    def replay_input(self, action, *args):
+        if self.input_index >= len(self.inputs):
+            raise ReplayError(f"Ran past the end of the recording on {action}")
+        expected = self.inputs[self.input_index]
+        args = get_input_args(*args)
+        if expected["action"] != action or expected["args"] != args:
+            raise ReplayError(
+                f"Input {self.input_index} was {expected['action']} {expected['args']} "
+                f"in the recording, but the replay did {action} {args}"
+            )
+        self.input_index += 1
+
+    def move_to(self, x, y):
+        self.replay_input("move_to", x, y)
+
+    def click(self, x=None, y=None):
+        self.replay_input("click", x, y)
+
+    def scroll(self, clicks):
+        self.replay_input("scroll", clicks)
+
+    def press_key(self, key):
+        self.replay_input("press_key", key)
+
+    def activate_window(self, title):
+        self.replay_input("activate_window", title)
+
+    def get_metadata(self, key):
+        return self.recording.metadata.get(key)
+
+    def set_metadata(self, key, value):
+        pass
+
+    def sleep(self, seconds):
+        self.time += seconds
+
+    def clock(self):
+        return self.time
+
+    def close(self):
+        self.recording.close()
+
+
+class TracingScreenBackend:
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    def size(self):
+        return self.backend.size()
+
+    def screenshot(self, region):
+        with tracer.span("screenshot", "screen"):
+            return self.backend.screenshot(region)
+
+    def locate(self, target, confidence, region=None):
+        with tracer.span("locate", "screen", target=target, confidence=confidence):
+            return self.backend.locate(target, confidence, region)
+
+    def move_to(self, x, y):
+        with tracer.span("move_to", "input"):
+            self.backend.move_to(x, y)
+
+    def click(self, x=None, y=None):
+        with tracer.span("click", "input"):
+            self.backend.click(x, y)
+
+    def scroll(self, clicks):
+        with tracer.span("scroll", "input", clicks=clicks):
+            self.backend.scroll(clicks)
+
+    def press_key(self, key):
+        with tracer.span("press_key", "input", key=key):
+            self.backend.press_key(key)
+
+    def activate_window(self, title):
+        with tracer.span("activate_window", "input"):
+            self.backend.activate_window(title)
+
+    def get_metadata(self, key):
+        return self.backend.get_metadata(key)
+
+    def set_metadata(self, key, value):
+        self.backend.set_metadata(key, value)
+
+    def sleep(self, seconds):
+        with tracer.span("sleep", "wait", seconds=seconds):
+            self.backend.sleep(seconds)
+
+    def clock(self):
+        return self.backend.clock()
+
+    def close(self):
+        self.backend.close()
+
+
+# the size of the real screen, without setting up a backend
+# on Windows it's asked for straight from the system the same way pyautogui does, so it matches what the live backends
+# see, without importing pyautogui
+def get_screen_size():
+    if sys.platform == "win32":
+        import ctypes
+
+        user32 = ctypes.windll.user32
+        user32.SetProcessDPIAware()
+        return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+    import pyautogui
+
+    width, height = pyautogui.size()
+    return width, height
+
+
+# capture is "mss" or "pyautogui" for how the real screen is captured, "auto" uses mss if it's installed
+def create_screen_backend(record_path=None, replay_path=None, capture="auto"):
+    if replay_path is not None:
+        backend = ReplayScreenBackend(replay_path)
+    else:
+        if capture == "mss" or (capture == "auto" and mss is not None):
+            backend = FastScreenBackend()
+        else:
+            backend = LiveScreenBackend()
+        if record_path is not None:
+            backend = RecordingScreenBackend(backend, record_path)
+    if tracer.enabled:
+        backend = TracingScreenBackend(backend)
+    return backend
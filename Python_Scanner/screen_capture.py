@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+from metrics import registry
+
+try:
+    import mss
+except ImportError:  # mss is optional, the screen is captured through pyautogui without it
+    mss = None
+
+# grabs regions of the screen straight into numpy buffers, for the screen backends
+# each region (and colour mode) gets one buffer that is reused by every capture of it, so polling the same region
+# over and over doesn't allocate a new image each time
+# that means a capture is only good until the next capture of the same region, copy it to keep it for longer
+# (everything in getImages is done with a capture before it takes the next one)
+# how long each capture takes is recorded in the capture_call_seconds metric, labelled with the grabber's name
+#   MssGrabber - the real screen, through mss
+#   FakeGrabber - crops regions out of a given screen image, for running without a display
+
+
+class Grabber:
+    name = "grabber"
+
+    def __init__(self):
+        self.buffers = {}  # (region, mode) -> the buffer captures of that region are written into
+
+    def get_buffer(self, region, mode):
+        key = (tuple(region), mode)
+        if key not in self.buffers:
+            left, top, width, height = region
+            shape = (height, width) if mode == "gray" else (height, width, 3)
+            self.buffers[key] = np.empty(shape, dtype=np.uint8)
+        return self.buffers[key]
+
+    # capture a (left, top, width, height) region, mode is "bgr" or "gray"
+    def grab(self, region, mode="bgr"):
+        with registry.timer("capture_call_seconds", backend=self.name):
+            return self.grab_into(region, mode, self.get_buffer(region, mode))
+
+    def close(self):
+        self.buffers.clear()
+
+
+class MssGrabber(Grabber):
+    name = "mss"
+
+    def __init__(self):
+        super().__init__()
+        if mss is None:
+            raise ImportError("mss is not installed")
+        self.mss = mss.mss()
+
+    def grab_into(self, region, mode, buffer):
+        left, top, width, height = region
+        shot = self.mss.grab({"left": left, "top": top, "width": width, "height": height})
+        # mss gives us BGRA, converting it writes straight into our buffer
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY if mode == "gray" else cv2.COLOR_BGRA2BGR, dst=buffer)
+        return buffer
+
+    def close(self):
+        super().close()
+        self.mss.close()
+
+
+class FakeGrabber(Grabber):
+    name = "fake"
+
+    # screen is a BGR image of the whole screen, or a function returning one (eg: to change what's on screen)
+    def __init__(self, screen):
+        super().__init__()
+        self.screen = screen
+
+    def get_screen(self):
+        return self.screen() if callable(self.screen) else self.screen
+
+    def grab_into(self, region, mode, buffer):
+        left, top, width, height = region
+        crop = self.get_screen()[top : top + height, left : left + width]
+        if crop.shape[:2] != (height, width):
+            raise ValueError(f"Region {region} is off the screen")
+        if mode == "gray":
+            cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY, dst=buffer)
+        else:
+            np.copyto(buffer, crop)
+        return buffer
+
+
+# the best match of a grayscale template in a grayscale capture, as a (left, top, width, height) box relative to the
+# capture, or None if nothing matches with at least the given confidence
+def find_template(capture, template, confidence):
+    template_height, template_width = template.shape
+    if template_height > capture.shape[0] or template_width > capture.shape[1]:
+        return None
+    scores = cv2.matchTemplate(capture, template, cv2.TM_CCOEFF_NORMED)
+    _, best_score, _, (x, y) = cv2.minMaxLoc(scores)
+    if best_score < confidence:
+        return None
+    return (x, y, template_width, template_height)
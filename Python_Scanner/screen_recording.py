@@ -0,0 +1,115 @@
+import mmap
+import json
+import struct
+import hashlib
+import numpy as np
+
+# a single file holding everything getImages saw and did during a scan, so the scan can be replayed without the game
+# the file starts with a fixed header, then the raw pixels of every distinct frame (each one aligned so it can be used
+# straight out of a memory map without copying), and ends with a JSON index of the events and where each frame is
+#
+#   header: magic (8 bytes) | index offset (8 bytes) | index length (8 bytes)
+#   frames: raw uint8 pixels, 64 byte aligned, identical frames are only stored once
+#   index:  {"version", "screen_size", "events": [...], "frames": [{"offset", "shape"}, ...], "metadata": {...}}
+# metadata is anything the scan needs to replay the same way it was recorded (eg: the UI geometry it used), older
+# recordings don't have it
+
+recording_magic = b"ZZZSCAN1"
+header_format = "<8sQQ"
+header_size = struct.calcsize(header_format)
+frame_alignment = 64
+recording_version = 1
+
+
+class RecordingError(Exception):
+    pass
+
+
+class RecordingWriter:
+    def __init__(self, path, screen_size):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(struct.pack(header_format, recording_magic, 0, 0))
+        self.screen_size = list(screen_size)
+        self.events = []
+        self.frames = []
+        self.frame_ids = {}  # content hash -> frame id, so repeated frames are stored once
+        self.metadata = {}
+
+    # store a frame's pixels, returns its frame id
+    def add_frame(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        digest = hashlib.blake2b(frame.tobytes(), digest_size=16)
+        digest.update(repr(frame.shape).encode())
+        key = digest.hexdigest()
+        if key in self.frame_ids:
+            return self.frame_ids[key]
+        padding = -self.file.tell() % frame_alignment
+        self.file.write(b"\0" * padding)
+        self.frames.append({"offset": self.file.tell(), "shape": list(frame.shape)})
+        self.file.write(frame.tobytes())
+        self.frame_ids[key] = len(self.frames) - 1
+        return self.frame_ids[key]
+
+    def add_event(self, event):
+        self.events.append(event)
+
+    # write the index and point the header at it, the recording can't be read until this is done
+    def close(self):
+        if self.file.closed:
+            return
+        index = json.dumps(
+            {
+                "version": recording_version,
+                "screen_size": self.screen_size,
+                "events": self.events,
+                "frames": self.frames,
+                "metadata": self.metadata,
+            }
+        ).encode()
+        index_offset = self.file.tell()
+        self.file.write(index)
+        self.file.seek(0)
+        self.file.write(struct.pack(header_format, recording_magic, index_offset, len(index)))
+        self.file.close()
+
+
+class RecordingReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise RecordingError(f"{path} is empty")
+        magic, index_offset, index_length = struct.unpack_from(header_format, self.map, 0)
+        if magic != recording_magic:
+            self.close()
+            raise RecordingError(f"{path} is not a scan recording")
+        if index_offset == 0:
+            self.close()
+            raise RecordingError(f"{path} was never finished (the recording process didn't close it)")
+        index = json.loads(self.map[index_offset : index_offset + index_length].decode())
+        if index["version"] != recording_version:
+            self.close()
+            raise RecordingError(f"{path} is recording version {index['version']}, expected {recording_version}")
+        self.screen_size = tuple(index["screen_size"])
+        self.events = index["events"]
+        self.frames = index["frames"]
+        self.metadata = index.get("metadata", {})
+
+    # a read only view of a frame, straight out of the memory map
+    def get_frame(self, frame_id):
+        frame = self.frames[frame_id]
+        shape = tuple(frame["shape"])
+        return np.frombuffer(
+            self.map, dtype=np.uint8, count=int(np.prod(shape)), offset=frame["offset"]
+        ).reshape(shape)
+
+    def close(self):
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # frames handed out are still in use, the map is closed once they're gone
+        self.file.close()
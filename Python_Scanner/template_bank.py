@@ -0,0 +1,119 @@
+import os, cv2, zlib
+
+
+# screen resolutions we have hand made templates for
+class ScreenResolution:
+    RES_1440P = (2560, 1440)
+    RES_1080P = (1920, 1080)
+
+
+# the templates are made for 1440p, and for the other resolutions we have hand made ones for, the file name suffix
+base_resolution = ScreenResolution.RES_1440P
+native_template_suffixes = {
+    ScreenResolution.RES_1440P: "",
+    ScreenResolution.RES_1080P: "-1080p",
+}
+
+# every other resolution gets the 1440p templates scaled to fit it, they are scaled once and saved here so later runs
+# (and the other processes) just load them
+template_cache_folder = "scan_output/template_cache"
+
+# the templates used to find things on screen, by name (without the resolution suffix and .png)
+equipment_button_template = "zzz-equipment-button"
+empty_cell_template = "zzz-no-disk-drive-icon"
+scrollbar_end_template = "zzz-no-disk-drive-scrollbar"
+
+# the rarity icon templates, keyed by rank
+rarity_icon_templates = {
+    "S": "zzz-disk-drive-S-icon",
+    "A": "zzz-disk-drive-A-icon",
+    "B": "zzz-disk-drive-B-icon",
+}
+
+screen_templates = (equipment_button_template, empty_cell_template, scrollbar_end_template)
+
+# getImages captures a panel 20% of the screen wide and 55% high, so a capture's size tells us the screen it came from
+# (a calibrated panel is cut shorter, so getImages sends the screen size with each frame as well)
+panel_width_fraction = 0.2
+panel_height_fraction = 0.55
+
+
+def screen_size_from_panel(panel_shape):
+    return (
+        round(panel_shape[1] / panel_width_fraction),
+        round(panel_shape[0] / panel_height_fraction),
+    )
+
+
+# the UI keeps its proportions, so it scales with whichever side of the screen is relatively shorter
+def get_template_scale(screen_size):
+    return min(screen_size[0] / base_resolution[0], screen_size[1] / base_resolution[1])
+
+
+# the path of a template for the given screen size, scaling the 1440p template (and saving it) if we haven't yet
+# if the template doesn't exist at all, the path it would have is returned for the caller to report
+def get_template_path(target_images_folder, name, screen_size, cache_folder=template_cache_folder):
+    screen_size = (int(screen_size[0]), int(screen_size[1]))
+    if screen_size in native_template_suffixes:
+        native_path = os.path.join(
+            target_images_folder, name + native_template_suffixes[screen_size] + ".png"
+        )
+        if os.path.exists(native_path):
+            return native_path
+    base_path = os.path.join(target_images_folder, name + ".png")
+    if not os.path.exists(base_path):
+        return base_path
+    scale = get_template_scale(screen_size)
+    if scale == 1:
+        return base_path
+
+    # the cached template is named after what it was made from, so changing a template makes a new one
+    stat = os.stat(base_path)
+    key = zlib.crc32(f"{stat.st_size}-{int(stat.st_mtime)}-{scale:.6f}".encode())
+    cached_path = os.path.join(
+        cache_folder, f"{name}-{screen_size[0]}x{screen_size[1]}-{key:08x}.png"
+    )
+    if not os.path.exists(cached_path):
+        template = cv2.imread(base_path, cv2.IMREAD_UNCHANGED)
+        if template is None:
+            return base_path
+        size = (max(1, round(template.shape[1] * scale)), max(1, round(template.shape[0] * scale)))
+        scaled = cv2.resize(
+            template, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        )
+        # written under a temporary name first, so a process reading it never sees half a file
+        os.makedirs(cache_folder, exist_ok=True)
+        temporary_path = f"{cached_path[:-4]}.{os.getpid()}.png"
+        cv2.imwrite(temporary_path, scaled)
+        os.replace(temporary_path, cached_path)
+    return cached_path
+
+
+# get every template ready for the screen size at startup, returns {name: path}
+def prepare_templates(target_images_folder, screen_size):
+    names = list(screen_templates) + list(rarity_icon_templates.values())
+    return {name: get_template_path(target_images_folder, name, screen_size) for name in names}
+
+
+# the rarity icons for one screen size, loaded once and kept ready for matching
+class TemplateBank:
+    def __init__(self, target_images_folder, screen_size):
+        self.screen_size = screen_size
+        self.rarity_icons = {}
+        for rank, name in rarity_icon_templates.items():
+            icon_path = get_template_path(target_images_folder, name, screen_size)
+            icon = cv2.imread(icon_path, cv2.IMREAD_GRAYSCALE)
+            if icon is None:
+                raise FileNotFoundError(f"Could not load rarity icon {icon_path}")
+            self.rarity_icons[rank] = icon
+
+
+# banks are cached per process, so each icon is only read from disk once
+_template_banks = {}
+
+
+def get_template_bank(target_images_folder, screen_size):
+    key = (os.path.abspath(target_images_folder), screen_size)
+    if key not in _template_banks:
+        _template_banks[key] = TemplateBank(target_images_folder, screen_size)
+    return _template_banks[key]
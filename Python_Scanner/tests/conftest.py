@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scanner's modules import each other by name from the scanner folder, so the tests do too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
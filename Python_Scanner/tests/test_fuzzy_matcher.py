@@ -0,0 +1,65 @@
+import random
+import pytest
+import fuzzy_matcher
+from fuzzy_matcher import FuzzyIndex, candidate_lists, get_fuzzy_index
+
+# the index has to pick the same corrections as the strsimpy linear scan it replaced
+strsimpy = pytest.importorskip("strsimpy")
+
+
+# find_closest_stat's linear scan before the index, without the +N suffix handling
+def find_closest_linear(stat, valid_stats):
+    cosine = strsimpy.Cosine(2)
+    closest_stat = None
+    closest_stat_similarity = 0
+    for valid_stat in valid_stats:
+        similarity = cosine.similarity(stat, valid_stat)
+        if similarity >= closest_stat_similarity:
+            closest_stat_similarity = similarity
+            closest_stat = valid_stat
+    return closest_stat
+
+
+# OCR-like mistakes: dropped, doubled and swapped characters, plus a few stray ones
+def get_misreads(candidate, rng, count=5):
+    misreads = [candidate, candidate.upper(), candidate + "+1", candidate[:2], candidate + "  x"]
+    for _ in range(count):
+        chars = list(candidate)
+        position = rng.randrange(len(chars))
+        action = rng.choice(["drop", "double", "swap", "replace"])
+        if action == "drop":
+            del chars[position]
+        elif action == "double":
+            chars.insert(position, chars[position])
+        elif action == "swap" and position + 1 < len(chars):
+            chars[position], chars[position + 1] = chars[position + 1], chars[position]
+        else:
+            chars[position] = rng.choice("abcdefghijklmnopqrstuvwxyz0123456789%+ ")
+        misreads.append("".join(chars))
+    return misreads
+
+
+@pytest.mark.parametrize("name", sorted(candidate_lists))
+def test_closest_matches_strsimpy(name):
+    rng = random.Random(name)
+    candidates = candidate_lists[name]
+    index = get_fuzzy_index(name)
+    for candidate in candidates:
+        for misread in get_misreads(candidate, rng):
+            if not misread.strip():
+                continue
+            assert index.closest(misread) == find_closest_linear(misread, candidates), misread
+
+
+def test_short_strings_match_strsimpy():
+    candidates = ["A", "HP", "ATK", "DEF"]
+    index = FuzzyIndex(candidates)
+    for string in ["A", "H", "x", "HP", "AT"]:
+        assert index.closest(string) == find_closest_linear(string, candidates)
+
+
+def test_indexes_are_kept_by_name():
+    assert get_fuzzy_index("sub_stats") is get_fuzzy_index("sub_stats")
+    assert get_fuzzy_index("sub_stats").candidates == list(fuzzy_matcher.valid_random_stats)
+    with pytest.raises(KeyError):
+        get_fuzzy_index("not a list")
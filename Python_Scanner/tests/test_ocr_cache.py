@@ -0,0 +1,69 @@
+import types
+
+import numpy as np
+
+from ocr_cache import OcrCache, get_cache_namespace
+
+metadata = {"set_name": "Fanged Metal", "partition_number": "1"}
+
+
+def get_panel(value=0):
+    panel = np.zeros((40, 30), dtype=np.uint8)
+    panel[10:20, 5:25] = value
+    return panel
+
+
+def open_cache(tmp_path, namespace, **kwargs):
+    return OcrCache(namespace, path=str(tmp_path / "ocr_cache.sqlite"), **kwargs)
+
+
+def parse(text):
+    return text.split("\n")
+
+
+def parse_lines(text):
+    return text.splitlines()
+
+
+def test_cached_panel_is_found_again_after_reopening(tmp_path):
+    cache = open_cache(tmp_path, "a")
+    assert cache.get(get_panel(255), 1) is None
+    cache.put(get_panel(255), 1, metadata)
+    cache.close()
+    cache = open_cache(tmp_path, "a")
+    assert cache.get(get_panel(255), 1) == metadata
+    # the same panel from another partition, or a different panel, isn't the same drive
+    assert cache.get(get_panel(255), 2) is None
+    assert cache.get(get_panel(128), 1) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+
+def test_changing_the_namespace_throws_the_old_entries_away(tmp_path):
+    cache = open_cache(tmp_path, "a")
+    cache.put(get_panel(255), 1, metadata)
+    cache.close()
+    cache = open_cache(tmp_path, "b")
+    assert cache.get(get_panel(255), 1) is None
+    assert cache.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+    cache.close()
+
+
+def test_namespace_changes_with_the_model_code_and_tables():
+    table = types.SimpleNamespace(threshold=0.5, names=["HP", "ATK"])
+    namespace = get_cache_namespace("model", functions=(parse,), tables=(table,))
+    assert get_cache_namespace("model", functions=(parse,), tables=(table,)) == namespace
+    assert get_cache_namespace("other model", functions=(parse,), tables=(table,)) != namespace
+    assert get_cache_namespace("model", functions=(parse_lines,), tables=(table,)) != namespace
+    table.names.append("DEF")
+    assert get_cache_namespace("model", functions=(parse,), tables=(table,)) != namespace
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = open_cache(tmp_path, "a", max_bytes=200)
+    for value in range(1, 6):
+        cache.put(get_panel(value), 1, metadata)
+    cache.evict()
+    assert cache.get(get_panel(1), 1) is None
+    assert cache.get(get_panel(5), 1) == metadata
+    cache.close()
@@ -0,0 +1,53 @@
+from panel_layout import PanelLayout, find_bands
+
+line_pitch = 40
+
+
+# the (text, top, bottom) lines of a full panel OCR, one line every line_pitch pixels
+def get_lines(sub_stats=("ATK 19", "DEF+1 30", "CRIT Rate 2.4%")):
+    texts = ["Fanged Metal [1]", "Lv. 15/15", "Main Stat", "HP 2200", "Sub-Stats"]
+    texts += list(sub_stats) + ["Set Effect", "Fanged Metal"]
+    return [(text, 10 + i * line_pitch, 30 + i * line_pitch) for i, text in enumerate(texts)]
+
+
+def test_bands_are_found_from_the_field_lines():
+    bands = find_bands(get_lines())
+    assert bands["level"] == (50, 70)
+    assert bands["main_stat"] == (130, 150)
+    # from the first sub-stat down to the bottom of the set name
+    assert bands["details"] == (210, 390)
+    assert bands["sub_stats"] == 3
+    assert bands["line_pitch"] == line_pitch
+
+
+def test_bands_need_every_field():
+    assert find_bands([line for line in get_lines() if "Main" not in line[0]]) is None
+    # nothing after the set effect header, so no set name
+    assert find_bands(get_lines()[:-1]) is None
+
+
+def test_layout_is_ready_after_learning_and_makes_room_for_more_sub_stats():
+    layout = PanelLayout((600, 400))
+    for _ in range(PanelLayout.learning_drives - 1):
+        layout.learn(get_lines())
+    assert not layout.ready
+    layout.learn(get_lines(sub_stats=("ATK 19", "DEF+1 30")))
+    assert layout.ready
+    padding = PanelLayout.band_padding
+    assert layout.bands["level"] == (50 - padding, 70 + padding)
+    # the most sub-stats seen was 3, so there's room for one more line under the lowest set name
+    assert layout.bands["details"] == (210 - padding, 390 + padding + line_pitch)
+
+
+def test_layout_is_relearned_after_repeated_misses():
+    layout = PanelLayout((600, 400))
+    for _ in range(PanelLayout.learning_drives):
+        layout.learn(get_lines())
+    for _ in range(PanelLayout.max_misses - 1):
+        layout.record_miss()
+    layout.record_hit()
+    layout.record_miss()
+    assert layout.ready
+    for _ in range(PanelLayout.max_misses - 1):
+        layout.record_miss()
+    assert not layout.ready
@@ -0,0 +1,85 @@
+from scan_checkpoint import ScanCheckpoint, find_resume_point, partition_count
+
+
+def get_checkpoint(tmp_path):
+    return ScanCheckpoint(str(tmp_path / "scan_checkpoint.json"))
+
+
+# every scan of the checkpoint's rows, as the scanner would report them once processed
+def get_all_scans(checkpoint):
+    return {
+        (partition_number, scan)
+        for partition_number, partition in checkpoint.partitions.items()
+        for row in partition["rows"]
+        for scan in row["scans"]
+    }
+
+
+# a full partition: two rows scanned while scrolling, then the rest of the last page
+def record_partition(checkpoint, partition_number, skipped=()):
+    checkpoint.record_row(partition_number, 0, 1, range(1, 5))
+    checkpoint.record_row(partition_number, 1, 1, range(5, 9), end_found=True)
+    checkpoint.record_row(partition_number, 1, 2, range(9, 13), skipped=[s for s in skipped if 9 <= s < 13])
+    checkpoint.complete_partition(partition_number)
+
+
+def test_new_scan_starts_at_the_beginning(tmp_path):
+    point = find_resume_point(get_checkpoint(tmp_path), set())
+    assert (point.partition_number, point.row_index, point.scan_number) == (1, 0, 1)
+
+
+def test_finished_scan_has_nothing_to_resume(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    for partition_number in range(1, partition_count + 1):
+        record_partition(checkpoint, partition_number)
+    assert find_resume_point(checkpoint, get_all_scans(checkpoint)) is None
+
+
+def test_resumes_at_the_first_row_with_an_unprocessed_drive(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    record_partition(checkpoint, 1)
+    record_partition(checkpoint, 2)
+    processed = get_all_scans(checkpoint) - {(2, 6)}
+    point = find_resume_point(checkpoint, processed)
+    assert (point.partition_number, point.row_index) == (2, 1)
+    assert (point.scroll, point.page_row, point.scan_number) == (1, 1, 5)
+
+
+def test_skipped_drives_are_scanned_again(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    for partition_number in range(1, partition_count + 1):
+        record_partition(checkpoint, partition_number, skipped=[10] if partition_number == 3 else [])
+    # a skipped drive never reaches the scanner, so it's never processed
+    processed = get_all_scans(checkpoint) - {(3, 10)}
+    point = find_resume_point(checkpoint, processed)
+    assert (point.partition_number, point.row_index) == (3, 2)
+    assert (point.scroll, point.page_row, point.scan_number) == (1, 2, 9)
+
+
+def test_carries_on_after_the_last_recorded_row(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    record_partition(checkpoint, 1)
+    checkpoint.record_row(2, 0, 1, range(1, 5))
+    point = find_resume_point(checkpoint, get_all_scans(checkpoint))
+    assert (point.partition_number, point.row_index) == (2, 1)
+    assert (point.scroll, point.page_row, point.scan_number) == (1, 1, 5)
+
+
+def test_last_page_row_marks_the_partition_complete(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    checkpoint.record_row(1, 0, 1, range(1, 5), end_found=True)
+    for page_row in range(2, 6):
+        start = 1 + (page_row - 1) * 4
+        checkpoint.record_row(1, 0, page_row, range(start, start + 4))
+    point = find_resume_point(checkpoint, get_all_scans(checkpoint))
+    assert (point.partition_number, point.row_index) == (2, 0)
+
+
+def test_checkpoint_survives_a_reload(tmp_path):
+    checkpoint = get_checkpoint(tmp_path)
+    record_partition(checkpoint, 1, skipped=[11])
+    reloaded = get_checkpoint(tmp_path).load()
+    assert reloaded.partitions == checkpoint.partitions
+    reloaded.truncate(1, 1)
+    assert len(reloaded.partitions[1]["rows"]) == 1
+    assert not reloaded.partitions[1]["complete"]
@@ -0,0 +1,59 @@
+import json
+
+from scan_spool import ScanSpool, build_scan_data, get_processed_scans
+
+
+def get_drive(partition_number, scan_number):
+    return {
+        "set_name": "Fanged Metal",
+        "partition_number": str(partition_number),
+        "drive_current_level": "15",
+        "drive_max_level": "15",
+        "drive_base_stat": "HP",
+        "drive_base_stat_number": str(scan_number),
+        "random_stats": [["ATK", "19"], ["CRIT Rate", "2.4%"]],
+    }
+
+
+def build(tmp_path, records):
+    spool_path = str(tmp_path / "scan_data.jsonl")
+    output_path = str(tmp_path / "scan_data.json")
+    spool = ScanSpool(spool_path)
+    for partition_number, scan_number, status in records:
+        spool.append(partition_number, scan_number, get_drive(partition_number, scan_number), status)
+    spool.close()
+    count = build_scan_data(spool_path, output_path)
+    with open(output_path, encoding="utf-8") as f:
+        return count, f.read(), spool_path
+
+
+def test_no_valid_drives_is_an_empty_list(tmp_path):
+    count, text, _ = build(tmp_path, [(1, 1, "invalid")])
+    assert (count, text) == (0, json.dumps([], indent=4))
+
+
+# the same layout json.dump(scan_data, f, indent=4) gave, in (partition, scan number) order
+def test_valid_drives_are_written_like_json_dump_in_capture_order(tmp_path):
+    records = [(2, 1, "valid"), (1, 2, "valid"), (1, 1, "valid"), (1, 3, "invalid"), (2, 2, "error")]
+    count, text, _ = build(tmp_path, records)
+    scan_data = [get_drive(1, 1), get_drive(1, 2), get_drive(2, 1)]
+    assert count == 3
+    assert text == json.dumps(scan_data, indent=4)
+
+
+def test_a_rescan_replaces_the_earlier_read_unless_it_was_valid(tmp_path):
+    records = [(1, 1, "error"), (1, 1, "valid"), (1, 2, "valid"), (1, 2, "invalid")]
+    count, text, spool_path = build(tmp_path, records)
+    assert count == 2
+    assert text == json.dumps([get_drive(1, 1), get_drive(1, 2)], indent=4)
+    assert get_processed_scans(spool_path) == {(1, 1), (1, 2)}
+
+
+def test_a_line_cut_short_by_a_crash_is_skipped(tmp_path):
+    spool_path = str(tmp_path / "scan_data.jsonl")
+    spool = ScanSpool(spool_path)
+    spool.append(1, 1, get_drive(1, 1))
+    spool.close()
+    with open(spool_path, "a", encoding="utf-8") as f:
+        f.write('{"partition": 1, "scan": 2, "sta')
+    assert get_processed_scans(spool_path) == {(1, 1)}
@@ -0,0 +1,39 @@
+import numpy as np
+
+from ui_calibration import UiGeometry, get_line_pitch, get_text_rows, is_panel_cropped
+
+
+# a dark panel with a light line of text every pitch pixels, each line height pixels tall
+def get_panel(line_count, pitch=40, height=20, top=10, size=(400, 300)):
+    frame = np.zeros((size[0], size[1], 3), dtype=np.uint8)
+    for line in range(line_count):
+        line_top = top + line * pitch
+        frame[line_top:line_top + height, 10:290] = 255
+    return frame
+
+
+def get_calibrated_geometry(pitch=40):
+    geometry = UiGeometry((1920, 1080))
+    geometry.panel_line_pitch = pitch
+    return geometry
+
+
+def test_line_pitch_is_the_distance_between_line_tops():
+    assert get_line_pitch(get_text_rows(get_panel(5, pitch=40))) == 40
+
+
+def test_line_pitch_needs_two_lines():
+    assert get_line_pitch(get_text_rows(get_panel(1))) is None
+    assert get_line_pitch(get_text_rows(get_panel(0))) is None
+
+
+def test_panel_with_a_spare_line_is_not_cropped():
+    assert not is_panel_cropped(get_panel(8), get_calibrated_geometry())
+
+
+def test_panel_with_text_in_its_last_line_is_cropped():
+    assert is_panel_cropped(get_panel(10), get_calibrated_geometry())
+
+
+def test_uncalibrated_panel_is_never_cropped():
+    assert not is_panel_cropped(get_panel(10), UiGeometry((1920, 1080)))
@@ -0,0 +1,70 @@
+import copy
+
+import validMetadata
+from validMetadata import (
+    get_rarity_stats,
+    get_partition_main_stats,
+    get_expected_main_stat_value,
+    get_expected_sub_stat_values,
+    percentage_main_stats,
+    rarity_max_levels,
+    max_sub_stat_rank_ups,
+)
+
+
+# the expected main stat value worked out from the progression list, the way it was before the tables were compiled
+def get_reference_main_stat_value(main_stat_name, main_stats_progression, curLevel, maxLevel, partition):
+    if any(keyword in main_stat_name for keyword in ["ATK", "HP", "DEF"]) and partition in [4, 5, 6]:
+        main_stat_name += "%"
+    base_value = next((value for name, value in main_stats_progression if name == main_stat_name), None)
+    if base_value is None:
+        return None
+    value = base_value + ((base_value * 4 - base_value) / maxLevel) * curLevel
+    if any(keyword in main_stat_name for keyword in percentage_main_stats):
+        return str(value) + "%"
+    return round(value // 1)
+
+
+def test_compiled_main_stat_values_match_the_progressions():
+    for rarity, max_level in rarity_max_levels.items():
+        main_stats_progression = get_rarity_stats(rarity)[0]
+        for partition in range(1, 7):
+            for main_stat_name in get_partition_main_stats(partition):
+                for level in range(max_level + 1):
+                    expected = get_reference_main_stat_value(
+                        main_stat_name, main_stats_progression, level, max_level, partition
+                    )
+                    value = get_expected_main_stat_value(
+                        main_stat_name, main_stats_progression, level, max_level, partition
+                    )
+                    assert value == expected, (rarity, main_stat_name, partition, level)
+
+
+def test_progressions_outside_the_tables_are_still_worked_out():
+    # a copy isn't one of the standard progressions, so it goes through the calculation instead of the tables
+    main_stats_progression = copy.deepcopy(get_rarity_stats("S")[0])
+    for level in range(16):
+        assert get_expected_main_stat_value("HP", main_stats_progression, level, 15, 1) == (
+            get_reference_main_stat_value("HP", main_stats_progression, level, 15, 1)
+        )
+    assert get_expected_main_stat_value("Not A Stat", main_stats_progression, 0, 15, 1) is None
+
+
+def test_compiled_sub_stat_values_match_the_progressions():
+    for rarity in rarity_max_levels:
+        sub_stats_progression = get_rarity_stats(rarity)[1]
+        for stat_name, base_value in sub_stats_progression:
+            for rank_ups in range(max_sub_stat_rank_ups + 1):
+                assert validMetadata.get_sub_stat_rank_up_value(stat_name, sub_stats_progression, rank_ups) == (
+                    base_value + rank_ups * base_value
+                )
+
+
+def test_expected_sub_stat_values():
+    sub_stats_progression = get_rarity_stats("S")[1]
+    base_values = dict(sub_stats_progression)
+    expected = get_expected_sub_stat_values([("CRIT Rate+2", "7.2%"), ("ATK", "19")], sub_stats_progression)
+    assert expected == [
+        ("CRIT Rate+2", str(round(base_values["CRIT Rate"] * 3, 1))),
+        ("ATK", str(base_values["ATK"])),
+    ]
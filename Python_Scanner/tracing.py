@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import functools
+import threading
+from contextlib import contextmanager
+
+# an opt-in timeline of what the capture and scanner processes were doing, in the Chrome trace event format
+# (open it in chrome://tracing or https://ui.perfetto.dev)
+# each process records spans into its own tracer, and sends them to the supervisor when it finishes (see
+# process_supervisor.run_supervised), which writes them all out as one trace
+# spans are timed with the performance counter, shifted onto the wall clock when the tracer is enabled, so the
+# processes line up with each other on the same timeline
+# every span is tagged with the tracer's current context, eg: the partition and scan number being worked on
+
+trace_path = "scan_output/trace.json"
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.context = {}
+        self.process_name = None
+        self.clock_offset = 0.0
+
+    def enable(self, process_name=None):
+        self.enabled = True
+        self.process_name = process_name
+        # the wall clock is shared by all processes but coarse, the performance counter is precise but per process
+        self.clock_offset = time.time() - time.perf_counter()
+
+    # the current time in seconds on the wall clock
+    def now(self):
+        return time.perf_counter() + self.clock_offset
+
+    # tag the spans from here on, a value of None removes the tag
+    def set_context(self, **context):
+        for key, value in context.items():
+            if value is None:
+                self.context.pop(key, None)
+            else:
+                self.context[key] = value
+
+    # record a span from start to end (wall clock seconds), tagged with the given context or the current one
+    def add_span(self, name, category, start, end, context=None, **args):
+        if not self.enabled:
+            return
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": max(0.0, end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {**(self.context if context is None else context), **args},
+            }
+        )
+
+    @contextmanager
+    def span(self, name, category="scan", **args):
+        if not self.enabled:
+            yield
+            return
+        # take the context now, the block may move it on to the next scan
+        context = dict(self.context)
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, self.now(), context, **args)
+
+    # a decorator that puts a span around every call of the function
+    def traced(self, category="scan"):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(function.__name__, category):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    # the recorded spans, with the process's name so the trace viewer can label it
+    def get_events(self):
+        if not self.events:
+            return []
+        name = {
+            "name": "process_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {"name": self.process_name or f"process {os.getpid()}"},
+        }
+        return [name] + self.events
+
+
+# write the spans of all processes out as one trace, with the earliest span at zero
+def write_trace(events, path=trace_path, **metadata):
+    timed = [event["ts"] for event in events if "ts" in event]
+    start = min(timed) if timed else 0
+    trace_events = []
+    for event in events:
+        if "ts" in event:
+            event = dict(event, ts=event["ts"] - start)
+        trace_events.append(event)
+    trace_events.sort(key=lambda event: (event["ph"] != "M", event.get("ts", 0)))
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "otherData": dict(metadata, start_time=start / 1e6),
+            },
+            f,
+        )
+
+
+# the tracer of the current process
+tracer = Tracer()
@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import logging
+import cv2
+import numpy as np
+
+# where the game's UI is on screen, measured once per resolution and saved so later scans just load it
+# without a profile everything is worked out from fractions of the screen size, like the scanner always has
+# while a scan runs, the calibrators measure the real positions from what is on screen (live or replayed):
+#   the equipment button - where the full screen search found it, so later scans only check that spot
+#   the grid - the centres of the empty cells the grid analyzer finds, fitted to a column and row spacing
+#   the panel - how far down the drive panel any text goes, so the capture can stop below it, with at least a line of
+#     text to spare in case later drives have more on them than the ones measured (if one ever has text that close to
+#     the bottom anyway, the panel goes back to its full height for good, and that drive is captured again)
+# and the profile is saved at the end of the scan (see getImages)
+# the disk core has nothing on it we have a template for, so its centre and radius are only ever the defaults,
+# they are saved in the profile with everything else so they can be adjusted by hand
+
+calibration_path = "scan_output/ui_calibration.json"
+
+column_count = 4
+row_count = 5  # rows of the grid on screen at once
+
+
+# the UI positions for one screen size, in pixels
+class UiGeometry:
+    def __init__(self, screen_size):
+        width, height = screen_size
+        self.screen_size = (width, height)
+        # the inventory grid, cells are clicked at the top left cell's position plus whole cell spacings
+        # the grid region is what the grid analyzer captures, it starts half a cell before the first cell
+        self.first_cell = (0.075 * width, 0.15 * height)
+        self.cell_spacing = (0.07 * width, 0.158 * height)
+        self.grid_region = (
+            int(0.04 * width),  # left
+            int(0.1 * height),  # top
+            int(0.275 * width),  # width
+            int(((row_count - 1) * 0.158 + 0.125) * height),  # height
+        )
+        # the selected drive's detail panel, and the height of a line of text on it once it has been measured
+        self.panel_region = get_default_panel_region(self.screen_size)
+        self.panel_line_pitch = None
+        # the disk core on the equipment screen, the partitions are around its edge
+        self.disk_core_center = (0.75 * width, height / 2)
+        self.disk_radius = 0.25 * height
+        # (left, top, width, height) of the equipment button, once it has been found
+        self.equipment_button = None
+        self.calibrated = []  # the parts that were measured, rather than worked out from the screen size
+        self.changed = False  # measured something this scan that isn't saved yet
+
+    def mark_calibrated(self, part):
+        if part not in self.calibrated:
+            self.calibrated.append(part)
+        self.changed = True
+
+    # go back to capturing the whole panel, and don't try to cut it down again
+    def reset_panel(self):
+        self.panel_region = get_default_panel_region(self.screen_size)
+        self.panel_line_pitch = None
+        self.mark_calibrated("panel")
+
+    def to_dict(self):
+        return {
+            "first_cell": list(self.first_cell),
+            "cell_spacing": list(self.cell_spacing),
+            "grid_region": list(self.grid_region),
+            "panel_region": list(self.panel_region),
+            "panel_line_pitch": self.panel_line_pitch,
+            "disk_core_center": list(self.disk_core_center),
+            "disk_radius": self.disk_radius,
+            "equipment_button": list(self.equipment_button) if self.equipment_button else None,
+            "calibrated": self.calibrated,
+            "updated": time.time(),
+        }
+
+    def load_dict(self, data):
+        self.first_cell = tuple(data.get("first_cell", self.first_cell))
+        self.cell_spacing = tuple(data.get("cell_spacing", self.cell_spacing))
+        self.grid_region = tuple(int(v) for v in data.get("grid_region", self.grid_region))
+        self.panel_region = tuple(int(v) for v in data.get("panel_region", self.panel_region))
+        self.panel_line_pitch = data.get("panel_line_pitch")
+        self.disk_core_center = tuple(data.get("disk_core_center", self.disk_core_center))
+        self.disk_radius = data.get("disk_radius", self.disk_radius)
+        if data.get("equipment_button"):
+            self.equipment_button = tuple(int(v) for v in data["equipment_button"])
+        self.calibrated = list(data.get("calibrated", []))
+        return self
+
+
+def get_default_panel_region(screen_size):
+    width, height = screen_size
+    return (
+        int(0.31 * width),  # left
+        int(0.1 * height),  # top
+        int(0.2 * width),  # width
+        int(0.55 * height),  # height
+    )
+
+
+# profiles are saved per screen resolution
+def get_resolution_key(screen_size):
+    return f"{screen_size[0]}x{screen_size[1]}"
+
+
+# the saved geometry for the screen size, or the default one if it hasn't been calibrated
+def load_geometry(screen_size, profile_path=calibration_path):
+    geometry = UiGeometry(screen_size)
+    if not os.path.exists(profile_path):
+        return geometry
+    try:
+        with open(profile_path, "r") as f:
+            data = json.load(f).get(get_resolution_key(screen_size))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Could not read UI calibration profile: {e}")
+        return geometry
+    if data:
+        geometry.load_dict(data)
+    return geometry
+
+
+def save_geometry(geometry: UiGeometry, profile_path=calibration_path):
+    profiles = {}
+    if os.path.exists(profile_path):
+        try:
+            with open(profile_path, "r") as f:
+                profiles = json.load(f)
+        except (OSError, ValueError):
+            profiles = {}
+    profiles[get_resolution_key(geometry.screen_size)] = geometry.to_dict()
+    temp_path = profile_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(temp_path, profile_path)
+    geometry.changed = False
+
+
+# the start and spacing of evenly spaced positions, from the measured position of some of them by index
+def fit_spacing(positions, default_spacing):
+    indexes = np.array(sorted(positions), dtype=np.float64)
+    values = np.array([positions[i] for i in sorted(positions)], dtype=np.float64)
+    if len(indexes) >= 2:
+        spacing, start = np.polyfit(indexes, values, 1)
+        return float(start), float(spacing)
+    return float(values[0] - indexes[0] * default_spacing), float(default_spacing)
+
+
+# measures the grid from the empty cells the grid analyzer finds
+class GridCalibrator:
+    min_cells = 3  # empty cells to see before trusting the measurement
+    max_shift = 0.5  # furthest the measured grid can be from the default, as a fraction of a cell
+    max_spacing_error = 0.15  # fraction the measured spacing can be off the default
+
+    def __init__(self):
+        self.cell_centers = []  # (row, column, x, y) of every empty cell seen
+
+    def observe(self, analysis):
+        for (row, column), (x, y) in analysis.empty_cells.items():
+            self.cell_centers.append((row, column, x, y))
+
+    def calibrate(self, geometry: UiGeometry):
+        if len(self.cell_centers) < self.min_cells:
+            return False
+        columns, rows = {}, {}
+        for row, column, x, y in self.cell_centers:
+            columns.setdefault(column, []).append(x)
+            rows.setdefault(row, []).append(y)
+        x0, spacing_x = fit_spacing(
+            {c: np.median(xs) for c, xs in columns.items()}, geometry.cell_spacing[0]
+        )
+        y0, spacing_y = fit_spacing(
+            {r: np.median(ys) for r, ys in rows.items()}, geometry.cell_spacing[1]
+        )
+        default = UiGeometry(geometry.screen_size)
+        for start, spacing, axis in ((x0, spacing_x, 0), (y0, spacing_y, 1)):
+            default_spacing = default.cell_spacing[axis]
+            # the empty cell icon sits in the middle of its cell, somewhere around where we click by default
+            if abs(start - default.first_cell[axis]) > default_spacing * self.max_shift:
+                logging.warning("Measured grid is too far from where it should be, not using it")
+                return False
+            if abs(spacing - default_spacing) > default_spacing * self.max_spacing_error:
+                logging.warning(f"Measured grid spacing {spacing:.1f} is off, not using it")
+                return False
+        geometry.first_cell = (x0, y0)
+        geometry.cell_spacing = (spacing_x, spacing_y)
+        # the grid analyzer's cells are centred on the measured cells
+        left = max(0, round(x0 - spacing_x / 2))
+        top = max(0, round(y0 - spacing_y / 2))
+        geometry.grid_region = (
+            left,
+            top,
+            min(geometry.screen_size[0] - left, round(column_count * spacing_x)),
+            min(geometry.screen_size[1] - top, round(row_count * spacing_y)),
+        )
+        geometry.mark_calibrated("grid")
+        logging.info(f"Calibrated the grid: first cell {geometry.first_cell}, spacing {geometry.cell_spacing}")
+        return True
+
+
+# the rows of a panel capture with text on them, min_ink is the fraction of a row that has to be text for it to count
+def get_text_rows(frame, min_ink=0.01):
+    # the panel's text is light on dark, the same threshold preprocess_image uses
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return np.flatnonzero(np.count_nonzero(binary, axis=1) > binary.shape[1] * min_ink)
+
+
+# the distance between the tops of consecutive lines of text, or None if there aren't enough lines
+def get_line_pitch(text_rows):
+    if text_rows.size < 2:
+        return None
+    line_tops = text_rows[np.flatnonzero(np.diff(text_rows) > 1) + 1]
+    if line_tops.size < 2:
+        return None
+    return float(np.median(np.diff(line_tops)))
+
+
+# a calibrated panel capture with text in its last line, past the spare lines, so drives can have more on them than
+# the panel was measured for
+def is_panel_cropped(frame, geometry: UiGeometry):
+    if geometry.panel_line_pitch is None:
+        return False
+    rows = get_text_rows(frame)
+    return bool(rows.size) and rows[-1] >= frame.shape[0] - geometry.panel_line_pitch
+
+
+# measures how far down the drive panel the text goes
+class PanelCalibrator:
+    frames_needed = 8  # drives to look at
+    spare_lines = 1  # lines of text kept below the lowest text, for drives with more on them than the ones seen
+    margin = 0.05  # the least kept below the lowest text, as a fraction of the panel's height
+
+    def __init__(self):
+        self.text_bottoms = []
+        self.line_pitches = []
+
+    @property
+    def done(self):
+        return len(self.text_bottoms) >= self.frames_needed
+
+    def observe(self, frame):
+        if self.done:
+            return
+        rows = get_text_rows(frame)
+        if rows.size:
+            self.text_bottoms.append(int(rows[-1]))
+        pitch = get_line_pitch(rows)
+        if pitch is not None:
+            self.line_pitches.append(pitch)
+
+    def calibrate(self, geometry: UiGeometry):
+        if not self.done or not self.line_pitches:
+            return False
+        left, top, width, height = geometry.panel_region
+        pitch = float(np.median(self.line_pitches))
+        spare = max(self.spare_lines * pitch, self.margin * height)
+        # the spare lines go below the text, and one more line below them for is_panel_cropped to watch
+        bottom = int(max(self.text_bottoms) + 1 + spare + pitch)
+        if bottom >= height:
+            return False
+        geometry.panel_region = (left, top, width, bottom)
+        geometry.panel_line_pitch = pitch
+        geometry.mark_calibrated("panel")
+        logging.info(f"Calibrated the panel: capturing {width}x{bottom} instead of {width}x{height}")
+        return True
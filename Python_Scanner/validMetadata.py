@@ -262,6 +262,139 @@ def get_rarity_from_maxLevel(maxLevel):
         return None
 
 
+# the max level of each rarity, and the most times a sub stat can be ranked up
+rarity_max_levels = {"B": 9, "A": 12, "S": 15}
+max_sub_stat_rank_ups = 5
+
+
+# find which rarity a main or sub stat progression list belongs to
+def get_progression_rarity(stats_progression):
+    for rarity in rarity_max_levels:
+        main_stats_progression, sub_stats_progression = get_rarity_stats(rarity)
+        if stats_progression is main_stats_progression or stats_progression is sub_stats_progression:
+            return rarity
+    return None
+
+
+# find the base value for a stat from a progression, returns None if the stat isn't in it
+def get_base_value(stat_name, stats_progression):
+    rarity = get_progression_rarity(stats_progression)
+    if rarity is not None:
+        if stats_progression is get_rarity_stats(rarity)[0]:
+            return main_stat_base_values[rarity].get(stat_name)
+        return sub_stat_base_values[rarity].get(stat_name)
+    for progression_stat_name, value in stats_progression:
+        if progression_stat_name == stat_name:
+            return value
+    return None
+
+
+# calculate what a main stat's value should be at the current level
+def calculate_main_stat_level_value(main_stat_name, base_value, curLevel, maxLevel):
+    # calculate the range for this stat (base -> 4 * base)
+    min_value = base_value
+    max_value = base_value * 4
+
+    # the stat progression is split evenly across the levels
+    progression_per_level = (max_value - min_value) / (
+        maxLevel
+    )  # remainder is kept until greater than 1, then added to the value next level
+    # as such, the expected value will be rounded down to the nearest whole number
+    # floor division will round down
+    expected_value_int = (min_value + (progression_per_level * curLevel)) // 1
+
+    # for percentage based stats, the expected value has no rounding
+    expected_value_percentage = min_value + (progression_per_level * curLevel)
+
+    if any(keyword in main_stat_name for keyword in percentage_main_stats):
+        return expected_value_percentage
+    return expected_value_int
+
+
+# the expected value of a main stat as it is shown on the drive (with a % sign for percentage stats)
+def format_main_stat_value(main_stat_name, expected_value):
+    if any(keyword in main_stat_name for keyword in percentage_main_stats):
+        return str(expected_value) + "%"  # add the % sign back
+    return round(expected_value)
+
+
+# the name a main stat has in the progression lists, partitions 4, 5 and 6 have the percentage versions of ATK, HP and DEF
+def get_progression_main_stat_name(main_stat_name, partition):
+    if any(keyword in main_stat_name for keyword in ["ATK", "HP", "DEF"]):
+        if partition in [4, 5, 6]:
+            main_stat_name += "%"
+    return main_stat_name
+
+
+# Compiled stat tables
+# every stat value a drive can have is worked out once here at import, so validating and correcting a drive
+# is a dictionary lookup instead of scanning the progression lists and redoing the level progression math
+
+# rarity -> stat name -> base value
+main_stat_base_values = {
+    rarity: dict(get_rarity_stats(rarity)[0]) for rarity in rarity_max_levels
+}
+sub_stat_base_values = {
+    rarity: dict(get_rarity_stats(rarity)[1]) for rarity in rarity_max_levels
+}
+
+# (rarity, progression stat name, level) -> expected main stat value
+main_stat_level_values = {
+    (rarity, stat_name, level): calculate_main_stat_level_value(
+        stat_name, base_value, level, max_level
+    )
+    for rarity, max_level in rarity_max_levels.items()
+    for stat_name, base_value in main_stat_base_values[rarity].items()
+    for level in range(max_level + 1)
+}
+
+# (rarity, main stat name, partition, level) -> expected main stat value as shown on the drive
+expected_main_stat_values = {}
+for _rarity, _max_level in rarity_max_levels.items():
+    for _partition in range(1, 7):
+        for _main_stat_name in get_partition_main_stats(_partition):
+            _progression_name = get_progression_main_stat_name(_main_stat_name, _partition)
+            if _progression_name not in main_stat_base_values[_rarity]:
+                continue
+            for _level in range(_max_level + 1):
+                expected_main_stat_values[(_rarity, _main_stat_name, _partition, _level)] = (
+                    format_main_stat_value(
+                        _progression_name,
+                        main_stat_level_values[(_rarity, _progression_name, _level)],
+                    )
+                )
+
+# (rarity, sub stat name, rank ups) -> expected sub stat value, before rounding
+sub_stat_rank_up_values = {
+    (rarity, stat_name, rank_ups): base_value + (rank_ups * base_value)
+    for rarity in rarity_max_levels
+    for stat_name, base_value in sub_stat_base_values[rarity].items()
+    for rank_ups in range(max_sub_stat_rank_ups + 1)
+}
+
+
+# the expected main stat value at a level, from the compiled table when we can
+def get_main_stat_level_value(main_stat_name, main_stats_progression, curLevel, maxLevel):
+    rarity = get_progression_rarity(main_stats_progression)
+    if rarity is not None and rarity_max_levels[rarity] == maxLevel:
+        expected_value = main_stat_level_values.get((rarity, main_stat_name, curLevel))
+        if expected_value is not None:
+            return expected_value
+    base_value = get_base_value(main_stat_name, main_stats_progression)
+    return calculate_main_stat_level_value(main_stat_name, base_value, curLevel, maxLevel)
+
+
+# the expected sub stat value after some number of rank ups, from the compiled table when we can
+def get_sub_stat_rank_up_value(sub_stat_name, sub_stats_progression, rank_up_number):
+    rarity = get_progression_rarity(sub_stats_progression)
+    if rarity is not None:
+        expected_value = sub_stat_rank_up_values.get((rarity, sub_stat_name, rank_up_number))
+        if expected_value is not None:
+            return expected_value
+    base_value = get_base_value(sub_stat_name, sub_stats_progression)
+    return base_value + (rank_up_number * base_value)
+
+
 # a function to validate the main stat value of a disk drive within validate_disk_drive
 def validate_main_stat_value(
     main_stat_name, main_stat_value, main_stats_progression, curLevel, maxLevel
@@ -280,11 +413,7 @@ def validate_main_stat_value(
     # we know the main stat name is valid, we need to check if its value is valid
 
     # find the base value for this main stat from the progression
-    base_value = None
-    for stat_name, value in main_stats_progression:
-        if stat_name == main_stat_name:
-            base_value = value
-            break
+    base_value = get_base_value(main_stat_name, main_stats_progression)
     if base_value == None:  # check if the main stat name is valid
         return (False, "Invalid main stat name")
 
@@ -296,22 +425,10 @@ def validate_main_stat_value(
     if main_stat_value < min_value or main_stat_value > max_value:
         return (False, "Main stat value out of expected range")
 
-    # calculate what the value should be at the current level
-    # the stat progression is split evenly across the levels
-    progression_per_level = (max_value - min_value) / (
-        maxLevel
-    )  # remainder is kept until greater than 1, then added to the value next level
-    # as such, the expected value will be rounded down to the nearest whole number
-    # floor division will round down
-    expected_value_int = (min_value + (progression_per_level * curLevel)) // 1
-
-    # for percentage based stats, the expected value has no rounding
-    expected_value_percentage = min_value + (progression_per_level * curLevel)
-
-    if any(keyword in main_stat_name for keyword in percentage_main_stats):
-        expected_value = expected_value_percentage
-    else:
-        expected_value = expected_value_int
+    # look up what the value should be at the current level
+    expected_value = get_main_stat_level_value(
+        main_stat_name, main_stats_progression, curLevel, maxLevel
+    )
 
     # check if the value is correct
     tolerance = 0.05
@@ -333,45 +450,28 @@ def get_expected_main_stat_value(
     maxLevel = int(maxLevel)
     partition = int(partition)
 
+    # use the compiled table if this is one of the standard progressions
+    rarity = get_progression_rarity(main_stats_progression)
+    if rarity is not None and rarity_max_levels[rarity] == maxLevel:
+        expected_value = expected_main_stat_values.get(
+            (rarity, main_stat_name, partition, curLevel)
+        )
+        if expected_value is not None:
+            return expected_value
+
     # if the stat is ATK, HP, or DEF, we need to add the % sign back to the name
     # if it is in partitions 4, 5, or 6 (they have percentage versions of these stats)
-    if any(keyword in main_stat_name for keyword in ["ATK", "HP", "DEF"]):
-        if partition in [4, 5, 6]:
-            main_stat_name += "%"
+    main_stat_name = get_progression_main_stat_name(main_stat_name, partition)
 
     # find the base value for this main stat from the progression
-    base_value = None
-    for stat_name, value in main_stats_progression:
-        if stat_name == main_stat_name:
-            base_value = value
-            break
+    base_value = get_base_value(main_stat_name, main_stats_progression)
     if base_value == None:  # check if the main stat name is valid
         return None
 
-    # calculate the range for this stat (base -> 4 * base)
-    min_value = base_value
-    max_value = base_value * 4
-
-    # calculate what the value should be at the current level
-    # the stat progression is split evenly across the levels
-    progression_per_level = (max_value - min_value) / (
-        maxLevel
-    )  # remainder is kept until greater than 1, then added to the value next level
-    # as such, the expected value will be rounded down to the nearest whole number
-    # floor division will round down
-    expected_value_int = (min_value + (progression_per_level * curLevel)) // 1
-    expected_value_int = round(expected_value_int)
-
-    # for percentage based stats, the expected value has no rounding
-    expected_value_percentage = min_value + (progression_per_level * curLevel)
-
-    if any(keyword in main_stat_name for keyword in percentage_main_stats):
-        expected_value = expected_value_percentage
-        expected_value = str(expected_value) + "%"  # add the % sign back
-    else:
-        expected_value = expected_value_int
-
-    return expected_value
+    return format_main_stat_value(
+        main_stat_name,
+        calculate_main_stat_level_value(main_stat_name, base_value, curLevel, maxLevel),
+    )
 
 
 # a function to validate the sub stat value of a disk drive within validate_disk_drive
@@ -416,14 +516,10 @@ def validate_sub_stat_value(sub_stats, sub_stats_progression):
             ranked_up_sub_stats.append((sub_stat_name, sub_stat_value))
         else:
             # check if the value is correct - it should be the base value
-            base_value = None
-            for stat_name, value in sub_stats_progression:
-                if (
-                    stat_name == sub_stat_name
-                ):  # we know there will be matching names as we checked for valid sub stats earlier
-                    base_value = value
-                    if sub_stat_value != base_value:
-                        return (False, "Sub stat value should be base value")
+            # we know there will be matching names as we checked for valid sub stats earlier
+            base_value = get_base_value(sub_stat_name, sub_stats_progression)
+            if base_value is not None and sub_stat_value != base_value:
+                return (False, "Sub stat value should be base value")
 
     # calculate the total number of rank ups across all ranked up sub stats (eg: if one is +3 and another is +2, the total is 5)
     for sub_stat_name, sub_stat_value in ranked_up_sub_stats:
@@ -431,12 +527,9 @@ def validate_sub_stat_value(sub_stats, sub_stats_progression):
         sub_stat_name = sub_stat_name.split("+")[0]
         # for each ranked up sub stat, check if the value is correct
         # it should be the base value + (rank_up_number * base value)
-        base_value = None
-        for stat_name, value in sub_stats_progression:
-            if stat_name == sub_stat_name:
-                base_value = value
-                break
-        expected_rank_up_value = base_value + (rank_up_number * base_value)
+        expected_rank_up_value = get_sub_stat_rank_up_value(
+            sub_stat_name, sub_stats_progression, rank_up_number
+        )
         tolerance = 0.05
         if abs(sub_stat_value - expected_rank_up_value) > tolerance:
             return (False, "Sub stat value does not match expected value")
@@ -499,13 +592,9 @@ def get_expected_sub_stat_values(sub_stats, sub_stats_progression):
             ):
                 sub_stat_name += "%"
 
-            base_value = None
-            for stat_name, value in sub_stats_progression:
-
-                if stat_name == sub_stat_name:
-                    base_value = value
-                    break
-            expected_value = base_value + (rank_up_number * base_value)
+            expected_value = get_sub_stat_rank_up_value(
+                sub_stat_name, sub_stats_progression, rank_up_number
+            )
 
             # if the sub stat name is not of the percentage type, we need to round the expected value to the nearest whole number
             if not any(keyword in sub_stat_name for keyword in percentage_sub_stats):
@@ -521,12 +610,7 @@ def get_expected_sub_stat_values(sub_stats, sub_stats_progression):
                 and "%" in sub_stat_value
             ):
                 sub_stat_name += "%"
-            base_value = None
-            for stat_name, value in sub_stats_progression:
-                if stat_name == sub_stat_name:
-                    base_value = value
-                    break
-            expected_value = base_value
+            expected_value = get_base_value(sub_stat_name, sub_stats_progression)
 
             # For ATK/HP/DEF stats, determine if this should be percentage based on other instances
             if any(keyword in sub_stat_name for keyword in ["ATK", "HP", "DEF"]):
@@ -552,6 +636,8 @@ def get_expected_sub_stat_values(sub_stats, sub_stats_progression):
 # A function to validate the metadata of a disk drive
 # main stat is a tuple of the main stat name and value
 # sub stats is a list of tuples of the sub stat name and value
+# returns (valid, error message, failure type), the failure type is which part of the drive failed validation
+# (set_name, level, partition, main_stat or sub_stat), or None if it passed
 def validate_disk_drive(
     set_name, curLevel, maxLevel, partition, main_stat_name, main_stat_value, sub_stats
 ):
@@ -562,21 +648,22 @@ def validate_disk_drive(
 
     # check if the set name is valid
     if set_name not in valid_set_names:
-        return (False, "Invalid set name")
+        return (False, "Invalid set name", "set_name")
     rarity = get_rarity_from_maxLevel(maxLevel)
     if rarity == None:  # check if the max level is valid
-        return (False, "Invalid max level")
+        return (False, "Invalid max level", "level")
     # check if current level is valid
     if curLevel < 0 or curLevel > maxLevel:
-        return (False, "Invalid current level - must be between 0 and max level")
+        return (False, "Invalid current level - must be between 0 and max level", "level")
 
     valid_main_stats = get_partition_main_stats(partition)
     if valid_main_stats == None:  # check if the partition is valid
-        return (False, "Invalid partition")
+        return (False, "Invalid partition", "partition")
     if main_stat_name not in valid_main_stats:
         return (
             False,
             "Invalid main stat for partition",
+            "main_stat",
         )  # check if the main stat is valid for the partition
 
     # check if the main stat value is valid
@@ -585,11 +672,11 @@ def validate_disk_drive(
         main_stat_name, main_stat_value, main_stats_progression, curLevel, maxLevel
     )
     if not main_stat_value_valid:
-        return (False, error)
+        return (False, error, "main_stat")
 
     # check if the sub stat values are valid
     sub_stats_valid, error = validate_sub_stat_value(sub_stats, sub_stats_progression)
     if not sub_stats_valid:
-        return (False, error)
+        return (False, error, "sub_stat")
 
-    return (True, "")
+    return (True, "", None)
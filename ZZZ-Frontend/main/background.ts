@@ -64,9 +64,12 @@ ipcMain.on("start-scan", (event, arg) => {
   console.log("Path exists:", fs.existsSync(pathToScanner));
   const { discScan, pageLoad } = arg;
   //run the scanner exe with the provided arguments in order of pageLoad, discScan
+  //along with when the scan was started, so the scanner can check how long it took to get going
   const scannerProcess = require("child_process").spawn(pathToScanner, [
     pageLoad,
     discScan,
+    "--launch-time",
+    (Date.now() / 1000).toString(),
   ]);
 
   //Wait for then watch the log file for changes so we can respond to scanner events